@@ -1,48 +1,202 @@
 """Модуль для получения списка доступных моделей через API."""
 import requests
-from typing import List
+from typing import List, Dict, Any, Optional
 import json
+import os
+import threading
+import time
+
+from _21_http_session import get_session
+
+# Файл, в котором списки моделей сохраняются между запусками
+MODELS_CACHE_PATH = "models_cache.json"
+# Время, в течение которого сохранённый список считается актуальным (секунды)
+DEFAULT_MODELS_TTL = 3600.0
+
+_lock = threading.Lock()
+# Кэш: endpoint -> {"fetched_at": время получения, "models": [{"id": ..., "context_length": ...}]}
+_cache: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def _endpoint_key(api_endpoint: str) -> str:
+    return api_endpoint.rstrip("/")
+
+
+def _load_cache() -> Dict[str, Dict[str, Any]]:
+    """Загружает сохранённые списки моделей с диска (однократно)."""
+    global _cache
+    if _cache is None:
+        _cache = {}
+        if os.path.exists(MODELS_CACHE_PATH):
+            try:
+                with open(MODELS_CACHE_PATH, 'r', encoding='utf-8') as f:
+                    _cache = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Ошибка чтения кэша моделей: {e}")
+    return _cache
+
+
+def _save_cache() -> None:
+    """Сохраняет списки моделей на диск через временный файл."""
+    tmp_path = f"{MODELS_CACHE_PATH}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(_cache, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, MODELS_CACHE_PATH)
+    except OSError as e:
+        print(f"Ошибка записи кэша моделей: {e}")
+
+
+def _parse_model(model: Any) -> Dict[str, Any]:
+    """Приводит описание модели из ответа API к виду {"id", "context_length"}.
+
+    Размер контекста разные серверы отдают под разными ключами:
+    OpenRouter — context_length, LM Studio — max_context_length,
+    llama.cpp — meta.n_ctx_train.
+    """
+    if not isinstance(model, dict):
+        return {"id": str(model), "context_length": None}
+    meta = model.get("meta") or {}
+    top_provider = model.get("top_provider") or {}
+    context_length = (
+        model.get("context_length")
+        or model.get("max_context_length")
+        or meta.get("n_ctx_train")
+        or meta.get("n_ctx")
+        or top_provider.get("context_length")
+    )
+    return {
+        "id": model.get("id"),
+        "context_length": int(context_length) if context_length else None
+    }
+
+
+def fetch_model_infos(api_endpoint: str, api_key: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Запрашивает список моделей с метаданными у сервера и обновляет кэш.
 
-def get_models(api_endpoint: str) -> List[str]:
-    """Получает список моделей через API.
-    
     Args:
         api_endpoint: Базовый URL API (например, http://localhost:1234/v1)
-        
+        api_key: Ключ API (Bearer), если требуется
+
     Returns:
-        Список названий доступных моделей
-        
+        Список словарей с ключами id и context_length (None, если неизвестен)
+
     Raises:
         requests.RequestException: При ошибке соединения или запроса
         ValueError: При ошибке в формате ответа
     """
     # Формируем полный URL для запроса списка моделей
     models_url = f"{api_endpoint}/models"
-    
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else None
+
+    # Отправляем GET-запрос
+    response = get_session(api_endpoint).get(models_url, headers=headers, timeout=5)
+    response.raise_for_status()  # Вызовет исключение при ошибках HTTP
+
+    # Парсим ответ
+    data = response.json()
+
+    # Проверяем структуру ответа и извлекаем описания моделей
+    if isinstance(data, dict) and isinstance(data.get('data'), list):
+        # Формат, совместимый с OpenAI API
+        models = data['data']
+    elif isinstance(data, list):
+        # Альтернативный формат (просто список моделей)
+        models = data
+    else:
+        # Неизвестный формат
+        raise ValueError(f"Неизвестный формат ответа API: {data}")
+
+    infos = [info for info in (_parse_model(model) for model in models) if info["id"]]
+    with _lock:
+        _load_cache()[_endpoint_key(api_endpoint)] = {"fetched_at": time.time(), "models": infos}
+        _save_cache()
+    return infos
+
+
+def get_cached_model_infos(api_endpoint: str) -> List[Dict[str, Any]]:
+    """Возвращает сохранённый список моделей без обращения к сети (возможно, устаревший).
+
+    Args:
+        api_endpoint: Базовый URL API
+
+    Returns:
+        Список словарей с ключами id и context_length или пустой список
+    """
+    with _lock:
+        entry = _load_cache().get(_endpoint_key(api_endpoint))
+        return list(entry["models"]) if entry else []
+
+
+def get_model_infos(
+    api_endpoint: str,
+    api_key: Optional[str] = None,
+    max_age: float = DEFAULT_MODELS_TTL
+) -> List[Dict[str, Any]]:
+    """Возвращает список моделей с метаданными, обращаясь к серверу только после истечения max_age.
+
+    Если сервер недоступен, возвращается устаревший сохранённый список.
+
+    Args:
+        api_endpoint: Базовый URL API
+        api_key: Ключ API (Bearer), если требуется
+        max_age: Допустимый возраст сохранённого списка в секундах
+
+    Returns:
+        Список словарей с ключами id и context_length
+
+    Raises:
+        requests.RequestException: При ошибке соединения, если сохранённого списка нет
+        ValueError: При ошибке в формате ответа, если сохранённого списка нет
+    """
+    with _lock:
+        entry = _load_cache().get(_endpoint_key(api_endpoint))
+    if entry and time.time() - entry.get("fetched_at", 0) < max_age:
+        return list(entry["models"])
     try:
-        # Отправляем GET-запрос
-        response = requests.get(models_url, timeout=5)
-        response.raise_for_status()  # Вызовет исключение при ошибках HTTP
-        
-        # Парсим ответ
-        data = response.json()
-        
-        # Проверяем структуру ответа и извлекаем названия моделей
-        if 'data' in data and isinstance(data['data'], list):
-            # Формат, совместимый с OpenAI API
-            return [model['id'] for model in data['data']]
-        elif isinstance(data, list):
-            # Альтернативный формат (просто список моделей)
-            return [model['id'] if isinstance(model, dict) and 'id' in model else model 
-                   for model in data]
+        return fetch_model_infos(api_endpoint, api_key)
+    except (requests.RequestException, ValueError) as e:
+        if entry:
+            print(f"Не удалось обновить список моделей ({e}), используется сохранённый")
+            return list(entry["models"])
+        raise
+
+
+def get_models(api_endpoint: str, api_key: Optional[str] = None) -> List[str]:
+    """Получает список моделей через API (с кэшированием, см. get_model_infos).
+
+    Args:
+        api_endpoint: Базовый URL API (например, http://localhost:1234/v1)
+        api_key: Ключ API (Bearer), если требуется
+
+    Returns:
+        Список названий доступных моделей
+
+    Raises:
+        requests.RequestException: При ошибке соединения или запроса
+        ValueError: При ошибке в формате ответа
+    """
+    return [info["id"] for info in get_model_infos(api_endpoint, api_key)]
+
+
+def get_model_context_length(model: str, api_endpoint: Optional[str] = None) -> Optional[int]:
+    """Возвращает размер контекстного окна модели из сохранённых метаданных.
+
+    Args:
+        model: Название модели
+        api_endpoint: Базовый URL API; если не указан, поиск ведётся по всем серверам
+
+    Returns:
+        Размер контекста в токенах или None, если он неизвестен
+    """
+    with _lock:
+        cache = _load_cache()
+        if api_endpoint is not None:
+            entries = [cache.get(_endpoint_key(api_endpoint)) or {}]
         else:
-            # Неизвестный формат
-            raise ValueError(f"Неизвестный формат ответа API: {data}")
-    
-    except requests.RequestException as e:
-        print(f"Ошибка соединения с API: {e}")
-        return ["local"]  # Возвращаем хотя бы локальную модель по умолчанию
-    
-    except (ValueError, json.JSONDecodeError) as e:
-        print(f"Ошибка разбора ответа API: {e}")
-        return ["local"] 
\ No newline at end of file
+            entries = list(cache.values())
+        for entry in entries:
+            for info in entry.get("models", []):
+                if info.get("id") == model and info.get("context_length"):
+                    return int(info["context_length"])
+    return None
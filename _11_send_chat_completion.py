@@ -1,16 +1,42 @@
 """Модуль для отправки запросов к API чат-модели."""
 import requests
 import json
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Callable
 import re # Добавляем импорт re
 
+from _21_http_session import get_session
+from _23_llm_cache import make_cache_key, get_cached_response, store_response
+from _24_retry_policy import call_with_retry
+from _25_rate_limiter import get_rate_limiter, provider_for_endpoint, PRIORITY_INTERACTIVE
+from _26_token_budget import estimate_messages_tokens, estimate_tokens
+from _29_endpoint_pool import endpoint_lease, acquire_endpoint, release_endpoint
+from _30_single_flight import SingleFlight, StreamFlight
+from _31_structured_output import JsonEndDetector
+from _32_llm_telemetry import CallMetrics
+
+# Одинаковые одновременные запросы (например, двойной щелчок по кнопке) отправляются один раз
+_inflight = SingleFlight()
+_inflight_streams = StreamFlight()
+# Серверы, отклонившие параметр response_format (JSON-схему ответа)
+_schema_unsupported = set()
+# HTTP-коды, которыми сервер отвечает на неподдерживаемый параметр запроса
+SCHEMA_REJECTED_STATUS_CODES = {400, 422}
+
 def send_chat_completion(
     api_endpoint: str,
     model: str,
     messages: List[Dict[str, str]],
     max_tokens: int,
     temperature: float,
-    api_key: Optional[str] = None
+    api_key: Optional[str] = None,
+    use_cache: bool = False,
+    refresh_cache: bool = False,
+    priority: str = PRIORITY_INTERACTIVE,
+    response_format: Optional[Dict[str, Any]] = None,
+    stop: Optional[List[str]] = None,
+    stop_at_json_end: bool = False,
+    task: Optional[str] = None,
+    cache_prompt: bool = False
 ) -> Dict[str, Any]:
     """Отправляет сообщения модели через API.
     
@@ -21,6 +47,19 @@ def send_chat_completion(
         max_tokens: Максимальное количество токенов в ответе
         temperature: Температура (креативность) от 0.0 до 1.0
         api_key: Ключ API для OpenRouter (Bearer), если требуется
+        use_cache: Использовать постоянный кэш ответов (для детерминированных запросов)
+        refresh_cache: Не читать кэш, но сохранить в него новый ответ
+            (например, если закэшированный ответ оказался непригодным)
+        priority: Приоритет запроса для ограничителя частоты
+            ("interactive" для действий пользователя, "background" для пакетных задач)
+        response_format: Формат ответа (JSON-схема, см. _31_structured_output);
+            если сервер его не поддерживает, запрос повторяется без него
+        stop: Последовательности, на которых сервер прекращает генерацию
+        stop_at_json_end: Получать ответ потоком и прервать генерацию, как только
+            завершится первый JSON-объект или массив (ответ без usage от сервера)
+        task: Название задачи для телеметрии (explanation, exercises, check, evaluate, format)
+        cache_prompt: Просить локальный сервер (llama.cpp, LM Studio) сохранить
+            обработанный префикс запроса для следующих запросов
         
     Returns:
         Словарь с ответом от API
@@ -29,8 +68,22 @@ def send_chat_completion(
         requests.RequestException: При ошибке соединения или запроса
         ValueError: При ошибке в формате ответа
     """
-    # Формируем полный URL для запроса
-    completion_url = f"{api_endpoint}/chat/completions"
+    response_format = _supported_response_format(api_endpoint, response_format)
+    
+    # Ключ запроса: для кэша ответов и объединения одинаковых одновременных запросов
+    request_key = make_cache_key(
+        api_endpoint, model, messages, temperature, max_tokens, response_format=response_format, stop=stop
+    )
+    
+    # Проверяем кэш ответов
+    cache_key = None
+    if use_cache or refresh_cache:
+        cache_key = request_key
+        if not refresh_cache:
+            cached = get_cached_response(cache_key)
+            if cached is not None:
+                CallMetrics(task, model, api_endpoint).finish("cache")
+                return cached
     
     # Формируем тело запроса
     payload = {
@@ -39,8 +92,95 @@ def send_chat_completion(
         "max_tokens": max_tokens,
         "temperature": temperature
     }
+    if response_format:
+        payload["response_format"] = response_format
+    if stop:
+        payload["stop"] = stop
+    if cache_prompt and provider_for_endpoint(api_endpoint) == "local":
+        payload["cache_prompt"] = True
     
     # Заголовки запроса
+    headers = _build_headers(api_key)
+    
+    limiter = get_rate_limiter(provider_for_endpoint(api_endpoint))
+    prompt_tokens = estimate_messages_tokens(messages)
+    
+    def post():
+        # Соблюдаем бюджет провайдера (запросы и токены в минуту)
+        if limiter:
+            limiter.acquire(prompt_tokens, priority)
+        # Выбираем наименее загруженный сервер, если их несколько
+        with endpoint_lease(api_endpoint) as target:
+            # Отправляем POST-запрос через общую сессию с пулом соединений
+            response = get_session(target).post(
+                f"{target}/chat/completions",
+                data=json.dumps(payload), 
+                headers=headers,
+                timeout=(10, 240)  # Быстрый отказ при недоступном сервере, 4 минуты на генерацию
+            )
+            response.raise_for_status()  # Вызовет исключение при ошибках HTTP
+            return response
+    
+    def request():
+        if stop_at_json_end:
+            result = _collect_json_stream(
+                api_endpoint, model, messages, max_tokens, temperature, api_key, priority, response_format, stop,
+                task, cache_prompt
+            )
+            if cache_key and get_completion_text(result):
+                store_response(cache_key, result)
+            return result
+        metrics = CallMetrics(task, model, api_endpoint)
+        try:
+            try:
+                # Временные ошибки (429, 5xx, таймауты) повторяются с экспоненциальной задержкой
+                response = call_with_retry(api_endpoint, post, metrics.retry)
+            except requests.HTTPError as e:
+                if not _schema_rejected(api_endpoint, payload, e):
+                    raise
+                response = call_with_retry(api_endpoint, post, metrics.retry)
+                _mark_schema_unsupported(api_endpoint)
+            
+            result = response.json()
+            usage = result.get("usage") or {}
+            # Без usage расход оцениваем по тексту ответа, как для потокового запроса
+            completion_tokens = usage.get("completion_tokens")
+            if completion_tokens is None:
+                completion_tokens = estimate_tokens(get_completion_text(result) or "")
+            metrics.finish("ok", usage.get("prompt_tokens", prompt_tokens), completion_tokens,
+                           estimated="prompt_tokens" not in usage or "completion_tokens" not in usage)
+            # Учитываем токены ответа в бюджете провайдера
+            if limiter:
+                limiter.charge(completion_tokens)
+            # В кэш попадают только ответы с текстом
+            if cache_key and get_completion_text(result):
+                store_response(cache_key, result)
+            
+            # Возвращаем ответ
+            return result
+        
+        except requests.RequestException as e:
+            metrics.finish("error", prompt_tokens, error=e)
+            print(f"Ошибка при отправке запроса к API: {e}")
+            raise
+        
+        except json.JSONDecodeError as e:
+            metrics.finish("error", prompt_tokens, error=e)
+            print(f"Ошибка разбора ответа API: {e}")
+            raise ValueError(f"Некорректный формат ответа API: {response.text}")
+    
+    # Если такой же запрос уже выполняется, дожидаемся его ответа
+    return _inflight.do(request_key, request)
+
+def _build_headers(api_key: Optional[str] = None) -> Dict[str, str]:
+    """Формирует заголовки запроса к API.
+    
+    Args:
+        api_key: Ключ API для OpenRouter (Bearer), если требуется
+        
+    Returns:
+        Словарь заголовков
+    """
     headers = {
         "Content-Type": "application/json"
     }
@@ -49,26 +189,292 @@ def send_chat_completion(
     if api_key:
         headers["Authorization"] = f"Bearer {api_key}"
     
+    return headers
+
+def _supported_response_format(
+    api_endpoint: str,
+    response_format: Optional[Dict[str, Any]]
+) -> Optional[Dict[str, Any]]:
+    """Возвращает response_format, если сервер не отклонял его ранее."""
+    if response_format and api_endpoint.rstrip("/") in _schema_unsupported:
+        return None
+    return response_format
+
+def _schema_rejected(api_endpoint: str, payload: Dict[str, Any], error: requests.HTTPError) -> bool:
+    """Проверяет, мог ли сервер отклонить JSON-схему ответа, и убирает её из запроса.
+    
+    Ошибка 400/422 бывает и по другим причинам (переполнение контекста,
+    неверные параметры), поэтому сервер отмечается как не поддерживающий
+    схемы только после успешного повтора без неё (_mark_schema_unsupported).
+    
+    Args:
+        api_endpoint: Базовый URL API
+        payload: Тело запроса (изменяется на месте)
+        error: Ошибка HTTP от сервера
+        
+    Returns:
+        True, если запрос следует повторить без response_format
+    """
+    response = error.response
+    if "response_format" not in payload or response is None:
+        return False
+    if response.status_code not in SCHEMA_REJECTED_STATUS_CODES:
+        return False
+    print(f"Сервер {api_endpoint} отклонил запрос с JSON-схемой ответа ({response.status_code}), повтор без неё")
+    del payload["response_format"]
+    return True
+
+def _mark_schema_unsupported(api_endpoint: str) -> None:
+    """Запоминает, что сервер отвечает только без JSON-схемы (повтор без неё удался)."""
+    _schema_unsupported.add(api_endpoint.rstrip("/"))
+
+def _collect_json_stream(
+    api_endpoint: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    api_key: Optional[str],
+    priority: str,
+    response_format: Optional[Dict[str, Any]],
+    stop: Optional[List[str]],
+    task: Optional[str] = None,
+    cache_prompt: bool = False
+) -> Dict[str, Any]:
+    """Читает потоковый ответ до конца первого JSON и закрывает соединение.
+    
+    Returns:
+        Ответ в формате chat.completion, собранный из фрагментов потока
+    """
+    detector = JsonEndDetector()
+    finish_reason = "stop"
+    chunks = _open_stream(api_endpoint, model, messages, max_tokens, temperature, api_key, priority,
+                          response_format, stop, task, cache_prompt)
     try:
-        # Отправляем POST-запрос
-        response = requests.post(
-            completion_url, 
-            data=json.dumps(payload), 
-            headers=headers,
-            timeout=240  # Увеличенный таймаут (4 минуты)
-        )
-        response.raise_for_status()  # Вызовет исключение при ошибках HTTP
+        for delta in chunks:
+            end = detector.feed(delta)
+            if end is not None:
+                # Модель может продолжать писать после JSON: дальше не читаем
+                detector.text = detector.text[:end]
+                break
+        else:
+            finish_reason = "length" if detector.depth else "stop"
+    finally:
+        chunks.close()
+    return {
+        "object": "chat.completion",
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": detector.text},
+            "finish_reason": finish_reason
+        }]
+    }
+
+def stream_chat_completion(
+    api_endpoint: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    api_key: Optional[str] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+    priority: str = PRIORITY_INTERACTIVE,
+    response_format: Optional[Dict[str, Any]] = None,
+    stop: Optional[List[str]] = None,
+    task: Optional[str] = None,
+    cache_prompt: bool = False
+) -> Iterator[str]:
+    """Отправляет сообщения модели в потоковом режиме (stream: true, SSE).
+    
+    Ответ сервера разбирается по строкам server-sent events, и фрагменты
+    текста отдаются по мере генерации, не дожидаясь полного ответа.
+    
+    Args:
+        api_endpoint: Базовый URL API (например, http://localhost:1234/v1)
+        model: Название модели
+        messages: Список сообщений в формате [{role: "system|user|assistant", content: "текст"}]
+        max_tokens: Максимальное количество токенов в ответе
+        temperature: Температура (креативность) от 0.0 до 1.0
+        api_key: Ключ API для OpenRouter (Bearer), если требуется
+        on_delta: Необязательная функция, вызываемая для каждого фрагмента текста
+        priority: Приоритет запроса для ограничителя частоты
+        response_format: Формат ответа (JSON-схема), см. send_chat_completion
+        stop: Последовательности, на которых сервер прекращает генерацию
+        task: Название задачи для телеметрии
+        cache_prompt: Просить локальный сервер сохранить обработанный префикс запроса
+        
+    Yields:
+        Фрагменты текста ответа (дельты) в порядке генерации
         
-        # Возвращаем ответ
-        return response.json()
+    Raises:
+        requests.RequestException: При ошибке соединения или запроса
+        ValueError: При ошибке в формате потока
+    """
+    # Одинаковые одновременные потоки читаются из одного соединения с сервером
+    response_format = _supported_response_format(api_endpoint, response_format)
+    request_key = make_cache_key(
+        api_endpoint, model, messages, temperature, max_tokens, stream=True,
+        response_format=response_format, stop=stop
+    )
+    chunks = _inflight_streams.stream(
+        request_key,
+        lambda: _open_stream(
+            api_endpoint, model, messages, max_tokens, temperature, api_key, priority, response_format, stop, task,
+            cache_prompt
+        )
+    )
+    for delta in chunks:
+        if on_delta:
+            on_delta(delta)
+        yield delta
+
+def _open_stream(
+    api_endpoint: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    api_key: Optional[str],
+    priority: str,
+    response_format: Optional[Dict[str, Any]] = None,
+    stop: Optional[List[str]] = None,
+    task: Optional[str] = None,
+    cache_prompt: bool = False
+) -> Iterator[str]:
+    """Выполняет потоковый запрос и отдаёт фрагменты текста (см. stream_chat_completion)."""
+    payload = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "stream": True
+    }
+    if response_format:
+        payload["response_format"] = response_format
+    if stop:
+        payload["stop"] = stop
+    if cache_prompt and provider_for_endpoint(api_endpoint) == "local":
+        payload["cache_prompt"] = True
+    
+    headers = _build_headers(api_key)
+    headers["Accept"] = "text/event-stream"
+    
+    limiter = get_rate_limiter(provider_for_endpoint(api_endpoint))
+    prompt_tokens = estimate_messages_tokens(messages)
+    metrics = CallMetrics(task, model, api_endpoint, stream=True)
+    
+    def post():
+        if limiter:
+            limiter.acquire(prompt_tokens, priority)
+        # Сервер остаётся занятым этим запросом до конца чтения потока
+        target = acquire_endpoint(api_endpoint)
+        try:
+            response = get_session(target).post(
+                f"{target}/chat/completions",
+                data=json.dumps(payload),
+                headers=headers,
+                timeout=(10, 240),  # Таймаут соединения и ожидания очередного фрагмента
+                stream=True
+            )
+            try:
+                response.raise_for_status()
+            except requests.HTTPError:
+                response.close()
+                raise
+        except Exception as e:
+            release_endpoint(api_endpoint, target, e)
+            raise
+        return response, target
     
+    try:
+        # Повторяется только установка соединения: начатый поток не перезапускается
+        try:
+            response, target = call_with_retry(api_endpoint, post, metrics.retry)
+        except requests.HTTPError as e:
+            if not _schema_rejected(api_endpoint, payload, e):
+                raise
+            response, target = call_with_retry(api_endpoint, post, metrics.retry)
+            _mark_schema_unsupported(api_endpoint)
     except requests.RequestException as e:
-        print(f"Ошибка при отправке запроса к API: {e}")
+        metrics.finish("error", prompt_tokens, error=e)
+        print(f"Ошибка при отправке потокового запроса к API: {e}")
+        raise
+    
+    generated = []
+    completed = False
+    stream_error: Optional[Exception] = None
+    try:
+        with response:
+            for raw_line in response.iter_lines():
+                # SSE всегда в UTF-8, независимо от заголовков ответа
+                line = raw_line.decode("utf-8", errors="replace").strip() if raw_line else ""
+                # Пропускаем пустые строки и комментарии (": keep-alive")
+                if not line or line.startswith(":"):
+                    continue
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    raise ValueError(f"Некорректный фрагмент потока API: {data}")
+                delta = get_delta_text(chunk)
+                if delta:
+                    metrics.first_token()
+                    generated.append(delta)
+                    yield delta
+        completed = True
+    except Exception as e:
+        stream_error = e
         raise
+    finally:
+        release_endpoint(api_endpoint, target, stream_error)
+        # Закрытие генератора до конца потока означает, что клиент прервал чтение
+        outcome = "ok" if completed else ("error" if stream_error else "aborted")
+        # Потоковый ответ не содержит usage, поэтому расход оцениваем по тексту
+        # (в том числе при досрочном прекращении чтения) - одинаково для метрик и лимита
+        completion_tokens = estimate_tokens("".join(generated))
+        metrics.finish(outcome, prompt_tokens, completion_tokens,
+                       estimated=True, error=stream_error)
+        if limiter:
+            limiter.charge(completion_tokens)
+
+def get_delta_text(chunk: Dict[str, Any]) -> str:
+    """Извлекает фрагмент текста из одного события потокового ответа.
     
-    except json.JSONDecodeError as e:
-        print(f"Ошибка разбора ответа API: {e}")
-        raise ValueError(f"Некорректный формат ответа API: {response.text}")
+    Args:
+        chunk: Разобранный JSON одного события SSE
+        
+    Returns:
+        Текст фрагмента или пустая строка
+    """
+    choices = chunk.get("choices") or []
+    if not choices:
+        return ""
+    choice = choices[0]
+    delta = choice.get("delta") or {}
+    # Формат chat completions: choices[0].delta.content; альтернативный - choices[0].text
+    return delta.get("content") or choice.get("text") or ""
+
+def strip_think_tags(text: str) -> str:
+    """Удаляет из текста блоки <think>...</think>, в том числе ещё не закрытые.
+    
+    Используется для частичного текста при потоковой генерации, когда
+    закрывающий тег ещё не получен.
+    
+    Args:
+        text: Накопленный текст ответа
+        
+    Returns:
+        Текст без рассуждений модели
+    """
+    text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+    # Незакрытый блок в конце текста скрываем целиком
+    text = re.sub(r'<think>.*$', '', text, flags=re.DOTALL)
+    return text.lstrip()
 
 def get_completion_text(response: Dict[str, Any]) -> Optional[str]:
     """Извлекает текст ответа из структуры ответа API.
@@ -1,11 +1,14 @@
 """Модуль для генерации пояснений к тексту с помощью нейросети."""
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterator
 import json
 import os
 import re
 
-from _4_load_settings import load_settings
-from _11_send_chat_completion import send_chat_completion, get_completion_text
+from _27_llm_provider import resolve_llm
+from _11_send_chat_completion import send_chat_completion, get_completion_text, stream_chat_completion
+from _26_token_budget import prepare_request
+from _31_structured_output import task_response_format, structured_output_enabled, parse_json_response
+from _33_prompt_layout import build_section_messages
 
 def analyze_text_complexity(text: str) -> Dict[str, Any]:
     """Анализирует сложность и объем исходного текста.
@@ -51,6 +54,16 @@ def analyze_text_complexity(text: str) -> Dict[str, Any]:
         "detail_type": detail_type
     }
 
+# Пометка в начале объяснения, если раздел не поместился в контекст модели целиком
+TRUNCATION_NOTICE = (
+    "<p><em>Раздел слишком велик для контекстного окна модели: "
+    "объяснение построено по его начальной части.</em></p>\n"
+)
+
+# Уровни детализации и соответствующие им поля ответа в объединённом режиме
+DETAIL_LEVELS = ["базовый", "средний", "подробный"]
+LEVEL_KEYS = {"базовый": "basic", "средний": "medium", "подробный": "detailed"}
+
 def generate_explanation(
     section_text: str,
     detail_level: str = "средний",
@@ -72,19 +85,100 @@ def generate_explanation(
         ValueError: При ошибке генерации пояснения
         FileNotFoundError: Если файл настроек не найден
     """
-    # Загружаем настройки
-    settings = load_settings(settings_path)
+    # Параметры LLM и настройки задачи (из кэша реестра провайдеров)
+    llm = resolve_llm("explanation", settings_path)
+    settings = llm["settings"]
     
-    # Анализируем сложность и объем исходного текста
-    text_analysis = analyze_text_complexity(section_text)
+    try:
+        api_endpoint, model, api_key = llm["api_endpoint"], llm["model"], llm["api_key"]
+        # Подгоняем текст раздела и длину ответа под контекстное окно модели
+        messages, max_tokens, truncated = prepare_request(
+            lambda text: build_explanation_messages(text, detail_level, user_feedback),
+            section_text, model, settings["max_tokens"], settings, "explanation", api_endpoint, api_key
+        )
+        # Отправляем запрос к API
+        response = send_chat_completion(
+            api_endpoint=api_endpoint,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=settings["temperature"],
+            api_key=api_key,
+            task="explanation",
+            cache_prompt=settings.get("cache_prompt", True)
+        )
+        
+        # Извлекаем текст из ответа
+        explanation_text = get_completion_text(response)
+        
+        if not explanation_text:
+            raise ValueError("Не удалось получить объяснение от нейросети")
+        
+        if truncated:
+            explanation_text = TRUNCATION_NOTICE + explanation_text
+        
+        return explanation_text
     
-    # Формируем системное сообщение в зависимости от уровня детализации и анализа текста
-    system_message = {
-        "role": "system",
-        "content": f"""Ты - опытный преподаватель, который объясняет сложные темы простым и понятным языком. 
-Твоя задача - объяснить предоставленный текст с уровнем детализации: {detail_level}.
+    except Exception as e:
+        print(f"Ошибка при генерации объяснения: {e}")
+        raise ValueError(f"Не удалось сгенерировать объяснение: {str(e)}")
 
-Уровни детализации:
+def stream_explanation(
+    section_text: str,
+    detail_level: str = "средний",
+    user_feedback: Optional[str] = None,
+    settings_path: str = "settings.json"
+) -> Iterator[str]:
+    """Генерирует пояснение к тексту раздела в потоковом режиме.
+    
+    Args:
+        section_text: Текст раздела для объяснения
+        detail_level: Уровень детализации пояснения (базовый, средний, подробный)
+        user_feedback: Отзыв пользователя для уточнения объяснения
+        settings_path: Путь к файлу настроек
+        
+    Yields:
+        Фрагменты текста пояснения по мере генерации
+        
+    Raises:
+        ValueError: При ошибке генерации пояснения
+    """
+    llm = resolve_llm("explanation", settings_path)
+    settings = llm["settings"]
+    
+    api_endpoint, model, api_key = llm["api_endpoint"], llm["model"], llm["api_key"]
+    
+    try:
+        messages, max_tokens, truncated = prepare_request(
+            lambda text: build_explanation_messages(text, detail_level, user_feedback),
+            section_text, model, settings["max_tokens"], settings, "explanation", api_endpoint, api_key
+        )
+        if truncated:
+            yield TRUNCATION_NOTICE
+        yield from stream_chat_completion(
+            api_endpoint=api_endpoint,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=settings["temperature"],
+            api_key=api_key,
+            task="explanation",
+            cache_prompt=settings.get("cache_prompt", True)
+        )
+    except Exception as e:
+        print(f"Ошибка при потоковой генерации объяснения: {e}")
+        raise ValueError(f"Не удалось сгенерировать объяснение: {str(e)}")
+
+def explanation_rules(text_analysis: Dict[str, Any]) -> str:
+    """Возвращает общие требования к объяснению с результатами анализа текста.
+    
+    Args:
+        text_analysis: Результат analyze_text_complexity
+        
+    Returns:
+        Текст требований для инструкций запроса
+    """
+    return f"""Уровни детализации:
 - базовый: короткое объяснение основных идей, не более 3-4 абзацев
 - средний: подробное объяснение основных и второстепенных идей, примеры, до 6-7 абзацев
 - подробный: всестороннее объяснение с глубокими примерами, аналогиями и контекстом, до 10 абзацев
@@ -109,71 +203,192 @@ def generate_explanation(
 3. Выделяй ключевые понятия и определения
 4. Перефразируй сложные идеи своими словами
 5. Используй аналогии для объяснения концепций"""
-    }
+
+def build_explanation_messages(
+    section_text: str,
+    detail_level: str = "средний",
+    user_feedback: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """Формирует сообщения для запроса пояснения к тексту раздела.
     
-    # Формируем сообщение с текстом для объяснения
-    user_message = {
-        "role": "user",
-        "content": f"Объясни мне следующий текст с уровнем детализации {detail_level}, сохраняя уровень обобщения исходного материала: \n\n{section_text}"
-    }
+    Args:
+        section_text: Текст раздела для объяснения
+        detail_level: Уровень детализации пояснения (базовый, средний, подробный)
+        user_feedback: Отзыв пользователя для уточнения объяснения
+        
+    Returns:
+        Список сообщений для чат-модели
+    """
+    # Анализируем сложность и объем исходного текста
+    text_analysis = analyze_text_complexity(section_text)
+    
+    # Инструкции следуют после текста раздела: начало запроса совпадает
+    # с запросами других уровней детализации и упражнений (кэш префикса сервера)
+    instructions = (
+        f"Объясни учебный материал простым и понятным языком с уровнем детализации: {detail_level}, "
+        "сохраняя уровень обобщения исходного материала.\n\n"
+        + explanation_rules(text_analysis)
+    )
+    
+    messages = build_section_messages(section_text, instructions)
     
     # Если есть отзыв пользователя, добавляем его как дополнительное сообщение
-    messages = [system_message, user_message]
     if user_feedback:
         messages.append({
             "role": "user",
             "content": f"Я не понял следующие моменты в твоем объяснении: {user_feedback}. Пожалуйста, объясни подробнее, но не расширяй темы за пределы исходного текста."
         })
     
-    try:
-        # Подготовка параметров в зависимости от провайдера LLM
-        if settings.get("llm_provider") == "openrouter":
-            api_endpoint = "https://openrouter.ai/api/v1"
-            model = settings.get("selected_openrouter_model")
-            api_key = settings.get("openrouter_api_key")
-        else:
-            api_endpoint = settings["api_endpoint"]
-            model = settings["model"]
-            api_key = None
-        # Отправляем запрос к API
-        response = send_chat_completion(
-            api_endpoint=api_endpoint,
-            model=model,
-            messages=messages,
-            max_tokens=settings["max_tokens"],
-            temperature=settings["temperature"],
-            api_key=api_key
-        )
-        
-        # Извлекаем текст из ответа
-        explanation_text = get_completion_text(response)
-        
-        if not explanation_text:
-            raise ValueError("Не удалось получить объяснение от нейросети")
+    return messages
+
+def build_all_levels_messages(section_text: str) -> List[Dict[str, str]]:
+    """Формирует сообщения для запроса объяснений всех уровней детализации одним ответом.
+    
+    Args:
+        section_text: Текст раздела для объяснения
         
-        return explanation_text
+    Returns:
+        Список сообщений для чат-модели
+    """
+    text_analysis = analyze_text_complexity(section_text)
+    instructions = (
+        "Объясни учебный материал простым и понятным языком трижды - с каждым уровнем детализации, "
+        "сохраняя уровень обобщения исходного материала.\n\n"
+        + explanation_rules(text_analysis)
+        + """
+
+Ответ должен быть строго в виде JSON-объекта, каждое поле которого содержит HTML объяснения:
+```json
+{
+  "basic": "объяснение с базовым уровнем детализации",
+  "medium": "объяснение со средним уровнем детализации",
+  "detailed": "объяснение с подробным уровнем детализации"
+}
+```"""
+    )
+    return build_section_messages(section_text, instructions)
+
+def parse_all_levels(text: Optional[str]) -> Dict[str, str]:
+    """Разбирает ответ объединённого запроса на объяснения по уровням.
     
-    except Exception as e:
-        print(f"Ошибка при генерации объяснения: {e}")
-        raise ValueError(f"Не удалось сгенерировать объяснение: {str(e)}")
+    Args:
+        text: Текст ответа нейросети
+        
+    Returns:
+        Словарь {уровень детализации: объяснение} только с непустыми объяснениями
+    """
+    try:
+        data = parse_json_response(text)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    levels = {}
+    for level, key in LEVEL_KEYS.items():
+        value = data.get(key)
+        if isinstance(value, str) and value.strip():
+            levels[level] = value.strip()
+    return levels
 
-def pre_generate_explanations(structure_path: str):
-    """Предварительно генерирует объяснения для всех разделов и уровней и сохраняет в structure.json."""
+def pre_generate_explanations(structure_path: str, settings_path: str = "settings.json"):
+    """Предварительно генерирует объяснения для всех разделов и уровней и сохраняет в structure.json.
+    
+    Запросы для разных разделов и уровней независимы и выполняются параллельно
+    (не более settings["llm_concurrency"] одновременно). Успешно полученные
+    объяснения сохраняются, даже если часть запросов завершилась ошибкой.
+    
+    При settings["pregen_combined_levels"] для раздела без объяснений все три
+    уровня запрашиваются одним запросом (текст раздела обрабатывается один раз);
+    уровни, которые не удалось получить так, запрашиваются по отдельности.
+    
+    Raises:
+        ValueError: Если не удалось сгенерировать хотя бы одно объяснение
+    """
     from _6_load_course_structure import load_course_structure
     from _7_save_course_structure import save_course_structure
+    from _22_async_chat_completion import run_chat_completions, DEFAULT_CONCURRENCY
+
+    llm = resolve_llm("explanation", settings_path)
+    settings = llm["settings"]
 
     # Загружаем структуру курса
     sections = load_course_structure(structure_path)
 
-    # Генерируем объяснения для каждого раздела и уровня детализации
+    api_endpoint, model, api_key = llm["api_endpoint"], llm["model"], llm["api_key"]
+    common = dict(
+        api_endpoint=api_endpoint,
+        model=model,
+        temperature=settings["temperature"],
+        api_key=api_key,
+        concurrency=settings.get("llm_concurrency", DEFAULT_CONCURRENCY),
+        task="explanation",
+        cache_prompt=settings.get("cache_prompt", True)
+    )
+
     for sec in sections:
-        content = sec.get("content", "")
         sec.setdefault("explanations", {})
-        for level in ["базовый", "средний", "подробный"]:
+
+    # Разделы без объяснений: все уровни одним запросом
+    if settings.get("pregen_combined_levels", False):
+        combined = [sec for sec in sections if not any(level in sec["explanations"] for level in DETAIL_LEVELS)]
+        combined_plan = [
+            prepare_request(
+                build_all_levels_messages,
+                sec.get("content", ""), model, settings["max_tokens"] * len(DETAIL_LEVELS), settings, "explanation",
+                api_endpoint, api_key
+            )
+            for sec in combined
+        ]
+        combined_results = run_chat_completions(
+            [messages for messages, _, _ in combined_plan],
+            max_tokens=[max_tokens for _, max_tokens, _ in combined_plan],
+            response_format=task_response_format("explanation_levels") if structured_output_enabled(settings) else None,
+            **common
+        )
+        for sec, (_, _, truncated), result in zip(combined, combined_plan, combined_results):
+            if isinstance(result, Exception):
+                print(f"Ошибка при объединённой генерации объяснений для раздела {sec.get('id')}: {result}")
+                continue
+            levels = parse_all_levels(result)
+            if len(levels) < len(DETAIL_LEVELS):
+                print(f"Объединённый ответ для раздела {sec.get('id')} неполон, "
+                      f"недостающие уровни будут запрошены по отдельности")
+            for level, explanation in levels.items():
+                sec["explanations"][level] = TRUNCATION_NOTICE + explanation if truncated else explanation
+
+    # Собираем недостающие пары (раздел, уровень детализации)
+    jobs = []
+    for sec in sections:
+        for level in DETAIL_LEVELS:
             if level in sec["explanations"]:
                 continue
-            explanation = generate_explanation(content, level)
-            sec["explanations"][level] = explanation
+            jobs.append((sec, level))
+
+    # Подгоняем каждый запрос под контекстное окно модели
+    requests_plan = [
+        prepare_request(
+            lambda text, level=level: build_explanation_messages(text, level),
+            sec.get("content", ""), model, settings["max_tokens"], settings, "explanation", api_endpoint, api_key
+        )
+        for sec, level in jobs
+    ]
+
+    results = run_chat_completions(
+        [messages for messages, _, _ in requests_plan],
+        max_tokens=[max_tokens for _, max_tokens, _ in requests_plan],
+        **common
+    )
+
+    failed = 0
+    for (sec, level), (_, _, truncated), explanation in zip(jobs, requests_plan, results):
+        if isinstance(explanation, Exception) or not explanation:
+            print(f"Ошибка при генерации объяснения для раздела {sec.get('id')} ({level}): {explanation}")
+            failed += 1
+            continue
+        sec["explanations"][level] = TRUNCATION_NOTICE + explanation if truncated else explanation
 
     # Сохраняем обновлённую структуру
-    save_course_structure(structure_path, sections) 
\ No newline at end of file
+    save_course_structure(structure_path, sections)
+
+    if failed:
+        raise ValueError(f"Не удалось сгенерировать {failed} из {len(jobs)} объяснений")
@@ -1,10 +1,14 @@
 """Модуль для генерации упражнений к тексту с помощью нейросети."""
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import json
 import re
 
-from _4_load_settings import load_settings
+from _27_llm_provider import resolve_llm
 from _11_send_chat_completion import send_chat_completion, get_completion_text
+from _26_token_budget import prepare_request
+from _33_prompt_layout import build_section_messages
+from _31_structured_output import (exercises_response_format, structured_output_enabled,
+                                   parse_json_response, unwrap_exercises)
 
 def generate_exercises(
     section_text: str,
@@ -13,7 +17,7 @@ def generate_exercises(
     stage: int = 0,
     previous_questions: List[str] = None,
     settings_path: str = "settings.json"
-) -> List[Dict[str, Any]]:
+) -> Tuple[List[Dict[str, Any]], bool]:
     """Генерирует упражнения по тексту через LLM.
     
     Args:
@@ -28,7 +32,8 @@ def generate_exercises(
         settings_path: Путь к файлу настроек
         
     Returns:
-        Список словарей с упражнениями, каждое упражнение содержит:
+        Кортеж (упражнения, был ли текст раздела сокращён под контекст модели).
+        Каждое упражнение содержит:
         - id: уникальный идентификатор
         - type: тип упражнения
         - question: текст вопроса
@@ -40,9 +45,81 @@ def generate_exercises(
         ValueError: При ошибке генерации упражнений
         FileNotFoundError: Если файл настроек не найден
     """
-    # Загружаем настройки
-    settings = load_settings(settings_path)
+    # Параметры LLM и настройки задачи (из кэша реестра провайдеров)
+    llm = resolve_llm("exercises", settings_path)
+    settings = llm["settings"]
     
+    exercises_text = None
+    try:
+        api_endpoint, model, api_key = llm["api_endpoint"], llm["model"], llm["api_key"]
+        # Подгоняем учебный материал и длину ответа под контекстное окно модели
+        messages, max_tokens, truncated = prepare_request(
+            lambda text: build_exercise_messages(text, difficulty, section_title, stage, previous_questions),
+            section_text, model, settings["max_tokens"], settings, "exercises", api_endpoint, api_key
+        )
+        # Отправляем запрос к API
+        response = send_chat_completion(
+            api_endpoint=api_endpoint,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=settings["temperature"],
+            api_key=api_key,
+            # Сервер с поддержкой JSON-схем сразу вернёт корректный JSON
+            response_format=exercises_response_format(stage) if structured_output_enabled(settings) else None,
+            task="exercises",
+            cache_prompt=settings.get("cache_prompt", True),
+            stop_at_json_end=True  # Не ждём, пока модель допишет текст после массива упражнений
+        )
+        
+        # Извлекаем текст из ответа
+        exercises_text = get_completion_text(response)
+        
+        if not exercises_text:
+            raise ValueError("Не удалось получить упражнения от нейросети")
+        
+        # Извлекаем JSON из текста ответа (массив или {"exercises": [...]} в режиме JSON-схемы)
+        exercises = unwrap_exercises(parse_json_response(exercises_text))
+        
+        # Проверяем, что получили список
+        if not isinstance(exercises, list):
+            raise ValueError(f"Некорректный формат упражнений: {exercises}")
+        
+        # Добавляем этап в каждое упражнение, если его нет
+        for ex in exercises:
+            if "stage" not in ex:
+                ex["stage"] = stage
+                
+        return exercises, truncated
+    
+    except json.JSONDecodeError as e:
+        print(f"Ошибка разбора JSON упражнений: {e}")
+        print(f"Полученный текст: {exercises_text}")
+        raise ValueError(f"Не удалось разобрать упражнения: {str(e)}") from e
+    
+    except Exception as e:
+        print(f"Ошибка при генерации упражнений: {e}")
+        raise ValueError(f"Не удалось сгенерировать упражнения: {str(e)}") from e
+
+def build_exercise_messages(
+    section_text: str,
+    difficulty: str = "средний",
+    section_title: str = "",
+    stage: int = 0,
+    previous_questions: List[str] = None
+) -> List[Dict[str, str]]:
+    """Формирует сообщения для запроса упражнений по тексту раздела.
+    
+    Args:
+        section_text: Текст раздела для генерации упражнений
+        difficulty: Сложность упражнений (начальный, средний, продвинутый)
+        section_title: Заголовок раздела (для контекста)
+        stage: Этап обучения (0-2)
+        previous_questions: Список ранее заданных вопросов для избежания повторений
+        
+    Returns:
+        Список сообщений для чат-модели
+    """
     # Инициализируем список предыдущих вопросов, если он не передан
     if previous_questions is None:
         previous_questions = []
@@ -58,155 +135,94 @@ def generate_exercises(
         exercise_type = "открытые вопросы"
         count = 1
     
-    # Строим контекст с названием темы, если оно есть
-    context = f"Тема: {section_title}\n\n" if section_title else ""
-    context += section_text
+    # Название темы относится к заданию: учебный материал стоит в начале запроса
+    # без изменений, чтобы сервер мог повторно использовать его обработку
+    topic = f"Тема раздела: {section_title}\n\n" if section_title else ""
         
     # Формируем системное сообщение в зависимости от этапа
     if stage == 0:
-        system_content = f"""Твоя задача – сгенерировать {count} вопросов с единственным правильным ответом. Уровень сложности вопросов - {difficulty}. На основании следующего учебного материала:
-        Учебный материал:\n\n{context}\n\n
-
-Напомню, Твоя задача – сгенерировать {count} вопросов с единственным правильным ответом. Уровень сложности вопросов - {difficulty}.
+        system_content = f"""Ты – опытный преподаватель-методист, создающий вопросы на проверку изученного материала.
+{topic}Твоя задача – сгенерировать {count} вопросов с единственным правильным ответом. Уровень сложности вопросов - {difficulty}. На основании учебного материала выше.
 Требования:
 1. Каждый вопрос должен иметь 4-5 вариантов ответа, включая ровно один правильный ответ.
 2. Правильно овтетить на вопрос можно толко прочитав и поняв учебный материал.
 3. Вопросы должны быть разнообразными и не повторять предыдущие.
 
-Твой ответ должен быть строго в виде JSON-массива:
+Твой ответ должен быть строго в виде JSON-объекта с массивом упражнений в поле "exercises":
 ```json
-[
-  {{
-    "id": 1,
-    "type": "тесты с единственным правильным ответом",
-    "question": "текст вопроса",
-    "options": ["вариант 1", "вариант 2", "...", "..."],
-    "correct_answer": "правильный ответ",
-    "stage": {stage}
-  }},
-  ...
-]
+{{
+  "exercises": [
+    {{
+      "id": 1,
+      "type": "тесты с единственным правильным ответом",
+      "question": "текст вопроса",
+      "options": ["вариант 1", "вариант 2", "...", "..."],
+      "correct_answer": "правильный ответ",
+      "stage": {stage}
+    }},
+    ...
+  ]
+}}
 ```"""
     elif stage == 1:
         system_content = f"""Ты – опытный преподаватель-методист, создающий тесты с несколькими правильными ответами на основе учебного материала.
-Твоя задача – сгенерировать {count} вопроса с несколькими правильными ответами. Уровнь сложности вопросов - {difficulty}. На основании следующего учебного материала:
-        Учебный материал:\n\n{context}\n\n
-
-Напомню, твоя задача – сгенерировать {count} вопроса с несколькими правильными ответами. Уровнь сложности вопросов - {difficulty}. 
+{topic}Твоя задача – сгенерировать {count} вопроса с несколькими правильными ответами. Уровнь сложности вопросов - {difficulty}. На основании учебного материала выше.
 Требования:
 1. Каждый вопрос должен иметь 5-7 вариантов ответа, из которых 2-3 правильные.
 2. Правильно овтетить на вопрос можно толко прочитав и поняв учебный материал.
 3. Вопросы должны быть разнообразными и не повторять предыдущие.
 
-Ответ должен быть строго в виде JSON-массива:
+Ответ должен быть строго в виде JSON-объекта с массивом упражнений в поле "exercises":
 ```json
-[
-  {{
-    "id": 1,
-    "type": "тесты с несколькими правильными ответами",
-    "question": "текст вопроса",
-    "options": ["вариант 1", "...", "...", "...", "..."],
-    "correct_answer": ["правильный1", "правильный2"],
-    "stage": {stage}
-  }},
-  ...
-]
+{{
+  "exercises": [
+    {{
+      "id": 1,
+      "type": "тесты с несколькими правильными ответами",
+      "question": "текст вопроса",
+      "options": ["вариант 1", "...", "...", "...", "..."],
+      "correct_answer": ["правильный1", "правильный2"],
+      "stage": {stage}
+    }},
+    ...
+  ]
+}}
 ```"""
     else:
-        system_content = f"""Твоя задача – сгенерировать {count} открытый вопрос уровня сложности {difficulty}. На основании следующего учебного материала:
-Учебный материал:\n\n{context}\n\n
-
-Напомнию, твоя задача – сгенерировать {count} открытый вопрос уровня сложности {difficulty}. На основании предоставленного учебного материала.
+        system_content = f"""Ты – опытный преподаватель-методист, создающий вопросы на проверку изученного материала.
+{topic}Твоя задача – сгенерировать {count} открытый вопрос уровня сложности {difficulty}. На основании учебного материала выше.
 Требования:
 1. Вопросы должны быть разнообразными и не повторять предыдущие.
 2. Для вопроса предоставь модельный ответ и критерии оценки.
 3. Правильный ответ на вопрос должен прямо следовать из учебного материала. 
 4. Сложность вопроса должна соответствовать уровню сложности, объему и детализации предоставленного Учебного материала.
 
-Ответ должен быть строго в виде JSON-массива:
+Ответ должен быть строго в виде JSON-объекта с массивом упражнений в поле "exercises":
 ```json
-[
-  {{
-    "id": 1,
-    "type": "открытые вопросы",
-    "question": "текст вопроса",
-    "model_answer": "текст модельного ответа",
-    "evaluation_criteria": ["критерий1", "критерий2"],
-    "stage": {stage}
-  }},
-  ...
-]
+{{
+  "exercises": [
+    {{
+      "id": 1,
+      "type": "открытые вопросы",
+      "question": "текст вопроса",
+      "model_answer": "текст модельного ответа",
+      "evaluation_criteria": ["критерий1", "критерий2"],
+      "stage": {stage}
+    }},
+    ...
+  ]
+}}
 ```"""
 
-    system_message = {"role": "system", "content": "Ты – опытный преподаватель-методист, создающий вопросы на проверку изученного материала."}
-    
-    # Stage-specific инструкции как пользовательский промпт
-    user_message_content = system_content
+    # Stage-specific инструкции следуют за общим префиксом с учебным материалом
+    instructions = system_content
     if previous_questions:
-        user_message_content += "\n\nИзбегай следующих вопросов (они уже были заданы):\n"
+        instructions += "\n\nИзбегай следующих вопросов (они уже были заданы):\n"
         for i, q in enumerate(previous_questions, 1):
             if i <= 10:
-                user_message_content += f"{i}. {q}\n"
-    user_message = {"role": "user", "content": user_message_content}
+                instructions += f"{i}. {q}\n"
     
-    try:
-        # Подготовка параметров в зависимости от провайдера LLM
-        if settings.get("llm_provider") == "openrouter":
-            api_endpoint = "https://openrouter.ai/api/v1"
-            model = settings.get("selected_openrouter_model")
-            api_key = settings.get("openrouter_api_key")
-        else:
-            api_endpoint = settings["api_endpoint"]
-            model = settings["model"]
-            api_key = None
-        # Отправляем запрос к API
-        response = send_chat_completion(
-            api_endpoint=api_endpoint,
-            model=model,
-            messages=[system_message, user_message],
-            max_tokens=settings["max_tokens"],
-            temperature=settings["temperature"],
-            api_key=api_key
-        )
-        
-        # Извлекаем текст из ответа
-        exercises_text = get_completion_text(response)
-        
-        if not exercises_text:
-            raise ValueError("Не удалось получить упражнения от нейросети")
-        
-        # Извлекаем JSON из текста ответа
-        # Может быть обернут в тройные бэктики, так что удаляем их
-        json_text = exercises_text.strip()
-        if json_text.startswith("```json"):
-            json_text = json_text.split("```json", 1)[1]
-        if json_text.startswith("```"):
-            json_text = json_text.split("```", 1)[1]
-        if json_text.endswith("```"):
-            json_text = json_text.rsplit("```", 1)[0]
-        
-        # Парсим JSON
-        exercises = json.loads(json_text)
-        
-        # Проверяем, что получили список
-        if not isinstance(exercises, list):
-            raise ValueError(f"Некорректный формат упражнений: {exercises}")
-        
-        # Добавляем этап в каждое упражнение, если его нет
-        for ex in exercises:
-            if "stage" not in ex:
-                ex["stage"] = stage
-                
-        return exercises
-    
-    except json.JSONDecodeError as e:
-        print(f"Ошибка разбора JSON упражнений: {e}")
-        print(f"Полученный текст: {exercises_text}")
-        raise ValueError(f"Не удалось разобрать упражнения: {str(e)}")
-    
-    except Exception as e:
-        print(f"Ошибка при генерации упражнений: {e}")
-        raise ValueError(f"Не удалось сгенерировать упражнения: {str(e)}")
+    return build_section_messages(section_text, instructions)
 
 def check_single_choice_answer(exercise: Dict[str, Any], user_answer: str) -> Dict[str, Any]:
     """Проверяет ответ на тест с единственным правильным ответом без использования LLM.
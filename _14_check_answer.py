@@ -1,16 +1,20 @@
 """Модуль для проверки ответов пользователя на упражнения."""
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Optional, Callable
 import json
 
-from _4_load_settings import load_settings
-from _11_send_chat_completion import send_chat_completion, get_completion_text
+from _27_llm_provider import resolve_llm
+from _11_send_chat_completion import (send_chat_completion, get_completion_text,
+                                      stream_chat_completion, strip_think_tags)
 from _13_generate_exercises import check_single_choice_answer, check_multiple_choice_answer
+from _31_structured_output import task_response_format, structured_output_enabled, parse_json_response
+from _33_prompt_layout import build_section_messages
 
 def check_answer(
     exercise: Dict[str, Any],
     user_answer: str,
     user_comment: str = "",
-    settings_path: str = "settings.json"
+    settings_path: str = "settings.json",
+    on_delta: Optional[Callable[[str], None]] = None
 ) -> Dict[str, Any]:
     """Проверяет правильность ответа пользователя.
     
@@ -19,6 +23,8 @@ def check_answer(
         user_answer: Ответ пользователя
         user_comment: Комментарий пользователя к ответу (для этапов 1 и 2)
         settings_path: Путь к файлу настроек
+        on_delta: Необязательная функция для потокового получения ответа нейросети
+            (для открытых вопросов); вызывается с каждым новым фрагментом текста
         
     Returns:
         Словарь с результатами проверки:
@@ -49,12 +55,12 @@ def check_answer(
         if user_comment.strip():
             try:
                 mm_context = exercise.get("context", "")
-                system_message = {
-                    "role": "system",
-                    "content": "Ты — опытный преподаватель, проверяющий тесты с несколькими правильными ответами. Учитывай учебный материал и комментарий студента. Если аргументы студента обоснованы и верны по материалу, ответ считаем правильным. Формат: {'is_correct': true/false, 'feedback': 'объяснение'}"
-                }
-                user_content = (
-                    f"Учебный материал:\n{mm_context}\n\n"
+                # Учебный материал в начале запроса совпадает с запросами объяснений и упражнений
+                instructions = (
+                    "Ты — опытный преподаватель, проверяющий тесты с несколькими правильными ответами. "
+                    "Учитывай учебный материал и комментарий студента. Если аргументы студента обоснованы "
+                    "и верны по материалу, ответ считаем правильным. "
+                    "Формат: {'is_correct': true/false, 'feedback': 'объяснение'}\n\n"
                     f"Вопрос: {exercise.get('question')}\n"
                     "Варианты:\n"
                     + "".join(f"{i}. {opt}\n" for i, opt in enumerate(exercise.get('options', []), 1))
@@ -63,33 +69,21 @@ def check_answer(
                     f"Комментарий студента: {user_comment}\n\n"
                     "Оцени, правильно ли ответил студент и дай подробный, но лаконичный отзыв."
                 )
-                user_message = {"role": "user", "content": user_content}
-                settings = load_settings(settings_path)
-                # Подготовка параметров в зависимости от провайдера LLM
-                if settings.get("llm_provider") == "openrouter":
-                    api_endpoint = "https://openrouter.ai/api/v1"
-                    model = settings.get("selected_openrouter_model")
-                    api_key = settings.get("openrouter_api_key")
-                else:
-                    api_endpoint = settings["api_endpoint"]
-                    model = settings["model"]
-                    api_key = None
+                llm = resolve_llm("check", settings_path)
+                settings = llm["settings"]
+                api_endpoint, model, api_key = llm["api_endpoint"], llm["model"], llm["api_key"]
                 resp = send_chat_completion(
                     api_endpoint=api_endpoint, model=model,
-                    messages=[system_message, user_message],
-                    max_tokens=settings["max_tokens"], temperature=0.3,
-                    api_key=api_key
+                    messages=build_section_messages(mm_context, instructions),
+                    max_tokens=settings["max_tokens"], temperature=llm["temperature"],
+                    api_key=api_key, use_cache=True,
+                    response_format=task_response_format("check_choice") if structured_output_enabled(settings) else None,
+                    stop_at_json_end=True, task="check",
+                    cache_prompt=settings.get("cache_prompt", True)
                 )
                 text = get_completion_text(resp)
-                json_text = text.strip()
-                if json_text.startswith("```json"):
-                    json_text = json_text.split("```json", 1)[1]
-                if json_text.startswith("```"):
-                    json_text = json_text.split("```", 1)[1]
-                if json_text.endswith("```"):
-                    json_text = json_text.rsplit("```", 1)[0]
                 try:
-                    llm_res = json.loads(json_text)
+                    llm_res = parse_json_response(text)
                     return llm_res
                 except Exception:
                     pass
@@ -105,8 +99,9 @@ def check_answer(
         return local
     
     # Для открытых вопросов (этап 2) используем проверку через нейросеть
-    # Загружаем настройки
-    settings = load_settings(settings_path)
+    # Параметры LLM и настройки задачи (из кэша реестра провайдеров)
+    llm = resolve_llm("check", settings_path)
+    settings = llm["settings"]
     
     # Формируем системное сообщение в зависимости от этапа
     if stage == 1:  # Тесты с несколькими правильными ответами (используется только для объяснения ошибок)
@@ -179,43 +174,50 @@ def check_answer(
         "content": content
     }
     
+    # JSON-схема результата проверки (если сервер поддерживает структурированный вывод)
+    response_format = None
+    if structured_output_enabled(settings):
+        response_format = task_response_format("check_choice" if stage == 1 else "check_open")
+    
     try:
-        # Подготовка параметров в зависимости от провайдера LLM
-        if settings.get("llm_provider") == "openrouter":
-            api_endpoint = "https://openrouter.ai/api/v1"
-            model = settings.get("selected_openrouter_model")
-            api_key = settings.get("openrouter_api_key")
+        api_endpoint, model, api_key = llm["api_endpoint"], llm["model"], llm["api_key"]
+        if on_delta:
+            # Потоковый режим: фрагменты ответа передаются в интерфейс по мере генерации
+            chunks = stream_chat_completion(
+                api_endpoint=api_endpoint,
+                model=model,
+                messages=[system_message, user_message],
+                max_tokens=settings["max_tokens"],
+                temperature=llm["temperature"],
+                api_key=api_key,
+                on_delta=on_delta,
+                response_format=response_format,
+                task="check"
+            )
+            check_text = strip_think_tags("".join(chunks)).strip()
         else:
-            api_endpoint = settings["api_endpoint"]
-            model = settings["model"]
-            api_key = None
-        # Отправляем запрос к API
-        response = send_chat_completion(
-            api_endpoint=api_endpoint,
-            model=model,
-            messages=[system_message, user_message],
-            max_tokens=settings["max_tokens"],
-            temperature=0.3,
-            api_key=api_key
-        )
-        
-        # Извлекаем текст из ответа
-        check_text = get_completion_text(response)
+            # Отправляем запрос к API
+            response = send_chat_completion(
+                api_endpoint=api_endpoint,
+                model=model,
+                messages=[system_message, user_message],
+                max_tokens=settings["max_tokens"],
+                temperature=llm["temperature"],
+                api_key=api_key,
+                use_cache=True,
+                response_format=response_format,
+                task="check",
+                stop_at_json_end=True  # Прерываем генерацию после закрывающей скобки результата
+            )
+            
+            # Извлекаем текст из ответа
+            check_text = get_completion_text(response)
         
         if not check_text:
             raise ValueError("Не удалось получить результат проверки от нейросети")
         
-        # Извлекаем JSON из текста ответа
-        json_text = check_text.strip()
-        if json_text.startswith("```json"):
-            json_text = json_text.split("```json", 1)[1]
-        if json_text.startswith("```"):
-            json_text = json_text.split("```", 1)[1]
-        if json_text.endswith("```"):
-            json_text = json_text.rsplit("```", 1)[0]
-        
-        # Парсим JSON
-        check_result = json.loads(json_text)
+        # Извлекаем и разбираем JSON из текста ответа
+        check_result = parse_json_response(check_text)
         
         # Добавляем правильный ответ или модельный ответ для открытых вопросов
         check_result["correct_answer"] = exercise.get("correct_answer", exercise.get("model_answer", ""))
@@ -262,8 +264,9 @@ def get_llm_explanation_for_wrong_answer(
     Returns:
         Текст объяснения от нейросети или пустая строка в случае ошибки
     """
-    # Загружаем настройки
-    settings = load_settings(settings_path)
+    # Параметры LLM и настройки задачи (из кэша реестра провайдеров)
+    llm = resolve_llm("check", settings_path)
+    settings = llm["settings"]
     
     # Преобразуем числовые ответы пользователя в текстовые варианты для лучшего понимания нейросетью
     user_answer_text = []
@@ -329,23 +332,17 @@ def get_llm_explanation_for_wrong_answer(
     }
     
     try:
-        # Подготовка параметров в зависимости от провайдера LLM
-        if settings.get("llm_provider") == "openrouter":
-            api_endpoint = "https://openrouter.ai/api/v1"
-            model = settings.get("selected_openrouter_model")
-            api_key = settings.get("openrouter_api_key")
-        else:
-            api_endpoint = settings["api_endpoint"]
-            model = settings["model"]
-            api_key = None
+        api_endpoint, model, api_key = llm["api_endpoint"], llm["model"], llm["api_key"]
         # Отправляем запрос к API
         response = send_chat_completion(
             api_endpoint=api_endpoint,
             model=model,
             messages=[system_message, user_message],
             max_tokens=settings["max_tokens"],
-            temperature=0.3,
-            api_key=api_key
+            temperature=llm["temperature"],
+            api_key=api_key,
+            use_cache=True,
+            task="check"
         )
         
         # Извлекаем текст из ответа
@@ -355,4 +352,4 @@ def get_llm_explanation_for_wrong_answer(
     
     except Exception as e:
         print(f"Ошибка при получении объяснения от нейросети: {e}")
-        return "" 
\ No newline at end of file
+        return ""
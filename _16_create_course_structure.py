@@ -34,7 +34,7 @@ def create_course_structure(parent, current_text):
             temp_path = temp_file.name
             
         # Инициализируем курс
-        initialize_course(temp_path, directory)
+        initialize_course(temp_path, directory, parent.settings.get("content_offsets", False))
         
         # Удаляем временный файл
         os.unlink(temp_path)
@@ -2,10 +2,12 @@
 
 import os
 from PyQt5.QtWidgets import QMessageBox, QFileDialog
-from _6_load_course_structure import load_course_structure
+from _6_load_course_structure import load_course_index
+from _7_save_course_structure import migrate_course_layout
 from _8_load_progress import load_progress
+from _38_content_reader import close_readers
 from _15_log_error import log_error
-from _9_save_progress import save_progress
+from _9_save_progress import save_progress, flush_progress
 
 def open_course(parent):
     """Открывает созданный курс.
@@ -30,11 +32,16 @@ def open_course(parent):
             QMessageBox.warning(parent, "Предупреждение", f"Файл структуры курса не найден: {structure_path}")
             return False, "", []
         
-        # Загружаем структуру курса
-        structure = load_course_structure(structure_path)
+        # Отображения content.txt прежнего курса больше не нужны
+        close_readers()
+        
+        # Загружаем оглавление курса; текст разделов читается при их открытии
+        migrate_course_layout(structure_path)
+        structure = load_course_index(directory)
         
         # Загружаем прогресс пользователя
         progress_path = os.path.join(directory, "progress.json")
+        flush_progress()  # Отложенные изменения должны попасть в файл до его чтения
         try:
             progress = load_progress(progress_path)
             parent.progress = progress
@@ -1,27 +1,27 @@
 """Модуль для выбора раздела курса."""
 
 import os
-import json
 from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QListWidget, QPushButton, QMessageBox
 from _15_log_error import log_error
+from _6_load_course_structure import load_course_index
+from _35_sqlite_storage import get_storage
 
 def get_course_sections(course_dir):
-    """Получает список разделов курса из его директории.
+    """Получает оглавление курса из его директории.
     
     Args:
         course_dir: Путь к директории курса
         
     Returns:
-        list: Список разделов курса (каждый раздел - словарь)
+        list: Список разделов курса (словари с id и title; текст загружается через load_section)
     """
     try:
         structure_file = os.path.join(course_dir, "structure.json")
         
-        if not os.path.exists(structure_file):
+        if get_storage() is None and not os.path.exists(structure_file):
             return []
         
-        with open(structure_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_course_index(course_dir)
     except Exception as e:
         log_error(f"Ошибка при загрузке структуры курса: {str(e)}")
         return []
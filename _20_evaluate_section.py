@@ -1,8 +1,8 @@
 """Модуль для комплексной оценки раздела курса по пятибалльной шкале."""
-import json
 from typing import Dict, Any
 from _11_send_chat_completion import send_chat_completion, get_completion_text
-from _4_load_settings import load_settings
+from _27_llm_provider import resolve_llm
+from _31_structured_output import task_response_format, structured_output_enabled, parse_json_response
 
 def evaluate_section(
     progress_data: Dict[str, Any],
@@ -13,8 +13,9 @@ def evaluate_section(
 
     Возвращает словарь с ключами 'score' (int) и 'comment' (str).
     """
-    # Загружаем настройки
-    settings = load_settings(settings_path)
+    # Параметры LLM и настройки задачи (из кэша реестра провайдеров)
+    llm = resolve_llm("evaluate", settings_path)
+    settings = llm["settings"]
     section = progress_data['sections'].get(section_id, {})
     exercises = section.get('exercises', [])
     # Формируем контент для LLM
@@ -29,38 +30,27 @@ def evaluate_section(
         {"role": "system", "content": "Ты - опытный преподаватель, оценивающий усвоение курса, отвечай строго в формате JSON {\"score\": <число 1-5>, \"comment\": \"<текст>\"} без дополнительного текста."},
         {"role": "user", "content": content}
     ]
-    # Подготовка параметров в зависимости от провайдера LLM
-    if settings.get("llm_provider") == "openrouter":
-        api_endpoint = "https://openrouter.ai/api/v1"
-        model = settings.get("selected_openrouter_model")
-        api_key = settings.get("openrouter_api_key")
-    else:
-        api_endpoint = settings['api_endpoint']
-        model = settings['model']
-        api_key = None
+    api_endpoint, model, api_key = llm["api_endpoint"], llm["model"], llm["api_key"]
+    # JSON-схема ответа: сервер с её поддержкой не вернёт некорректный JSON
+    response_format = task_response_format("evaluate") if structured_output_enabled(settings) else None
     resp = send_chat_completion(
         api_endpoint=api_endpoint,
         model=model,
         messages=messages,
         max_tokens=settings.get("max_tokens", 200),
-        temperature=0.3,
-        api_key=api_key
+        temperature=llm["temperature"],
+        api_key=api_key,
+        use_cache=True,  # Оценка неизменного прогресса берётся из кэша
+        response_format=response_format,
+        task="evaluate",
+        stop_at_json_end=True  # Прерываем генерацию после закрывающей скобки оценки
     )
     text = get_completion_text(resp) or ''
-    # Убираем обёртку ```json если есть
-    def _clean_json(t):
-        # Извлекаем JSON-объект из текста (убираем возможные code fencing)
-        start = t.find('{')
-        end = t.rfind('}')
-        if start != -1 and end != -1:
-            return t[start:end+1]
-        return t.strip()
-    text = _clean_json(text)
     data = None
     # Попытка парсинга с регенерацией при неудаче
     for attempt in range(2):  # первая попытка и одна регенерация
         try:
-            data = json.loads(text)
+            data = parse_json_response(text)
             break
         except Exception:
             # Повторный запрос для получения корректного JSON
@@ -69,12 +59,16 @@ def evaluate_section(
                 model=model,
                 messages=messages,
                 max_tokens=settings.get("max_tokens", 200),
-                temperature=0.3,
-                api_key=api_key
+                temperature=llm["temperature"],
+                api_key=api_key,
+                refresh_cache=True,  # Заменяем в кэше непригодный ответ
+                response_format=response_format,
+                task="evaluate",
+                stop_at_json_end=True
             )
-            text = _clean_json(get_completion_text(resp) or '')
-    if not data:
+            text = get_completion_text(resp) or ''
+    if not isinstance(data, dict) or not data:
         return {'score': 0, 'comment': 'Не удалось получить оценку'}
     score = int(data.get('score', 0))
     comment = data.get('comment', '')
-    return {'score': score, 'comment': comment} 
\ No newline at end of file
+    return {'score': score, 'comment': comment}
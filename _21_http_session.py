@@ -0,0 +1,78 @@
+"""Модуль пула HTTP-сессий с keep-alive для запросов к API нейросети."""
+import atexit
+import threading
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Размер пула соединений по умолчанию (на один хост)
+DEFAULT_POOL_SIZE = 10
+
+_sessions: Dict[str, requests.Session] = {}
+_lock = threading.Lock()
+_pool_size = DEFAULT_POOL_SIZE
+
+
+def _endpoint_key(api_endpoint: str) -> str:
+    """Нормализует базовый URL API для использования в качестве ключа пула."""
+    return api_endpoint.rstrip("/")
+
+
+def configure_sessions(pool_size: int) -> None:
+    """Задаёт размер пула соединений для новых сессий.
+
+    Уже созданные сессии закрываются, чтобы новое значение вступило в силу.
+
+    Args:
+        pool_size: Максимальное количество одновременно открытых соединений на endpoint
+    """
+    global _pool_size
+    pool_size = max(1, int(pool_size))
+    if pool_size == _pool_size:
+        return
+    _pool_size = pool_size
+    close_sessions()
+
+
+def get_session(api_endpoint: str) -> requests.Session:
+    """Возвращает общую сессию с пулом соединений для указанного endpoint.
+
+    Сессия переиспользует TCP/TLS-соединения между запросами (keep-alive),
+    поэтому повторные вызовы к одному серверу не тратят время на рукопожатие.
+
+    Args:
+        api_endpoint: Базовый URL API (например, http://localhost:1234/v1)
+
+    Returns:
+        Объект requests.Session, общий для всех вызовов к этому endpoint
+    """
+    key = _endpoint_key(api_endpoint)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Connection": "keep-alive"})
+            _sessions[key] = session
+        return session
+
+
+def close_sessions() -> None:
+    """Закрывает все открытые сессии и освобождает соединения.
+
+    Вызывается при закрытии приложения; безопасна для повторного вызова.
+    """
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        try:
+            session.close()
+        except Exception as e:
+            print(f"Ошибка при закрытии HTTP-сессии: {e}")
+
+
+atexit.register(close_sessions)
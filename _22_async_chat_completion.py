@@ -0,0 +1,198 @@
+"""Модуль для асинхронной отправки запросов к API чат-модели с ограничением параллелизма."""
+import asyncio
+from typing import List, Dict, Any, Optional, Callable, Sequence, Union
+
+from _11_send_chat_completion import send_chat_completion, get_completion_text
+from _25_rate_limiter import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+# Количество одновременных запросов по умолчанию
+DEFAULT_CONCURRENCY = 4
+
+
+async def async_send_chat_completion(
+    api_endpoint: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    api_key: Optional[str] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    use_cache: bool = False,
+    priority: str = PRIORITY_INTERACTIVE,
+    task: Optional[str] = None,
+    cache_prompt: bool = False,
+    response_format: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Асинхронный вариант send_chat_completion.
+
+    Запрос выполняется в пуле потоков через общую HTTP-сессию, поэтому
+    несколько корутин используют одни и те же keep-alive соединения.
+
+    Args:
+        api_endpoint: Базовый URL API (например, http://localhost:1234/v1)
+        model: Название модели
+        messages: Список сообщений в формате [{role: "system|user|assistant", content: "текст"}]
+        max_tokens: Максимальное количество токенов в ответе
+        temperature: Температура (креативность) от 0.0 до 1.0
+        api_key: Ключ API для OpenRouter (Bearer), если требуется
+        semaphore: Семафор, ограничивающий число одновременных запросов
+        use_cache: Использовать постоянный кэш ответов
+        priority: Приоритет запроса для ограничителя частоты
+        task: Название задачи для телеметрии
+        cache_prompt: Просить локальный сервер сохранить обработанный префикс запроса
+        response_format: JSON-схема ответа (structured output), если нужна
+
+    Returns:
+        Словарь с ответом от API
+
+    Raises:
+        requests.RequestException: При ошибке соединения или запроса
+        ValueError: При ошибке в формате ответа
+    """
+    async def call():
+        return await asyncio.to_thread(
+            send_chat_completion,
+            api_endpoint=api_endpoint,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            api_key=api_key,
+            use_cache=use_cache,
+            priority=priority,
+            task=task,
+            cache_prompt=cache_prompt,
+            response_format=response_format
+        )
+
+    if semaphore is None:
+        return await call()
+    async with semaphore:
+        return await call()
+
+
+async def async_get_completion_text(
+    api_endpoint: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    api_key: Optional[str] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    use_cache: bool = False,
+    priority: str = PRIORITY_INTERACTIVE,
+    task: Optional[str] = None,
+    cache_prompt: bool = False,
+    response_format: Optional[Dict[str, Any]] = None
+) -> Optional[str]:
+    """Асинхронно отправляет запрос и извлекает текст ответа.
+
+    Args:
+        api_endpoint: Базовый URL API
+        model: Название модели
+        messages: Список сообщений для модели
+        max_tokens: Максимальное количество токенов в ответе
+        temperature: Температура (креативность) от 0.0 до 1.0
+        api_key: Ключ API для OpenRouter (Bearer), если требуется
+        semaphore: Семафор, ограничивающий число одновременных запросов
+        use_cache: Использовать постоянный кэш ответов
+        priority: Приоритет запроса для ограничителя частоты
+        task: Название задачи для телеметрии
+        cache_prompt: Просить локальный сервер сохранить обработанный префикс запроса
+        response_format: JSON-схема ответа (structured output), если нужна
+
+    Returns:
+        Текст ответа или None, если структура ответа некорректна
+    """
+    response = await async_send_chat_completion(
+        api_endpoint, model, messages, max_tokens, temperature, api_key, semaphore, use_cache, priority, task,
+        cache_prompt, response_format
+    )
+    return get_completion_text(response)
+
+
+def run_chat_completions(
+    message_lists: Sequence[List[Dict[str, str]]],
+    api_endpoint: str,
+    model: str,
+    max_tokens: Union[int, Sequence[int]],
+    temperature: float,
+    api_key: Optional[str] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    use_cache: bool = False,
+    priority: str = PRIORITY_BACKGROUND,
+    task: Optional[str] = None,
+    cache_prompt: bool = False,
+    response_format: Optional[Dict[str, Any]] = None
+) -> List[Any]:
+    """Выполняет N запросов параллельно и возвращает тексты ответов в исходном порядке.
+
+    Ошибка отдельного запроса не прерывает остальные: на её месте в
+    результате оказывается объект исключения.
+
+    Args:
+        message_lists: Списки сообщений, по одному на запрос
+        api_endpoint: Базовый URL API
+        model: Название модели
+        max_tokens: Максимальное количество токенов в ответе (одно значение
+            для всех запросов или список по одному на запрос)
+        temperature: Температура (креативность) от 0.0 до 1.0
+        api_key: Ключ API для OpenRouter (Bearer), если требуется
+        concurrency: Максимальное число одновременных запросов
+        use_cache: Использовать постоянный кэш ответов
+        priority: Приоритет запросов для ограничителя частоты (по умолчанию фоновый,
+            чтобы пакетная задача уступала действиям пользователя)
+        task: Название задачи для телеметрии
+        cache_prompt: Просить локальный сервер сохранить обработанный префикс запроса
+        response_format: JSON-схема ответа (structured output), если нужна
+
+    Returns:
+        Список текстов ответов (или исключений) в порядке message_lists
+    """
+    if isinstance(max_tokens, int):
+        max_tokens = [max_tokens] * len(message_lists)
+
+    async def run():
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        tasks = [
+            async_get_completion_text(
+                api_endpoint, model, messages, limit, temperature, api_key, semaphore, use_cache,
+                priority, task, cache_prompt, response_format
+            )
+            for messages, limit in zip(message_lists, max_tokens)
+        ]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    if not message_lists:
+        return []
+    return asyncio.run(run())
+
+
+def run_concurrently(
+    calls: Sequence[Callable[[], Any]],
+    concurrency: int = DEFAULT_CONCURRENCY
+) -> List[Any]:
+    """Выполняет произвольные блокирующие функции параллельно с ограничением.
+
+    Используется для пакетных операций, в которых каждый элемент сам
+    обращается к нейросети (например, проверка нескольких ответов).
+
+    Args:
+        calls: Функции без аргументов
+        concurrency: Максимальное число одновременно выполняемых функций
+
+    Returns:
+        Список результатов (или исключений) в порядке calls
+    """
+    async def run():
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def guarded(call):
+            async with semaphore:
+                return await asyncio.to_thread(call)
+
+        return await asyncio.gather(*(guarded(call) for call in calls), return_exceptions=True)
+
+    if not calls:
+        return []
+    return asyncio.run(run())
@@ -0,0 +1,215 @@
+"""Модуль постоянного кэша ответов нейросети с вытеснением давно не использованных записей (LRU)."""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+# Параметры кэша по умолчанию
+DEFAULT_CACHE_DIR = "llm_cache"
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+_lock = threading.Lock()
+_config = {
+    "cache_dir": DEFAULT_CACHE_DIR,
+    "max_entries": DEFAULT_MAX_ENTRIES,
+    "max_bytes": DEFAULT_MAX_BYTES
+}
+# Индекс записей на диске: ключ -> [время последнего обращения, размер в байтах]
+_index: Optional[Dict[str, List[float]]] = None
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def configure_cache(
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    max_bytes: int = DEFAULT_MAX_BYTES
+) -> None:
+    """Задаёт расположение и ограничения размера кэша.
+
+    Args:
+        cache_dir: Директория для файлов кэша
+        max_entries: Максимальное количество записей
+        max_bytes: Максимальный суммарный размер записей в байтах
+    """
+    global _index
+    with _lock:
+        if cache_dir != _config["cache_dir"]:
+            _index = None
+        _config["cache_dir"] = cache_dir
+        _config["max_entries"] = max(1, int(max_entries))
+        _config["max_bytes"] = max(1, int(max_bytes))
+        if _index is not None:
+            _evict()
+
+
+def make_cache_key(
+    api_endpoint: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    **extra: Any
+) -> str:
+    """Вычисляет ключ кэша по параметрам запроса.
+
+    Args:
+        api_endpoint: Базовый URL API
+        model: Название модели
+        messages: Список сообщений для модели
+        temperature: Температура
+        max_tokens: Максимальное количество токенов в ответе
+        **extra: Прочие параметры запроса, влияющие на ответ
+
+    Returns:
+        Шестнадцатеричная строка SHA-256
+    """
+    payload = {
+        "api_endpoint": api_endpoint.rstrip("/"),
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    payload.update({k: v for k, v in extra.items() if v is not None})
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(_config["cache_dir"], f"{key}.json")
+
+
+def _load_index() -> Dict[str, List[float]]:
+    """Строит индекс записей по содержимому директории кэша (однократно)."""
+    global _index
+    if _index is None:
+        _index = {}
+        cache_dir = _config["cache_dir"]
+        if os.path.isdir(cache_dir):
+            for name in os.listdir(cache_dir):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(cache_dir, name))
+                except OSError:
+                    continue
+                _index[name[:-len(".json")]] = [st.st_mtime, st.st_size]
+    return _index
+
+
+def _evict() -> None:
+    """Удаляет давно не использованные записи, пока кэш не уложится в ограничения."""
+    index = _load_index()
+    total = sum(size for _, size in index.values())
+    if len(index) <= _config["max_entries"] and total <= _config["max_bytes"]:
+        return
+    for key, (_, size) in sorted(index.items(), key=lambda item: item[1][0]):
+        if len(index) <= _config["max_entries"] and total <= _config["max_bytes"]:
+            break
+        try:
+            os.remove(_entry_path(key))
+        except OSError:
+            pass
+        del index[key]
+        total -= size
+        _stats["evictions"] += 1
+
+
+def get_cached_response(key: str) -> Optional[Dict[str, Any]]:
+    """Возвращает сохранённый ответ API по ключу или None.
+
+    Args:
+        key: Ключ, полученный из make_cache_key
+
+    Returns:
+        Словарь с ответом от API или None, если записи нет
+    """
+    with _lock:
+        index = _load_index()
+        if key not in index:
+            _stats["misses"] += 1
+            return None
+        path = _entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                response = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            # Повреждённую запись удаляем и считаем промахом
+            index.pop(key, None)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            _stats["misses"] += 1
+            return None
+        # Отмечаем запись как недавно использованную
+        now = time.time()
+        index[key][0] = now
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        _stats["hits"] += 1
+        return response
+
+
+def store_response(key: str, response: Dict[str, Any]) -> None:
+    """Сохраняет ответ API в кэш.
+
+    Запись выполняется через временный файл, поэтому прерванная запись
+    не оставляет повреждённых файлов.
+
+    Args:
+        key: Ключ, полученный из make_cache_key
+        response: Словарь с ответом от API
+    """
+    with _lock:
+        index = _load_index()
+        cache_dir = _config["cache_dir"]
+        os.makedirs(cache_dir, exist_ok=True)
+        path = _entry_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(response, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            index[key] = [time.time(), os.path.getsize(path)]
+            _stats["stores"] += 1
+        except OSError as e:
+            print(f"Ошибка записи в кэш ответов: {e}")
+            return
+        _evict()
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Возвращает счётчики попаданий и промахов кэша.
+
+    Returns:
+        Словарь с ключами hits, misses, stores, evictions, hit_rate, entries, bytes
+    """
+    with _lock:
+        index = _load_index()
+        lookups = _stats["hits"] + _stats["misses"]
+        return dict(
+            _stats,
+            hit_rate=_stats["hits"] / lookups if lookups else 0.0,
+            entries=len(index),
+            bytes=int(sum(size for _, size in index.values()))
+        )
+
+
+def clear_cache() -> None:
+    """Удаляет все записи кэша и сбрасывает счётчики."""
+    with _lock:
+        index = _load_index()
+        for key in list(index):
+            try:
+                os.remove(_entry_path(key))
+            except OSError:
+                pass
+        index.clear()
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,255 @@
+"""Модуль единой политики повторов запросов к API: экспоненциальная задержка, джиттер и автомат-предохранитель."""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, TypeVar
+
+import requests
+
+T = TypeVar("T")
+
+# HTTP-коды, при которых запрос имеет смысл повторить
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+_config = {
+    "max_attempts": 3,          # Общее количество попыток, включая первую
+    "base_delay": 1.0,          # Базовая задержка перед повтором (секунды)
+    "max_delay": 30.0,          # Максимальная задержка перед повтором (секунды)
+    "failure_threshold": 3,     # Подряд неудачных вызовов до размыкания цепи
+    "reset_timeout": 30.0       # Время в разомкнутом состоянии до пробного запроса
+}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Сервер признан недоступным, запрос отклонён без обращения к сети."""
+
+
+class CircuitBreaker:
+    """Автомат-предохранитель для одного endpoint.
+
+    После failure_threshold подряд неудачных вызовов цепь размыкается, и
+    запросы сразу завершаются ошибкой CircuitOpenError. Через reset_timeout
+    пропускается один пробный запрос: при успехе цепь замыкается снова.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self, api_endpoint: str) -> None:
+        """Проверяет, можно ли выполнять запрос.
+
+        Raises:
+            CircuitOpenError: Если цепь разомкнута
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self.probe_in_flight:
+                raise CircuitOpenError(
+                    f"Сервер {api_endpoint} недоступен, повторная попытка через {max(remaining, 0):.0f} с"
+                )
+            # Полуоткрытое состояние: пропускаем один пробный запрос
+            self.probe_in_flight = True
+
+    def record_success(self) -> None:
+        """Отмечает успешный вызов и замыкает цепь."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Снимает отметку пробного запроса, не меняя счётчик (исход вызова ничего не говорит о сервере)."""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Отмечает неудачный вызов и при необходимости размыкает цепь."""
+        with self._lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def configure_retry(
+    max_attempts: int = 3,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    failure_threshold: int = 3,
+    reset_timeout: float = 30.0
+) -> None:
+    """Задаёт параметры политики повторов и автомата-предохранителя.
+
+    Args:
+        max_attempts: Общее количество попыток, включая первую
+        base_delay: Базовая задержка перед повтором в секундах
+        max_delay: Максимальная задержка перед повтором в секундах
+        failure_threshold: Число подряд неудачных вызовов до размыкания цепи
+        reset_timeout: Время в секундах до пробного запроса после размыкания
+    """
+    _config.update({
+        "max_attempts": max(1, int(max_attempts)),
+        "base_delay": max(0.0, float(base_delay)),
+        "max_delay": max(0.0, float(max_delay)),
+        "failure_threshold": max(1, int(failure_threshold)),
+        "reset_timeout": max(0.0, float(reset_timeout))
+    })
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def get_circuit_breaker(api_endpoint: str) -> CircuitBreaker:
+    """Возвращает автомат-предохранитель для endpoint (создаёт при первом обращении)."""
+    key = api_endpoint.rstrip("/")
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(_config["failure_threshold"], _config["reset_timeout"])
+            _breakers[key] = breaker
+        return breaker
+
+
+def is_retryable(error: Exception) -> bool:
+    """Определяет, является ли ошибка временной.
+
+    Временные ошибки: таймауты, обрывы соединения, HTTP 408/425/429/5xx.
+    Прочие ошибки HTTP (400, 401, 404 и т.д.) и ошибки формата ответа
+    считаются постоянными и не повторяются.
+
+    Args:
+        error: Исключение, возникшее при запросе
+
+    Returns:
+        True, если запрос имеет смысл повторить
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        return response is not None and response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (requests.Timeout, requests.ConnectionError))
+
+
+def is_server_reply(error: Exception) -> bool:
+    """Определяет, ответил ли сервер на запрос, пусть и отказом повторить позже.
+
+    HTTP 429 и ответы с заголовком Retry-After означают, что сервер работает
+    и ограничивает частоту запросов; автомат-предохранитель их не учитывает.
+
+    Args:
+        error: Исключение, возникшее при запросе
+
+    Returns:
+        True, если ошибка - ответ работающего сервера
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return False
+    return response.status_code == 429 or bool(response.headers.get("Retry-After"))
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Извлекает задержку из заголовка Retry-After ответа сервера.
+
+    Args:
+        error: Исключение, возникшее при запросе
+
+    Returns:
+        Задержка в секундах или None, если заголовка нет
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def compute_backoff(attempt: int) -> float:
+    """Вычисляет задержку перед повтором (экспоненциальная, с полным джиттером).
+
+    Args:
+        attempt: Номер завершившейся неудачей попытки, начиная с 1
+
+    Returns:
+        Задержка в секундах
+    """
+    ceiling = min(_config["max_delay"], _config["base_delay"] * (2 ** (attempt - 1)))
+    return random.uniform(0, ceiling)
+
+
+def call_with_retry(
+    api_endpoint: str,
+    func: Callable[[], T],
+    on_retry: Optional[Callable[[int, Exception], None]] = None
+) -> T:
+    """Выполняет запрос с повторами временных ошибок и учётом состояния сервера.
+
+    Args:
+        api_endpoint: Базовый URL API (ключ автомата-предохранителя)
+        func: Функция, выполняющая один запрос
+        on_retry: Необязательная функция, вызываемая перед каждым повтором
+            с номером неудачной попытки и ошибкой
+
+    Returns:
+        Результат func
+
+    Raises:
+        CircuitOpenError: Если сервер признан недоступным
+        Exception: Последняя ошибка func, если повторы не помогли или ошибка постоянная
+    """
+    breaker = get_circuit_breaker(api_endpoint)
+    # Предохранитель учитывает вызов целиком, а не отдельные попытки
+    breaker.before_call(api_endpoint)
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            result = func()
+        except Exception as e:
+            if not is_retryable(e):
+                if getattr(e, "response", None) is not None:
+                    # Ответ HTTP с постоянной ошибкой (400, 401, 404...) означает, что сервер работает
+                    breaker.record_success()
+                else:
+                    # Локальная ошибка (разбор ответа, ошибка в коде) о сервере ничего не говорит
+                    breaker.release_probe()
+                raise
+            if attempt >= _config["max_attempts"]:
+                if is_server_reply(e):
+                    # Ограничение частоты - ответ работающего сервера, а не его отказ
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+                raise
+            delay = get_retry_after(e)
+            if delay is None:
+                delay = compute_backoff(attempt)
+            delay = min(delay, _config["max_delay"])
+            print(f"Временная ошибка API ({e}), повтор {attempt + 1}/{_config['max_attempts']} через {delay:.1f} с")
+            if on_retry:
+                on_retry(attempt, e)
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
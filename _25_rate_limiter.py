@@ -0,0 +1,138 @@
+"""Модуль клиентского ограничения частоты запросов и расхода токенов (token bucket) по провайдерам."""
+import threading
+import time
+from typing import Dict, Any, Optional
+
+# Приоритеты запросов: интерактивные (из интерфейса) обслуживаются раньше фоновых
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+
+
+class TokenBucket:
+    """Корзина токенов: ёмкость capacity, пополнение rate единиц в секунду."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        """Пополняет корзину пропорционально прошедшему времени."""
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Возвращает время ожидания (секунды), через которое доступно amount единиц."""
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float) -> None:
+        """Списывает amount единиц (уровень может уйти в минус, это «долг»)."""
+        self.level = max(-self.capacity, self.level - amount)
+
+
+class RateLimiter:
+    """Ограничитель запросов одного провайдера с двумя корзинами и приоритетной полосой.
+
+    Пока есть ожидающие интерактивные запросы, фоновые не получают разрешения,
+    поэтому нажатие кнопки в интерфейсе не стоит в очереди за пакетной задачей.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._cond = threading.Condition()
+        self._interactive_waiting = 0
+
+    def _buckets(self):
+        return [b for b in (self.requests, self.tokens) if b is not None]
+
+    def acquire(self, tokens: int = 0, priority: str = PRIORITY_INTERACTIVE) -> float:
+        """Блокирует поток, пока бюджет провайдера не позволит выполнить запрос.
+
+        Args:
+            tokens: Оценка количества токенов запроса
+            priority: PRIORITY_INTERACTIVE или PRIORITY_BACKGROUND
+
+        Returns:
+            Время ожидания в секундах
+        """
+        if not self._buckets():
+            return 0.0
+        started = time.monotonic()
+        interactive = priority != PRIORITY_BACKGROUND
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    for bucket in self._buckets():
+                        bucket.refill()
+                    if not interactive and self._interactive_waiting:
+                        self._cond.wait(0.5)
+                        continue
+                    wait = max(
+                        self.requests.time_until(1) if self.requests else 0.0,
+                        self.tokens.time_until(tokens) if self.tokens else 0.0
+                    )
+                    if wait <= 0:
+                        if self.requests:
+                            self.requests.consume(1)
+                        if self.tokens:
+                            self.tokens.consume(tokens)
+                        return time.monotonic() - started
+                    self._cond.wait(min(wait, 1.0))
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def charge(self, tokens: int) -> None:
+        """Дополнительно списывает токены, израсходованные на ответ модели.
+
+        Args:
+            tokens: Фактическое количество токенов сверх учтённых в acquire
+        """
+        if self.tokens is None or tokens <= 0:
+            return
+        with self._cond:
+            self.tokens.refill()
+            self.tokens.consume(tokens)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_lock = threading.Lock()
+
+
+def configure_rate_limits(rate_limits: Dict[str, Dict[str, Any]]) -> None:
+    """Задаёт бюджеты провайдеров из настроек.
+
+    Формат: {"openrouter": {"requests_per_minute": 20, "tokens_per_minute": 100000}, ...}.
+    Отсутствующее или нулевое значение означает отсутствие ограничения.
+
+    Args:
+        rate_limits: Словарь бюджетов по имени провайдера
+    """
+    with _lock:
+        _limiters.clear()
+        for provider, limits in (rate_limits or {}).items():
+            _limiters[provider] = RateLimiter(
+                limits.get("requests_per_minute", 0),
+                limits.get("tokens_per_minute", 0)
+            )
+
+
+def provider_for_endpoint(api_endpoint: str) -> str:
+    """Определяет имя провайдера по адресу API."""
+    return "openrouter" if "openrouter.ai" in api_endpoint else "local"
+
+
+def get_rate_limiter(provider: str) -> Optional[RateLimiter]:
+    """Возвращает ограничитель провайдера или None, если ограничений нет."""
+    with _lock:
+        return _limiters.get(provider)
+
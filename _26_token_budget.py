@@ -0,0 +1,210 @@
+"""Модуль оценки количества токенов и распределения контекстного окна модели."""
+import re
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+import requests
+
+from _10_get_models import get_model_context_length, get_model_infos, DEFAULT_MODELS_TTL
+from _15_log_error import log_warning
+
+# Запас на служебные токены шаблона чата и погрешность оценки
+SAFETY_MARGIN = 128
+# Минимальный резерв под ответ модели
+MIN_OUTPUT_TOKENS = 1024
+
+_CYRILLIC_RE = re.compile(r'[Ѐ-ӿ]')
+_SPACE_RE = re.compile(r'\s+')
+
+
+class ContextOverflowError(ValueError):
+    """Запрос не помещается в контекстное окно модели даже после сокращения текста."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Быстро оценивает количество токенов в тексте без токенизатора.
+
+    Оценка намеренно завышена: кириллица в BPE-словарях распространённых
+    моделей кодируется примерно вдвое плотнее латиницы (≈2.5 символа на
+    токен против ≈4).
+
+    Args:
+        text: Текст для оценки
+
+    Returns:
+        Оценка количества токенов
+    """
+    if not text:
+        return 0
+    cyrillic = len(_CYRILLIC_RE.findall(text))
+    spaces = len(_SPACE_RE.findall(text))
+    other = len(text) - cyrillic - spaces
+    return int(cyrillic / 2.5 + other / 4 + spaces * 0.25) + 1
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
+    """Оценивает количество токенов в списке сообщений чата (с учётом разметки ролей)."""
+    return sum(estimate_tokens(m.get("content") or "") + 4 for m in messages) + 2
+
+
+def get_context_limit(
+    model: str,
+    settings: Dict[str, Any],
+    api_endpoint: Optional[str] = None,
+    api_key: Optional[str] = None
+) -> Optional[int]:
+    """Определяет размер контекстного окна модели.
+
+    Значение берётся из settings["context_limits"][model], затем из
+    метаданных списка моделей (если указан api_endpoint, список сервера
+    обновляется не чаще раза в settings["models_cache_ttl"]; OpenRouter
+    сообщает context_length для всех моделей), затем из
+    settings["default_context_length"].
+
+    Args:
+        model: Название модели
+        settings: Словарь настроек
+        api_endpoint: Базовый URL API, у которого можно запросить метаданные моделей
+        api_key: Ключ API (Bearer), если требуется
+
+    Returns:
+        Размер контекстного окна в токенах или None, если он неизвестен
+    """
+    limits = settings.get("context_limits") or {}
+    if model in limits:
+        return int(limits[model])
+    if api_endpoint:
+        try:
+            get_model_infos(api_endpoint, api_key, settings.get("models_cache_ttl", DEFAULT_MODELS_TTL))
+        except (requests.RequestException, ValueError) as e:
+            print(f"Не удалось получить метаданные моделей {api_endpoint}: {e}")
+    known = get_model_context_length(model)
+    if known:
+        return known
+    default = settings.get("default_context_length")
+    return int(default) if default else None
+
+
+def fit_max_tokens(prompt_tokens: int, max_tokens: int, context_limit: int) -> int:
+    """Уменьшает max_tokens так, чтобы запрос и ответ помещались в контекст.
+
+    Args:
+        prompt_tokens: Оценка токенов запроса
+        max_tokens: Желаемое ограничение длины ответа
+        context_limit: Размер контекстного окна
+
+    Returns:
+        Допустимое значение max_tokens (не меньше 1)
+    """
+    return max(1, min(max_tokens, context_limit - prompt_tokens - SAFETY_MARGIN))
+
+
+def split_text(text: str, max_tokens: int) -> List[str]:
+    """Разбивает текст на части не длиннее max_tokens по границам абзацев.
+
+    Абзац, который сам по себе превышает лимит, делится по предложениям,
+    а при необходимости — по символам.
+
+    Args:
+        text: Исходный текст
+        max_tokens: Максимальная оценка токенов одной части
+
+    Returns:
+        Список частей текста в исходном порядке
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    def pieces(block: str, separators: List[str]) -> List[str]:
+        if estimate_tokens(block) <= max_tokens:
+            return [block]
+        if not separators:
+            # Делим по символам с запасом на плотный текст
+            step = max(1, int(max_tokens * 2.5))
+            return [block[i:i + step] for i in range(0, len(block), step)]
+        sep, rest = separators[0], separators[1:]
+        result = []
+        for part in re.split(sep, block):
+            if part.strip():
+                result.extend(pieces(part, rest))
+        return result
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for piece in pieces(text, [r'\n\s*\n', r'(?<=[.!?…])\s+']):
+        piece_tokens = estimate_tokens(piece)
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def fit_text_to_budget(text: str, max_tokens: int) -> Tuple[str, bool]:
+    """Сокращает текст до max_tokens, отбрасывая конец по границе абзаца.
+
+    Args:
+        text: Исходный текст
+        max_tokens: Максимальная оценка токенов результата
+
+    Returns:
+        Кортеж (текст, был ли текст сокращён)
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text, False
+    return split_text(text, max_tokens)[0], True
+
+
+def prepare_request(
+    build_messages: Callable[[str], List[Dict[str, str]]],
+    text: str,
+    model: str,
+    max_tokens: int,
+    settings: Dict[str, Any],
+    task: str = "",
+    api_endpoint: Optional[str] = None,
+    api_key: Optional[str] = None
+) -> Tuple[List[Dict[str, str]], int, bool]:
+    """Подгоняет текст раздела и max_tokens под контекстное окно модели.
+
+    Если размер контекста неизвестен (см. get_context_limit), текст и
+    max_tokens не меняются.
+
+    Args:
+        build_messages: Функция, строящая сообщения запроса по тексту раздела
+        text: Текст раздела
+        model: Название модели
+        max_tokens: Желаемое ограничение длины ответа из настроек
+        settings: Словарь настроек
+        task: Название задачи для сообщения в журнале
+        api_endpoint: Базовый URL API (для метаданных модели)
+        api_key: Ключ API (Bearer), если требуется
+
+    Returns:
+        Кортеж (сообщения, max_tokens, был ли текст сокращён)
+
+    Raises:
+        ContextOverflowError: Если в контекст не помещаются даже инструкции без текста
+    """
+    context_limit = get_context_limit(model, settings, api_endpoint, api_key)
+    if context_limit is None:
+        return build_messages(text), max_tokens, False
+    fixed_tokens = estimate_messages_tokens(build_messages(""))
+    output_reserve = min(max_tokens, max(MIN_OUTPUT_TOKENS, context_limit // 4))
+    budget = context_limit - fixed_tokens - output_reserve - SAFETY_MARGIN
+    if budget <= 0:
+        raise ContextOverflowError(
+            f"Запрос ({task or 'LLM'}) не помещается в контекст модели {model}: {context_limit} токенов"
+        )
+
+    text, truncated = fit_text_to_budget(text, budget)
+    if truncated:
+        log_warning(
+            f"Текст раздела для задачи '{task}' сокращён до ~{budget} токенов, "
+            f"чтобы поместиться в контекст модели {model} ({context_limit} токенов)"
+        )
+    messages = build_messages(text)
+    return messages, fit_max_tokens(estimate_messages_tokens(messages), max_tokens, context_limit), truncated
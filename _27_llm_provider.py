@@ -0,0 +1,137 @@
+"""Модуль реестра провайдеров LLM: единое определение адреса API, модели и ключа для задач приложения."""
+import os
+import threading
+from typing import Dict, Any, Callable, Optional, Tuple
+
+from _4_load_settings import load_settings
+
+OPENROUTER_ENDPOINT = "https://openrouter.ai/api/v1"
+
+# Параметры задач, отличающиеся от общих настроек (проверка и оценка детерминированнее генерации)
+TASK_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "check": {"temperature": 0.3},
+    "evaluate": {"temperature": 0.3}
+}
+
+_lock = threading.Lock()
+# Кэш настроек: путь -> (время изменения файла, настройки)
+_settings_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+# Кэш разрешённых конфигураций: (путь, задача) -> конфигурация
+_resolved: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+
+def _resolve_local(settings: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "api_endpoint": settings["api_endpoint"],
+        "model": settings["model"],
+        "api_key": None
+    }
+
+
+def _resolve_openrouter(settings: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "api_endpoint": OPENROUTER_ENDPOINT,
+        "model": settings.get("selected_openrouter_model"),
+        "api_key": settings.get("openrouter_api_key")
+    }
+
+
+_providers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "local": _resolve_local,
+    "openrouter": _resolve_openrouter
+}
+
+
+def register_provider(name: str, resolver: Callable[[Dict[str, Any]], Dict[str, Any]]) -> None:
+    """Регистрирует провайдера LLM.
+
+    Args:
+        name: Значение настройки llm_provider
+        resolver: Функция, возвращающая по настройкам словарь с ключами
+            api_endpoint, model, api_key
+    """
+    with _lock:
+        _providers[name] = resolver
+        _resolved.clear()
+
+
+def _file_mtime(settings_path: str) -> float:
+    try:
+        return os.stat(settings_path).st_mtime
+    except OSError:
+        return 0.0
+
+
+def get_settings(settings_path: str = "settings.json") -> Dict[str, Any]:
+    """Возвращает настройки из кэша, перечитывая файл только после его изменения.
+
+    Args:
+        settings_path: Путь к файлу настроек
+
+    Returns:
+        Копия словаря настроек
+    """
+    with _lock:
+        return dict(_get_settings_locked(settings_path))
+
+
+def _get_settings_locked(settings_path: str) -> Dict[str, Any]:
+    mtime = _file_mtime(settings_path)
+    cached = _settings_cache.get(settings_path)
+    if cached is None or cached[0] != mtime:
+        settings = load_settings(settings_path)
+        # Файл мог быть создан load_settings, поэтому время изменения берём заново
+        _settings_cache[settings_path] = (_file_mtime(settings_path), settings)
+        for key in [key for key in _resolved if key[0] == settings_path]:
+            del _resolved[key]
+        return settings
+    return cached[1]
+
+
+def resolve_llm(task: Optional[str] = None, settings_path: str = "settings.json") -> Dict[str, Any]:
+    """Определяет параметры обращения к LLM для задачи.
+
+    Общие настройки дополняются значениями из TASK_DEFAULTS и
+    settings["task_overrides"][task] (например, отдельная модель или
+    провайдер для форматирования текста).
+
+    Args:
+        task: Название задачи (format, explanation, exercises, check, evaluate)
+        settings_path: Путь к файлу настроек
+
+    Returns:
+        Словарь с ключами provider, api_endpoint, model, api_key,
+        max_tokens, temperature и settings (настройки с учётом переопределений)
+
+    Raises:
+        ValueError: Если провайдер не зарегистрирован
+    """
+    with _lock:
+        settings = _get_settings_locked(settings_path)
+        key = (settings_path, task or "")
+        resolved = _resolved.get(key)
+        if resolved is None:
+            task_settings = dict(settings)
+            if task:
+                task_settings.update(TASK_DEFAULTS.get(task, {}))
+                task_settings.update((settings.get("task_overrides") or {}).get(task, {}))
+            provider = task_settings.get("llm_provider", "local")
+            resolver = _providers.get(provider)
+            if resolver is None:
+                raise ValueError(f"Неизвестный провайдер LLM: {provider}")
+            resolved = dict(resolver(task_settings))
+            resolved.update({
+                "provider": provider,
+                "max_tokens": task_settings.get("max_tokens"),
+                "temperature": task_settings.get("temperature"),
+                "settings": task_settings
+            })
+            _resolved[key] = resolved
+        return dict(resolved)
+
+
+def invalidate_llm_config() -> None:
+    """Сбрасывает кэш настроек и параметров провайдеров (после сохранения настроек)."""
+    with _lock:
+        _settings_cache.clear()
+        _resolved.clear()
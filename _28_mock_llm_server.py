@@ -0,0 +1,361 @@
+"""Модуль локального OpenAI-совместимого сервера-заглушки для нагрузочного тестирования без нейросети.
+
+Запуск: python _28_mock_llm_server.py --port 8089 --latency 0.2 --tps 50 --error-rate 0.05
+После запуска в настройках приложения укажите API endpoint http://127.0.0.1:8089/v1.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from typing import Dict, Any, List, Optional
+
+from _26_token_budget import estimate_tokens, estimate_messages_tokens
+from _31_structured_output import parse_json_response
+from _33_prompt_layout import TASK_SEPARATOR
+
+DEFAULT_PORT = 8089
+DEFAULT_MODELS = ["mock-model"]
+# Количество символов в одном фрагменте потокового ответа (примерно один токен)
+STREAM_CHUNK_CHARS = 4
+
+_config: Dict[str, Any] = {
+    "latency": 0.0,            # Задержка до первого токена (секунды)
+    "tokens_per_second": 0.0,  # Скорость генерации; 0 — без ограничения
+    "error_rate": 0.0,         # Доля запросов, завершающихся ошибкой
+    "error_status": 503,       # HTTP-код ошибки
+    "models": DEFAULT_MODELS,
+    "context_length": 8192,
+    "responses": {},           # Шаблоны ответов по задачам (string.Template)
+    "reject_response_format": False,  # Отвечать 400 на запросы с JSON-схемой
+    "trailing_text": ""        # Текст, дописываемый после ответа (болтливая модель)
+}
+
+
+def detect_task(messages: List[Dict[str, str]]) -> str:
+    """Определяет задачу приложения по тексту запроса.
+
+    Args:
+        messages: Список сообщений запроса
+
+    Returns:
+        Одно из значений: exercises, check, wrong_answer, evaluate, format,
+        explanation_levels, explanation
+    """
+    # Инструкции задачи находятся в системном сообщении или после учебного материала
+    system = " ".join(
+        (m.get("content") or "").split(TASK_SEPARATOR)[-1] if m.get("role") == "user" else m.get("content") or ""
+        for m in messages if m.get("role") == "system" or TASK_SEPARATOR in (m.get("content") or "")
+    )
+    if "создающий вопросы" in system or "создающий тесты" in system:
+        return "exercises"
+    if "проверяющий" in system:
+        return "check"
+    if "объясняющий студентам их ошибки" in system:
+        return "wrong_answer"
+    if "оценивающий усвоение" in system:
+        return "evaluate"
+    if "Отформатируй" in " ".join(m.get("content") or "" for m in messages):
+        return "format"
+    if '"detailed"' in system:
+        return "explanation_levels"
+    return "explanation"
+
+
+def _user_text(messages: List[Dict[str, str]]) -> str:
+    return "\n".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+
+
+def _canned_exercises(user_text: str) -> str:
+    stage_match = re.search(r'"stage":\s*(\d)', user_text)
+    stage = int(stage_match.group(1)) if stage_match else 0
+    count_match = re.search(r'сгенерировать (\d+)', user_text)
+    count = int(count_match.group(1)) if count_match else 1
+    exercises = []
+    for i in range(1, count + 1):
+        if stage == 0:
+            options = [f"Вариант {n}" for n in range(1, 5)]
+            exercises.append({
+                "id": i, "type": "тесты с единственным правильным ответом",
+                "question": f"Тестовый вопрос {i}?", "options": options,
+                "correct_answer": options[0], "stage": 0
+            })
+        elif stage == 1:
+            options = [f"Вариант {n}" for n in range(1, 6)]
+            exercises.append({
+                "id": i, "type": "тесты с несколькими правильными ответами",
+                "question": f"Тестовый вопрос {i}?", "options": options,
+                "correct_answer": options[:2], "stage": 1
+            })
+        else:
+            exercises.append({
+                "id": i, "type": "открытые вопросы",
+                "question": f"Открытый вопрос {i}?", "model_answer": "Модельный ответ.",
+                "evaluation_criteria": ["полнота", "точность"], "stage": 2
+            })
+    return "```json\n" + json.dumps(exercises, ensure_ascii=False, indent=2) + "\n```"
+
+
+def build_response_text(messages: List[Dict[str, str]], model: str) -> str:
+    """Формирует текст ответа заглушки для запроса.
+
+    Если для задачи задан шаблон в _config["responses"], он заполняется
+    переменными $model, $task и $text (текст запроса пользователя).
+
+    Args:
+        messages: Список сообщений запроса
+        model: Название модели из запроса
+
+    Returns:
+        Текст ответа
+    """
+    task = detect_task(messages)
+    user_text = _user_text(messages)
+    template = _config["responses"].get(task)
+    if template is not None:
+        return Template(template).safe_substitute(model=model, task=task, text=user_text)
+
+    if task == "exercises":
+        return _canned_exercises(user_text)
+    if task == "check":
+        return json.dumps({
+            "is_correct": True,
+            "feedback": "Ответ верный и достаточно полный.",
+            "strengths": ["понимание темы"],
+            "areas_for_improvement": ["больше примеров"]
+        }, ensure_ascii=False)
+    if task == "wrong_answer":
+        return "Правильные варианты следуют из учебного материала, выбранные варианты ему противоречат."
+    if task == "evaluate":
+        return json.dumps({"score": 4, "comment": "Материал в целом усвоен."}, ensure_ascii=False)
+    if task == "format":
+        match = re.search(r'Исходный текст:\n(.*)\n\nОтформатируй', user_text, re.S)
+        source = match.group(1) if match else user_text
+        return "\n".join(f"<p>{p.strip()}</p>" for p in re.split(r'\n\s*\n', source) if p.strip())
+    if task == "explanation_levels":
+        return json.dumps({
+            key: f"<h2>Объяснение ({key})</h2>\n<p>Тестовое объяснение раздела, сформированное сервером-заглушкой.</p>"
+            for key in ("basic", "medium", "detailed")
+        }, ensure_ascii=False)
+    return (
+        "<h2>Объяснение</h2>\n"
+        "<p>Это тестовое объяснение раздела, сформированное сервером-заглушкой.</p>\n"
+        "<ul><li>Первая ключевая идея</li><li>Вторая ключевая идея</li></ul>"
+    )
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов /v1/models и /v1/chat/completions."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Не засоряем вывод строкой на каждый запрос
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {
+                "object": "list",
+                "data": [
+                    {"id": model, "object": "model", "owned_by": "mock",
+                     "context_length": _config["context_length"]}
+                    for model in _config["models"]
+                ]
+            })
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            messages = request["messages"]
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": {"message": f"Invalid request: {e}"}})
+            return
+
+        if _config["latency"]:
+            time.sleep(_config["latency"])
+        if random.random() < _config["error_rate"]:
+            self._send_json(
+                _config["error_status"],
+                {"error": {"message": "Mock server: simulated failure"}},
+                {"Retry-After": "1"}
+            )
+            return
+
+        if request.get("response_format") and _config["reject_response_format"]:
+            self._send_json(400, {"error": {"message": "response_format is not supported"}})
+            return
+
+        model = request.get("model") or _config["models"][0]
+        text = build_response_text(messages, model)
+        if _config["trailing_text"]:
+            # Имитация модели, которая продолжает писать после ответа
+            text += _config["trailing_text"]
+        for stop in request.get("stop") or []:
+            if stop and stop in text:
+                text = text[:text.index(stop)]
+        if request.get("response_format") and detect_task(messages) == "exercises":
+            # В режиме JSON-схемы упражнения возвращаются объектом {"exercises": [...]}
+            try:
+                text = json.dumps({"exercises": parse_json_response(text)}, ensure_ascii=False)
+            except ValueError:
+                pass
+        usage = {
+            "prompt_tokens": estimate_messages_tokens(messages),
+            "completion_tokens": estimate_tokens(text)
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        if request.get("stream"):
+            self._stream(completion_id, model, text)
+            return
+
+        tps = _config["tokens_per_second"]
+        if tps:
+            time.sleep(usage["completion_tokens"] / tps)
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        })
+
+    def _stream(self, completion_id: str, model: str, text: str) -> None:
+        """Отправляет ответ частями в формате Server-Sent Events."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        delay = 1.0 / _config["tokens_per_second"] if _config["tokens_per_second"] else 0.0
+        try:
+            event({"role": "assistant"})
+            for i in range(0, len(text), STREAM_CHUNK_CHARS):
+                if delay:
+                    time.sleep(delay)
+                event({"content": text[i:i + STREAM_CHUNK_CHARS]})
+            event({}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент прервал чтение потока
+            pass
+
+
+def configure_mock_server(**options: Any) -> None:
+    """Изменяет параметры заглушки (latency, tokens_per_second, error_rate,
+    error_status, models, context_length, responses, reject_response_format, trailing_text);
+    действует и на запущенный сервер.
+    """
+    unknown = set(options) - set(_config)
+    if unknown:
+        raise ValueError(f"Неизвестные параметры заглушки: {', '.join(sorted(unknown))}")
+    _config.update(options)
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = DEFAULT_PORT, **options: Any) -> ThreadingHTTPServer:
+    """Запускает сервер-заглушку в фоновом потоке.
+
+    Args:
+        host: Адрес для прослушивания
+        port: Порт (0 — выбрать свободный)
+        **options: Параметры для configure_mock_server
+
+    Returns:
+        Запущенный сервер; адрес API: f"http://{host}:{server.server_port}/v1".
+        Для остановки вызовите server.shutdown()
+    """
+    configure_mock_server(**options)
+    server = ThreadingHTTPServer((host, port), MockLLMHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="mock-llm-server", daemon=True)
+    thread.start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI-совместимый сервер-заглушка для тестирования Tutor")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка до первого токена, с")
+    parser.add_argument("--tps", type=float, default=0.0, help="скорость генерации, токенов/с (0 — без ограничения)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля запросов с ошибкой (0..1)")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP-код имитируемой ошибки")
+    parser.add_argument("--model", action="append", dest="models", help="название модели (можно несколько)")
+    parser.add_argument("--context-length", type=int, default=8192)
+    parser.add_argument("--responses", help="JSON-файл с шаблонами ответов по задачам")
+    parser.add_argument("--reject-response-format", action="store_true",
+                        help="отклонять запросы с JSON-схемой (проверка запасного режима)")
+    parser.add_argument("--trailing-text", default="",
+                        help="текст, дописываемый после ответа (модель, не останавливающаяся вовремя)")
+    args = parser.parse_args()
+
+    responses = {}
+    if args.responses:
+        with open(args.responses, 'r', encoding='utf-8') as f:
+            responses = json.load(f)
+
+    configure_mock_server(
+        latency=args.latency,
+        tokens_per_second=args.tps,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        models=args.models or DEFAULT_MODELS,
+        context_length=args.context_length,
+        responses=responses,
+        reject_response_format=args.reject_response_format,
+        trailing_text=args.trailing_text
+    )
+    server = ThreadingHTTPServer((args.host, args.port), MockLLMHandler)
+    server.daemon_threads = True
+    print(f"Сервер-заглушка запущен: http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Модуль распределения запросов между несколькими серверами инференса с проверкой их доступности."""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
+
+from _21_http_session import get_session
+from _24_retry_policy import is_retryable
+
+# Интервал фоновой проверки серверов (секунды)
+DEFAULT_HEALTH_INTERVAL = 15.0
+# Время, на которое отказавший сервер исключается из распределения (секунды)
+DEFAULT_DOWN_COOLDOWN = 30.0
+
+
+class EndpointPool:
+    """Группа равноправных серверов с одинаковым API.
+
+    Запрос направляется на исправный сервер с наименьшим числом
+    выполняющихся запросов (least outstanding requests). Сервер, на котором
+    произошла временная ошибка (обрыв соединения, таймаут, 5xx), исключается
+    из распределения на cooldown секунд или до успешной проверки /models.
+    """
+
+    def __init__(self, endpoints: List[str], cooldown: float = DEFAULT_DOWN_COOLDOWN):
+        self.cooldown = cooldown
+        self.nodes: Dict[str, Dict[str, Any]] = {
+            url: {"outstanding": 0, "down_until": 0.0, "requests": 0, "failures": 0}
+            for url in endpoints
+        }
+        self._lock = threading.Lock()
+
+    def acquire(self) -> str:
+        """Выбирает сервер для очередного запроса и учитывает запрос как выполняющийся."""
+        with self._lock:
+            now = time.monotonic()
+            healthy = [url for url, node in self.nodes.items() if node["down_until"] <= now]
+            if healthy:
+                url = min(healthy, key=lambda u: self.nodes[u]["outstanding"])
+            else:
+                # Все серверы недоступны: пробуем тот, что отказал раньше остальных
+                url = min(self.nodes, key=lambda u: self.nodes[u]["down_until"])
+            node = self.nodes[url]
+            node["outstanding"] += 1
+            node["requests"] += 1
+            return url
+
+    def release(self, url: str, error: Optional[Exception] = None) -> None:
+        """Отмечает завершение запроса; при временной ошибке исключает сервер из распределения."""
+        with self._lock:
+            node = self.nodes.get(url)
+            if node is None:
+                return
+            node["outstanding"] = max(0, node["outstanding"] - 1)
+            if error is not None and is_retryable(error):
+                node["failures"] += 1
+                node["down_until"] = time.monotonic() + self.cooldown
+                print(f"Сервер {url} исключён из распределения на {self.cooldown:.0f} с: {error}")
+
+    def mark_health(self, url: str, healthy: bool) -> None:
+        """Обновляет состояние сервера по результату проверки доступности."""
+        with self._lock:
+            node = self.nodes.get(url)
+            if node is None:
+                return
+            node["down_until"] = 0.0 if healthy else time.monotonic() + self.cooldown
+
+    def check_health(self) -> None:
+        """Проверяет все серверы запросом списка моделей."""
+        for url in list(self.nodes):
+            try:
+                response = get_session(url).get(f"{url}/models", timeout=3)
+                self.mark_health(url, response.ok)
+            except Exception:
+                self.mark_health(url, False)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Возвращает состояние серверов: выполняющиеся запросы, всего запросов, отказы, доступность."""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                url: dict(node, healthy=node["down_until"] <= now)
+                for url, node in self.nodes.items()
+            }
+
+
+_pools: Dict[str, EndpointPool] = {}
+_pools_lock = threading.Lock()
+_health_stop: Optional[threading.Event] = None
+
+
+def _pool_key(api_endpoint: str) -> str:
+    return api_endpoint.rstrip("/")
+
+
+def configure_endpoint_pool(
+    api_endpoint: str,
+    endpoints: List[str],
+    health_interval: float = DEFAULT_HEALTH_INTERVAL,
+    cooldown: float = DEFAULT_DOWN_COOLDOWN
+) -> None:
+    """Задаёт группу серверов для api_endpoint из настроек.
+
+    Запросы к api_endpoint распределяются между ним и серверами из
+    endpoints. Если дополнительных серверов нет, распределение отключено.
+
+    Args:
+        api_endpoint: Основной адрес API из настроек
+        endpoints: Дополнительные адреса API (settings["api_endpoints"])
+        health_interval: Интервал фоновой проверки серверов в секундах (0 — без проверки)
+        cooldown: Время исключения отказавшего сервера в секундах
+    """
+    global _health_stop
+    members = []
+    for url in [api_endpoint] + list(endpoints or []):
+        if url and _pool_key(url) not in members:
+            members.append(_pool_key(url))
+
+    with _pools_lock:
+        if _health_stop is not None:
+            _health_stop.set()
+            _health_stop = None
+        _pools.clear()
+        if len(members) < 2:
+            return
+        pool = EndpointPool(members, cooldown)
+        _pools[_pool_key(api_endpoint)] = pool
+        if health_interval > 0:
+            stop = threading.Event()
+            _health_stop = stop
+
+            def run_health_checks():
+                while not stop.wait(health_interval):
+                    pool.check_health()
+
+            threading.Thread(target=run_health_checks, name="endpoint-health", daemon=True).start()
+
+
+def get_endpoint_pool(api_endpoint: str) -> Optional[EndpointPool]:
+    """Возвращает группу серверов для адреса API или None, если распределение не настроено."""
+    with _pools_lock:
+        return _pools.get(_pool_key(api_endpoint))
+
+
+def acquire_endpoint(api_endpoint: str) -> str:
+    """Выбирает сервер для запроса к api_endpoint (без группы возвращает сам api_endpoint)."""
+    pool = get_endpoint_pool(api_endpoint)
+    return pool.acquire() if pool else api_endpoint
+
+
+def release_endpoint(api_endpoint: str, target: str, error: Optional[Exception] = None) -> None:
+    """Отмечает завершение запроса, начатого acquire_endpoint."""
+    pool = get_endpoint_pool(api_endpoint)
+    if pool:
+        pool.release(target, error)
+
+
+@contextmanager
+def endpoint_lease(api_endpoint: str) -> Iterator[str]:
+    """Контекстный менеджер: выбирает сервер и освобождает его после запроса.
+
+    Args:
+        api_endpoint: Адрес API из настроек
+
+    Yields:
+        Адрес сервера, на который следует отправить запрос
+    """
+    target = acquire_endpoint(api_endpoint)
+    try:
+        yield target
+    except Exception as e:
+        release_endpoint(api_endpoint, target, e)
+        raise
+    release_endpoint(api_endpoint, target)
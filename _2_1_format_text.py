@@ -1,8 +1,12 @@
 """Модуль для форматирования текста разделов через LLM и обновления structure.json."""
-import json
 from typing import List, Dict, Any
-from _4_load_settings import load_settings
-from _11_send_chat_completion import send_chat_completion, get_completion_text
+from _6_load_course_structure import load_course_structure
+from _7_save_course_structure import save_course_structure
+from _27_llm_provider import resolve_llm
+from _22_async_chat_completion import run_chat_completions, DEFAULT_CONCURRENCY
+from _26_token_budget import (estimate_messages_tokens, fit_max_tokens, get_context_limit,
+                              split_text, SAFETY_MARGIN)
+from _15_log_error import log_warning
 import re
 
 
@@ -19,9 +23,9 @@ def format_sections(
         settings_path: путь к файлу настроек
     """
     # Загружаем настройки и структуру
-    settings = load_settings(settings_path)
-    with open(structure_path, 'r', encoding='utf-8') as f:
-        sections: List[Dict[str, Any]] = json.load(f)
+    llm = resolve_llm("format", settings_path)
+    settings = llm["settings"]
+    sections: List[Dict[str, Any]] = load_course_structure(structure_path)
 
     # Системное сообщение с правилами форматирования
     system_message = {
@@ -40,54 +44,85 @@ def format_sections(
         )
     }
 
-    # Обрабатываем каждый раздел отдельно
-    for section in sections:
-        title = section.get('title', '')
-        raw_text = section.get('content', '')
+    api_endpoint, model, api_key = llm["api_endpoint"], llm["model"], llm["api_key"]
+
+    def build_messages(title: str, text: str) -> List[Dict[str, str]]:
         # Сообщение пользователя с текстом раздела
         user_message = {
             "role": "user",
             "content": (
                 f"Заголовок раздела: {title}\n\n"
-                f"Исходный текст:\n{raw_text}\n\n"
+                f"Исходный текст:\n{text}\n\n"
                 "Отформатируй этот текст по указанным правилам."
             )
         }
+        return [system_message, user_message]
 
-        # Запрос к LLM
-        try:
-            # Подготовка параметров в зависимости от провайдера LLM
-            if settings.get("llm_provider") == "openrouter":
-                api_endpoint = "https://openrouter.ai/api/v1"
-                model = settings.get("selected_openrouter_model")
-                api_key = settings.get("openrouter_api_key")
-            else:
-                api_endpoint = settings['api_endpoint']
-                model = settings['model']
-                api_key = None
-            resp = send_chat_completion(
-                api_endpoint=api_endpoint,
-                model=model,
-                messages=[system_message, user_message],
-                max_tokens=settings['max_tokens'],
-                temperature=settings.get('temperature', 0.5),
-                api_key=api_key
+    # Ответ примерно равен по длине исходному тексту, поэтому на одну часть
+    # отводим не более половины свободного контекста (если его размер известен)
+    context_limit = get_context_limit(model, settings, api_endpoint, api_key)
+
+    message_lists = []
+    max_tokens_list = []
+    owners = []  # индекс раздела для каждой части
+    for index, section in enumerate(sections):
+        title = section.get('title', '')
+        raw_text = section.get('content', '')
+        if context_limit is None:
+            chunks = [raw_text]
+        else:
+            fixed_tokens = estimate_messages_tokens(build_messages(title, ""))
+            chunk_budget = max(1, (context_limit - fixed_tokens - SAFETY_MARGIN) // 2)
+            chunks = split_text(raw_text, chunk_budget)
+        if len(chunks) > 1:
+            log_warning(
+                f"Раздел {section.get('id')} не помещается в контекст модели {model} "
+                f"и будет отформатирован по частям ({len(chunks)})"
+            )
+        for chunk in chunks:
+            messages = build_messages(title, chunk)
+            message_lists.append(messages)
+            max_tokens_list.append(
+                settings['max_tokens'] if context_limit is None
+                else fit_max_tokens(estimate_messages_tokens(messages), settings['max_tokens'], context_limit)
             )
-            formatted = get_completion_text(resp) or ''
-        except Exception as e:
-            # Если ошибка, оставляем оригинальный текст
-            formatted = raw_text
+            owners.append(index)
 
+    # Разделы независимы, поэтому запросы к LLM выполняются параллельно
+    results = run_chat_completions(
+        message_lists,
+        api_endpoint=api_endpoint,
+        model=model,
+        max_tokens=max_tokens_list,
+        temperature=settings.get('temperature', 0.5),
+        api_key=api_key,
+        concurrency=settings.get('llm_concurrency', DEFAULT_CONCURRENCY),
+        use_cache=True,  # Повторный запуск после сбоя не переформатирует готовые разделы
+        task="format"
+    )
+
+    # Собираем части каждого раздела обратно
+    formatted_parts: Dict[int, List[str]] = {}
+    failed_sections = set()
+    for index, result in zip(owners, results):
+        if isinstance(result, Exception):
+            failed_sections.add(index)
+            continue
+        formatted = (result or '').strip()
         # Убираем возможные обёртки из ```
-        formatted = formatted.strip()
         if formatted.startswith('```'):
             formatted = formatted.strip('`')
         # Удаляем теги <think> и <thinking> и их содержимое
         formatted = re.sub(r'<think>.*?</think>|<thinking>.*?</thinking>', '', formatted, flags=re.DOTALL)
-        section['content'] = formatted.strip()
+        formatted_parts.setdefault(index, []).append(formatted.strip())
+
+    for index, section in enumerate(sections):
+        # Если ошибка хотя бы в одной части, оставляем оригинальный текст
+        if index in failed_sections or index not in formatted_parts:
+            continue
+        section['content'] = "\n".join(formatted_parts[index]).strip()
 
     # Записываем обновленную структуру обратно
-    with open(structure_path, 'w', encoding='utf-8') as f:
-        json.dump(sections, f, ensure_ascii=False, indent=2)
+    save_course_structure(structure_path, sections)
 
     print(f"Отформатировано {len(sections)} разделов в {structure_path}") 
\ No newline at end of file
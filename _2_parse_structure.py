@@ -1,8 +1,40 @@
 """Модуль для разбора структуры книги на разделы по маркерам."""
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
-def parse_structure(raw_text: str) -> List[Dict[str, Any]]:
+# Разделители строк, которые учитывает str.splitlines
+_LINE_BREAK = re.compile('\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+
+
+class _ByteOffsets:
+    """Переводит позиции символов в смещения в байтах UTF-8 за один проход по тексту."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.char_pos = 0
+        self.byte_pos = 0
+
+    def to_bytes(self, char_pos: int) -> int:
+        # Позиции запрашиваются по возрастанию, поэтому кодируется только новый участок
+        self.byte_pos += len(self.text[self.char_pos:char_pos].encode('utf-8'))
+        self.char_pos = char_pos
+        return self.byte_pos
+
+    def span(self, start: int, end: int) -> Dict[str, int]:
+        offset = self.to_bytes(start)
+        return {'offset': offset, 'length': self.to_bytes(end) - offset}
+
+
+def _stripped_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """Границы участка text[start:end] без пробельных символов по краям."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def parse_structure(raw_text: str, with_offsets: bool = False) -> List[Dict[str, Any]]:
     """Разбивает текст на разделы по маркерам -=раздел=-.
     
     Формат разметки:
@@ -12,12 +44,15 @@ def parse_structure(raw_text: str) -> List[Dict[str, Any]]:
     
     Args:
         raw_text: Полный текст книги
+        with_offsets: Вместо текста раздела записать его положение в книге
+            (смещение и длину в байтах UTF-8), чтобы текст хранился только
+            в content.txt и читался по требованию (см. _38_content_reader)
         
     Returns:
         Список словарей, где каждый словарь содержит:
         - id: номер раздела (с 1)
         - title: заголовок (первая строка после маркера)
-        - content: текст раздела
+        - content: текст раздела (или offset и length при with_offsets)
     """
     # Регулярное выражение для поиска разделов, обозначенных маркерами -=раздел=-
     section_pattern = r'-=\s*раздел\s*=-'
@@ -25,13 +60,16 @@ def parse_structure(raw_text: str) -> List[Dict[str, Any]]:
     # Находим все маркеры разделов
     section_matches = list(re.finditer(section_pattern, raw_text))
     
+    offsets = _ByteOffsets(raw_text) if with_offsets else None
+    
     if not section_matches:
         # Если маркеры не найдены, возвращаем весь текст как один раздел
-        return [{
-            'id': 1,
-            'title': 'Основной текст',
-            'content': raw_text.strip()
-        }]
+        section = {'id': 1, 'title': 'Основной текст'}
+        if offsets:
+            section.update(offsets.span(*_stripped_span(raw_text, 0, len(raw_text))))
+        else:
+            section['content'] = raw_text.strip()
+        return [section]
     
     sections = []
     
@@ -58,6 +96,18 @@ def parse_structure(raw_text: str) -> List[Dict[str, Any]]:
             title = f"Раздел {section_id}"
             content = ""
         
+        if offsets:
+            # Текст раздела начинается со строки после заголовка
+            title_start = _stripped_span(raw_text, start_pos, end_pos)[0]
+            first_break = _LINE_BREAK.search(raw_text, title_start, end_pos)
+            content_start = first_break.end() if section_lines and first_break else end_pos
+            sections.append({
+                'id': section_id,
+                'title': title,
+                **offsets.span(*_stripped_span(raw_text, content_start, end_pos))
+            })
+            continue
+        
         sections.append({
             'id': section_id,
             'title': title,
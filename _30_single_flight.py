@@ -0,0 +1,197 @@
+"""Модуль объединения одинаковых одновременных запросов (single flight): к серверу уходит только один запрос."""
+import copy
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    """Выполняющийся запрос и его результат."""
+
+    def __init__(self):
+        self.owner = threading.get_ident()
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Группа запросов, в которой одинаковые одновременные вызовы выполняются один раз.
+
+    Первый вызов с ключом выполняет функцию, остальные ждут и получают копию
+    его результата (или то же исключение).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: str, func: Callable[[], T]) -> T:
+        """Выполняет func или присоединяется к уже выполняющемуся вызову с тем же ключом.
+
+        Args:
+            key: Ключ запроса (например, из make_cache_key)
+            func: Функция, выполняющая запрос
+
+        Returns:
+            Результат func
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            # Повторный вход из того же потока ждать самого себя не может
+            if call is not None and call.owner != threading.get_ident():
+                call.waiters += 1
+                self.coalesced += 1
+            else:
+                call = None
+                leader = _Call()
+                self._calls.setdefault(key, leader)
+
+        if call is not None:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            leader.result = func()
+            return leader.result
+        except BaseException as e:
+            leader.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is leader:
+                    del self._calls[key]
+            leader.done.set()
+
+
+class SharedStream:
+    """Потоковый ответ, который могут читать несколько потребителей.
+
+    Полученные фрагменты сохраняются, поэтому присоединившийся позже
+    потребитель получает ответ с начала. Следующий фрагмент из источника
+    читает тот потребитель, которому он понадобился первым, так что чтение
+    не зависит от того, в каком потоке (или вложенном вызове) находится
+    первый потребитель.
+    """
+
+    def __init__(self, upstream: Iterator[Any], on_finish: Callable[[], None]):
+        self._upstream = upstream
+        self._on_finish = on_finish
+        self._chunks = []
+        self._finished = False
+        self._error: Optional[BaseException] = None
+        self._pulling: Optional[int] = None  # поток, читающий источник в данный момент
+        self._consumers = 0
+        self._cond = threading.Condition()
+
+    def try_subscribe(self) -> bool:
+        """Регистрирует потребителя; False, если поток уже завершён или читается этим же потоком."""
+        with self._cond:
+            if self._finished or self._pulling == threading.get_ident():
+                return False
+            self._consumers += 1
+            return True
+
+    def _finish(self, error: Optional[BaseException] = None) -> None:
+        # Вызывается под self._cond; on_finish вызывается после освобождения блокировки
+        self._finished = True
+        self._error = error
+        self._cond.notify_all()
+
+    def iterate(self) -> Iterator[Any]:
+        """Отдаёт фрагменты ответа с начала (после try_subscribe)."""
+        index = 0
+        try:
+            while True:
+                with self._cond:
+                    while index >= len(self._chunks) and not self._finished and self._pulling is not None:
+                        self._cond.wait()
+                    if index < len(self._chunks):
+                        chunk = self._chunks[index]
+                        index += 1
+                    elif self._finished:
+                        if self._error is not None:
+                            raise self._error
+                        return
+                    else:
+                        self._pulling = threading.get_ident()
+                        chunk = None
+                if chunk is not None:
+                    yield chunk
+                    continue
+                # Читаем следующий фрагмент из источника без удержания блокировки
+                try:
+                    chunk = next(self._upstream)
+                except StopIteration:
+                    with self._cond:
+                        self._pulling = None
+                        self._finish()
+                    self._on_finish()
+                    continue
+                except BaseException as e:
+                    with self._cond:
+                        self._pulling = None
+                        self._finish(e)
+                    self._on_finish()
+                    raise
+                with self._cond:
+                    self._pulling = None
+                    self._chunks.append(chunk)
+                    self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._consumers -= 1
+                abandoned = self._consumers == 0 and not self._finished
+                if abandoned:
+                    # Ответ больше никому не нужен: закрываем соединение с сервером
+                    self._finish(GeneratorExit("Потоковый ответ прерван всеми потребителями"))
+            if abandoned:
+                self._on_finish()
+                close = getattr(self._upstream, "close", None)
+                if close:
+                    close()
+
+
+class StreamFlight:
+    """Группа потоковых запросов, в которой одинаковые одновременные потоки читаются из одного соединения."""
+
+    def __init__(self):
+        self._streams: Dict[str, SharedStream] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def stream(self, key: str, open_upstream: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        """Возвращает фрагменты потока, открывая его только при отсутствии такого же активного потока.
+
+        Args:
+            key: Ключ запроса
+            open_upstream: Функция, возвращающая итератор фрагментов от сервера
+
+        Yields:
+            Фрагменты ответа с начала
+        """
+        with self._lock:
+            shared = self._streams.get(key)
+            if shared is not None and shared.try_subscribe():
+                self.coalesced += 1
+            else:
+                shared = None
+
+        if shared is None:
+            def forget():
+                with self._lock:
+                    if self._streams.get(key) is created:
+                        del self._streams[key]
+
+            created = SharedStream(open_upstream(), forget)
+            created.try_subscribe()
+            with self._lock:
+                self._streams.setdefault(key, created)
+            shared = created
+
+        yield from shared.iterate()
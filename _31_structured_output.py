@@ -0,0 +1,232 @@
+"""Модуль JSON-схем ответов нейросети (structured output) и общего разбора JSON из текста ответа."""
+import json
+import re
+from typing import Dict, Any, List, Optional, Union
+
+# Схема одного упражнения для каждого этапа обучения
+_EXERCISE_SCHEMAS = {
+    0: {
+        "type": "object",
+        "properties": {
+            "id": {"type": "integer"},
+            "type": {"type": "string"},
+            "question": {"type": "string"},
+            "options": {"type": "array", "items": {"type": "string"}},
+            "correct_answer": {"type": "string"},
+            "stage": {"type": "integer"}
+        },
+        "required": ["id", "type", "question", "options", "correct_answer", "stage"],
+        "additionalProperties": False
+    },
+    1: {
+        "type": "object",
+        "properties": {
+            "id": {"type": "integer"},
+            "type": {"type": "string"},
+            "question": {"type": "string"},
+            "options": {"type": "array", "items": {"type": "string"}},
+            "correct_answer": {"type": "array", "items": {"type": "string"}},
+            "stage": {"type": "integer"}
+        },
+        "required": ["id", "type", "question", "options", "correct_answer", "stage"],
+        "additionalProperties": False
+    },
+    2: {
+        "type": "object",
+        "properties": {
+            "id": {"type": "integer"},
+            "type": {"type": "string"},
+            "question": {"type": "string"},
+            "model_answer": {"type": "string"},
+            "evaluation_criteria": {"type": "array", "items": {"type": "string"}},
+            "stage": {"type": "integer"}
+        },
+        "required": ["id", "type", "question", "model_answer", "evaluation_criteria", "stage"],
+        "additionalProperties": False
+    }
+}
+
+# Схемы результатов проверки и оценки раздела
+_TASK_SCHEMAS = {
+    "check_choice": {
+        "type": "object",
+        "properties": {
+            "is_correct": {"type": "boolean"},
+            "feedback": {"type": "string"}
+        },
+        "required": ["is_correct", "feedback"],
+        "additionalProperties": False
+    },
+    "check_open": {
+        "type": "object",
+        "properties": {
+            "is_correct": {"type": "boolean"},
+            "feedback": {"type": "string"},
+            "strengths": {"type": "array", "items": {"type": "string"}},
+            "areas_for_improvement": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["is_correct", "feedback", "strengths", "areas_for_improvement"],
+        "additionalProperties": False
+    },
+    "evaluate": {
+        "type": "object",
+        "properties": {
+            "score": {"type": "integer"},
+            "comment": {"type": "string"}
+        },
+        "required": ["score", "comment"],
+        "additionalProperties": False
+    },
+    # Объяснения всех уровней детализации одним ответом (HTML в каждом поле)
+    "explanation_levels": {
+        "type": "object",
+        "properties": {
+            "basic": {"type": "string"},
+            "medium": {"type": "string"},
+            "detailed": {"type": "string"}
+        },
+        "required": ["basic", "medium", "detailed"],
+        "additionalProperties": False
+    }
+}
+
+
+def _response_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "strict": True, "schema": schema}
+    }
+
+
+def exercises_response_format(stage: int) -> Dict[str, Any]:
+    """Возвращает response_format для генерации упражнений этапа stage.
+
+    Корень ответа — объект {"exercises": [...]}, так как не все серверы
+    принимают схему с массивом в корне.
+
+    Args:
+        stage: Этап обучения (0-2)
+
+    Returns:
+        Значение параметра response_format запроса
+    """
+    schema = {
+        "type": "object",
+        "properties": {
+            "exercises": {"type": "array", "items": _EXERCISE_SCHEMAS.get(stage, _EXERCISE_SCHEMAS[2])}
+        },
+        "required": ["exercises"],
+        "additionalProperties": False
+    }
+    return _response_format(f"exercises_stage_{stage}", schema)
+
+
+def task_response_format(task: str) -> Dict[str, Any]:
+    """Возвращает response_format для задачи check_choice, check_open, evaluate или explanation_levels.
+
+    Raises:
+        KeyError: Если схема для задачи не задана
+    """
+    return _response_format(task, _TASK_SCHEMAS[task])
+
+
+def structured_output_enabled(settings: Dict[str, Any]) -> bool:
+    """Проверяет, включён ли режим JSON-схем в настройках."""
+    return bool(settings.get("structured_output", True))
+
+
+def parse_json_response(text: Optional[str]) -> Union[Dict[str, Any], List[Any]]:
+    """Извлекает JSON из текста ответа нейросети.
+
+    Удаляет блоки <think>, обёртки ```json ... ``` и текст вокруг
+    JSON-объекта или массива.
+
+    Args:
+        text: Текст ответа
+
+    Returns:
+        Разобранный объект или массив
+
+    Raises:
+        json.JSONDecodeError: Если JSON не удалось разобрать
+    """
+    json_text = re.sub(r'<think>.*?</think>', '', text or '', flags=re.DOTALL).strip()
+    fenced = re.search(r'```(?:json)?\s*(.*?)```', json_text, flags=re.DOTALL)
+    if fenced:
+        json_text = fenced.group(1).strip()
+    try:
+        return json.loads(json_text)
+    except json.JSONDecodeError:
+        pass
+    # Вырезаем JSON из окружающего текста
+    starts = [i for i in (json_text.find('{'), json_text.find('[')) if i != -1]
+    if not starts:
+        return json.loads(json_text)
+    start = min(starts)
+    end = json_text.rfind('}' if json_text[start] == '{' else ']')
+    return json.loads(json_text[start:end + 1])
+
+
+def unwrap_exercises(data: Union[Dict[str, Any], List[Any]]) -> Any:
+    """Возвращает список упражнений из ответа в формате массива или {"exercises": [...]}."""
+    if isinstance(data, dict) and isinstance(data.get("exercises"), list):
+        return data["exercises"]
+    return data
+
+
+class JsonEndDetector:
+    """Находит конец первого JSON-объекта или массива в потоке текста.
+
+    Используется для досрочного прекращения генерации: локальные модели
+    часто продолжают писать после закрывающей скобки до max_tokens.
+    Блок <think>...</think> в начале ответа пропускается.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, chunk: str) -> Optional[int]:
+        """Добавляет фрагмент ответа.
+
+        Args:
+            chunk: Очередной фрагмент текста
+
+        Returns:
+            Длина текста до конца JSON включительно или None, если JSON ещё не завершён
+        """
+        self.text += chunk
+        if self.depth == 0:
+            stripped = self.text.lstrip()
+            if stripped.startswith("<think>") or stripped.startswith("<thinking>"):
+                closing = re.search(r'</think(?:ing)?>', self.text)
+                if not closing:
+                    return None
+                self.pos = max(self.pos, closing.end())
+        while self.pos < len(self.text):
+            char = self.text[self.pos]
+            self.pos += 1
+            if self.depth == 0:
+                if char in "{[":
+                    self.depth = 1
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+            if char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    return self.pos
+        return None
@@ -0,0 +1,230 @@
+"""Модуль телеметрии запросов к LLM: время ответа, время до первого токена, расход токенов и скорость генерации."""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Dict, Any, List, Optional
+
+# Параметры файла метрик по умолчанию
+DEFAULT_METRICS_PATH = "llm_metrics.jsonl"
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+_lock = threading.Lock()
+_config = {
+    "enabled": True,
+    "path": DEFAULT_METRICS_PATH,
+    "max_bytes": DEFAULT_MAX_BYTES,
+    "backup_count": DEFAULT_BACKUP_COUNT
+}
+_logger: Optional[logging.Logger] = None
+
+
+def configure_telemetry(
+    enabled: bool = True,
+    path: str = DEFAULT_METRICS_PATH,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    backup_count: int = DEFAULT_BACKUP_COUNT
+) -> None:
+    """Задаёт файл метрик и его ротацию.
+
+    Args:
+        enabled: Записывать ли метрики
+        path: Путь к файлу JSONL
+        max_bytes: Размер файла, после которого он переименовывается в path.1
+        backup_count: Количество хранимых старых файлов
+    """
+    global _logger
+    with _lock:
+        _config.update({
+            "enabled": enabled,
+            "path": path,
+            "max_bytes": max(1024, int(max_bytes)),
+            "backup_count": max(1, int(backup_count))
+        })
+        if _logger is not None:
+            for handler in list(_logger.handlers):
+                _logger.removeHandler(handler)
+                handler.close()
+            _logger = None
+
+
+def _get_logger() -> logging.Logger:
+    """Создаёт логгер с ротацией файла метрик (однократно)."""
+    global _logger
+    if _logger is None:
+        logger = logging.getLogger('tutor.llm_metrics')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False  # Метрики не дублируются в tutor.log
+        handler = RotatingFileHandler(
+            _config["path"],
+            maxBytes=_config["max_bytes"],
+            backupCount=_config["backup_count"],
+            encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+
+def record_metrics(record: Dict[str, Any]) -> None:
+    """Записывает одну запись метрик в файл JSONL.
+
+    Args:
+        record: Словарь с метриками вызова
+    """
+    with _lock:
+        if not _config["enabled"]:
+            return
+        try:
+            _get_logger().info(json.dumps(record, ensure_ascii=False))
+        except OSError as e:
+            print(f"Ошибка записи метрик LLM: {e}")
+
+
+class CallMetrics:
+    """Измерение одного вызова LLM.
+
+    Создаётся перед запросом; first_token() отмечает первый полученный
+    фрагмент (для потоковых запросов), retry() — повтор запроса,
+    finish() записывает итог в файл метрик.
+    """
+
+    def __init__(self, task: Optional[str], model: str, api_endpoint: str, stream: bool = False):
+        self.task = task or "other"
+        self.model = model
+        self.api_endpoint = api_endpoint
+        self.stream = stream
+        self.started = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.retries = 0
+
+    def first_token(self) -> None:
+        """Отмечает получение первого фрагмента ответа."""
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+
+    def retry(self, attempt: int = 0, error: Optional[Exception] = None) -> None:
+        """Отмечает повтор запроса (совместимо с on_retry из call_with_retry)."""
+        self.retries += 1
+
+    def finish(
+        self,
+        outcome: str,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        estimated: bool = False,
+        error: Optional[BaseException] = None
+    ) -> None:
+        """Записывает итог вызова.
+
+        Args:
+            outcome: ok, error, cache (ответ из кэша) или aborted (чтение прервано)
+            prompt_tokens: Токены запроса
+            completion_tokens: Токены ответа
+            estimated: Токены оценены по длине текста, а не получены из usage
+            error: Исключение при неудаче
+        """
+        wall = time.monotonic() - self.started
+        ttft = self.first_token_at - self.started if self.first_token_at is not None else None
+        generation_time = wall - ttft if ttft is not None else wall
+        tokens_per_second = None
+        if completion_tokens and generation_time > 0 and outcome != "cache":
+            tokens_per_second = round(completion_tokens / generation_time, 2)
+        record_metrics({
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "task": self.task,
+            "model": self.model,
+            "endpoint": self.api_endpoint,
+            "stream": self.stream,
+            "outcome": outcome,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_estimated": estimated,
+            "wall_s": round(wall, 3),
+            "ttft_s": round(ttft, 3) if ttft is not None else None,
+            "tokens_per_s": tokens_per_second,
+            "retries": self.retries,
+            "error": f"{type(error).__name__}: {error}" if error is not None else None
+        })
+
+
+def load_metrics(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Читает записи метрик из текущего и ротированных файлов (от старых к новым).
+
+    Args:
+        path: Путь к файлу метрик (по умолчанию из настроек)
+
+    Returns:
+        Список записей
+    """
+    path = path or _config["path"]
+    files = [f"{path}.{i}" for i in range(_config["backup_count"], 0, -1)] + [path]
+    records = []
+    for file_path in files:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # Строка, оборванная при аварийном завершении
+    return records
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Возвращает перцентиль p (0-100) методом ближайшего ранга или None для пустого списка."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize_metrics(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Сводная статистика по задачам.
+
+    Args:
+        records: Записи метрик (см. load_metrics)
+
+    Returns:
+        Список словарей по задачам: task, calls, errors, cache_hits, retries,
+        wall_p50/p90/p99, ttft_p50/p90, tps_p50, prompt_tokens_avg, completion_tokens_avg
+    """
+    by_task: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        by_task.setdefault(record.get("task") or "other", []).append(record)
+
+    summary = []
+    for task, items in sorted(by_task.items()):
+        generated = [r for r in items if r.get("outcome") in ("ok", "aborted")]
+        wall = [r["wall_s"] for r in generated if r.get("wall_s") is not None]
+        ttft = [r["ttft_s"] for r in generated if r.get("ttft_s") is not None]
+        tps = [r["tokens_per_s"] for r in generated if r.get("tokens_per_s")]
+        prompt = [r["prompt_tokens"] for r in generated if r.get("prompt_tokens")]
+        completion = [r["completion_tokens"] for r in generated if r.get("completion_tokens")]
+        summary.append({
+            "task": task,
+            "calls": len(items),
+            "errors": sum(1 for r in items if r.get("outcome") == "error"),
+            "cache_hits": sum(1 for r in items if r.get("outcome") == "cache"),
+            "retries": sum(r.get("retries") or 0 for r in items),
+            "wall_p50": percentile(wall, 50),
+            "wall_p90": percentile(wall, 90),
+            "wall_p99": percentile(wall, 99),
+            "ttft_p50": percentile(ttft, 50),
+            "ttft_p90": percentile(ttft, 90),
+            "tps_p50": percentile(tps, 50),
+            "prompt_tokens_avg": round(sum(prompt) / len(prompt)) if prompt else None,
+            "completion_tokens_avg": round(sum(completion) / len(completion)) if completion else None
+        })
+    return summary
@@ -0,0 +1,49 @@
+"""Модуль общей структуры запросов по учебному материалу раздела.
+
+Все запросы по разделу (объяснения разных уровней, упражнения разных этапов,
+проверка ответов) начинаются с одинаковых системного сообщения и текста
+раздела, а инструкции задачи следуют после них. Сервер инференса с кэшем
+префикса (llama.cpp, LM Studio) при следующем запросе по тому же разделу
+не обрабатывает текст раздела повторно.
+"""
+from typing import Dict, List
+
+# Системное сообщение, общее для всех задач по разделу
+SECTION_SYSTEM_PROMPT = (
+    "Ты - опытный преподаватель. Сначала приведён учебный материал раздела, "
+    "после него - задание. Выполняй задание, опираясь только на этот материал."
+)
+
+# Разделитель между учебным материалом и заданием
+TASK_SEPARATOR = "\n\n---\n\nЗадание:\n"
+
+
+def section_prefix(section_text: str) -> str:
+    """Возвращает начало пользовательского сообщения с учебным материалом.
+
+    Для одного и того же текста раздела результат совпадает побайтно
+    независимо от задачи.
+
+    Args:
+        section_text: Текст раздела
+
+    Returns:
+        Текст учебного материала с разделителем задания
+    """
+    return f"Учебный материал:\n\n{section_text.strip()}{TASK_SEPARATOR}"
+
+
+def build_section_messages(section_text: str, instructions: str) -> List[Dict[str, str]]:
+    """Формирует сообщения запроса: общий префикс с материалом, затем инструкции задачи.
+
+    Args:
+        section_text: Текст раздела
+        instructions: Инструкции конкретной задачи
+
+    Returns:
+        Список сообщений для чат-модели
+    """
+    return [
+        {"role": "system", "content": SECTION_SYSTEM_PROMPT},
+        {"role": "user", "content": section_prefix(section_text) + instructions}
+    ]
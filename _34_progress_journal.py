@@ -0,0 +1,178 @@
+"""Модуль журнала прогресса: ответы и оценки дописываются в JSONL вместо перезаписи progress.json.
+
+Файл progress.json служит снимком; в нём хранится номер последнего
+учтённого события (journal_seq). При загрузке к снимку применяются
+события журнала с большими номерами. Время от времени снимок
+перезаписывается целиком и журнал очищается (уплотнение).
+"""
+import json
+import os
+import threading
+from typing import Dict, Any, List
+
+# Количество событий в журнале, после которого запускается уплотнение
+DEFAULT_COMPACT_EVERY = 50
+
+# Блокировка изменения прогресса событиями и снятия снимка: номер события
+# в снимке всегда соответствует его содержимому
+journal_lock = threading.RLock()
+
+_event_counts: Dict[str, int] = {}
+
+
+def journal_path(progress_path: str) -> str:
+    """Возвращает путь к журналу для файла прогресса (progress.json -> progress.journal.jsonl)."""
+    return f"{os.path.splitext(progress_path)[0]}.journal.jsonl"
+
+
+def _new_section_progress() -> Dict[str, Any]:
+    return {
+        "completed": False,
+        "exercises_completed": 0,
+        "last_viewed": None,
+        "answered": [],
+        "exercises": [],
+        "evaluation": {"score": None, "comment": ""}
+    }
+
+
+def apply_progress_event(progress: Dict[str, Any], event: Dict[str, Any]) -> None:
+    """Применяет событие к прогрессу в памяти.
+
+    Поддерживаемые события:
+        {"op": "answer", "section": id, "entry": попытка ответа}
+        {"op": "evaluation", "section": id, "evaluation": {"score", "comment"}}
+
+    Args:
+        progress: Словарь с прогрессом пользователя
+        event: Событие журнала
+    """
+    section = progress.setdefault("sections", {}).setdefault(str(event["section"]), _new_section_progress())
+    op = event.get("op")
+    if op == "answer":
+        entry = event["entry"]
+        section.setdefault("exercises", []).append(entry)
+        # Обновляем количество правильных ответов
+        section["exercises_completed"] = sum(1 for e in section["exercises"] if e.get("is_correct"))
+        # Добавляем в список answered для обратной совместимости
+        if entry.get("is_correct") and entry.get("question") not in section.setdefault("answered", []):
+            section["answered"].append(entry.get("question"))
+    elif op == "evaluation":
+        section["evaluation"] = event["evaluation"]
+    else:
+        print(f"Неизвестное событие журнала прогресса: {op}")
+
+
+def read_journal(progress_path: str) -> List[Dict[str, Any]]:
+    """Читает события журнала; оборванная при сбое последняя строка пропускается.
+
+    Args:
+        progress_path: Путь к файлу прогресса
+
+    Returns:
+        Список событий в порядке записи
+    """
+    path = journal_path(progress_path)
+    if not os.path.exists(path):
+        return []
+    events = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Пропущена повреждённая запись журнала прогресса в {path}")
+    return events
+
+
+def replay_journal(progress_path: str, progress: Dict[str, Any]) -> int:
+    """Применяет к снимку прогресса события журнала, ещё не учтённые в нём.
+
+    Args:
+        progress_path: Путь к файлу прогресса
+        progress: Прогресс, загруженный из снимка
+
+    Returns:
+        Количество применённых событий
+    """
+    events = read_journal(progress_path)
+    applied = 0
+    with journal_lock:
+        for event in events:
+            if event.get("seq", 0) <= progress.get("journal_seq", 0):
+                continue  # Событие уже вошло в снимок
+            apply_progress_event(progress, event)
+            progress["journal_seq"] = event["seq"]
+            applied += 1
+        _event_counts[progress_path] = len(events)
+    return applied
+
+
+def append_progress_event(progress_path: str, progress: Dict[str, Any], event: Dict[str, Any]) -> bool:
+    """Применяет событие к прогрессу и дописывает его в журнал.
+
+    Стоимость записи не зависит от размера истории: на диск добавляется
+    одна строка.
+
+    Args:
+        progress_path: Путь к файлу прогресса
+        progress: Словарь с прогрессом пользователя
+        event: Событие (см. apply_progress_event)
+
+    Returns:
+        True, если журнал вырос до порога уплотнения и пора записать снимок
+
+    Raises:
+        OSError: При ошибке записи журнала
+    """
+    with journal_lock:
+        seq = progress.get("journal_seq", 0) + 1
+        record = dict(event, seq=seq)
+        with open(journal_path(progress_path), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        apply_progress_event(progress, record)
+        progress["journal_seq"] = seq
+        count = _event_counts.get(progress_path, 0) + 1
+        _event_counts[progress_path] = count
+        return count >= DEFAULT_COMPACT_EVERY
+
+
+def truncate_journal(progress_path: str, snapshot_seq: int) -> None:
+    """Удаляет из журнала события, вошедшие в записанный снимок.
+
+    Args:
+        progress_path: Путь к файлу прогресса
+        snapshot_seq: Номер последнего события в снимке
+    """
+    path = journal_path(progress_path)
+    with journal_lock:
+        if not os.path.exists(path):
+            _event_counts[progress_path] = 0
+            return
+        remaining = [event for event in read_journal(progress_path) if event.get("seq", 0) > snapshot_seq]
+        if remaining:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for event in remaining:
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        else:
+            os.remove(path)
+        _event_counts[progress_path] = len(remaining)
+
+
+def remove_journal(progress_path: str) -> None:
+    """Удаляет журнал прогресса (при замене курса, чтобы его события не применились к новому прогрессу)."""
+    with journal_lock:
+        try:
+            os.remove(journal_path(progress_path))
+        except FileNotFoundError:
+            pass
+        _event_counts.pop(progress_path, None)
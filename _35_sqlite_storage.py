@@ -0,0 +1,520 @@
+"""Модуль хранения курсов, объяснений и прогресса в базе SQLite.
+
+Необязательная замена файлов structure.json и progress.json: при
+storage_backend = "sqlite" функции модулей _6-_9 читают и пишут базу.
+Отдельное объяснение или ответ студента записывается одной строкой
+таблицы, а раздел читается без загрузки всего курса.
+
+Импорт и экспорт курса в формате JSON:
+    python _35_sqlite_storage.py import "Папка курса" --db tutor.db
+    python _35_sqlite_storage.py export "Папка курса" --db tutor.db --out "Папка экспорта"
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from _36_course_repository import write_bytes_atomic
+from _37_serialization import encode_file, read_file
+
+# Параметры хранилища по умолчанию
+DEFAULT_DB_PATH = "tutor.db"
+DEFAULT_STUDENT = "default"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS sections (
+    course_id INTEGER NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+    section_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (course_id, section_id)
+);
+CREATE INDEX IF NOT EXISTS sections_position ON sections(course_id, position);
+CREATE TABLE IF NOT EXISTS explanations (
+    course_id INTEGER NOT NULL,
+    section_id TEXT NOT NULL,
+    level TEXT NOT NULL,
+    html TEXT NOT NULL,
+    PRIMARY KEY (course_id, section_id, level),
+    FOREIGN KEY (course_id, section_id) REFERENCES sections(course_id, section_id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS exercises (
+    course_id INTEGER NOT NULL,
+    section_id TEXT NOT NULL,
+    stage INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (course_id, section_id, stage, position),
+    FOREIGN KEY (course_id, section_id) REFERENCES sections(course_id, section_id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS section_progress (
+    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    course_id INTEGER NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+    section_id TEXT NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    last_viewed TEXT,
+    PRIMARY KEY (student_id, course_id, section_id)
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    course_id INTEGER NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+    section_id TEXT NOT NULL,
+    question TEXT NOT NULL,
+    stage INTEGER,
+    is_correct INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attempts_section ON attempts(student_id, course_id, section_id, id);
+CREATE TABLE IF NOT EXISTS evaluations (
+    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    course_id INTEGER NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+    section_id TEXT NOT NULL,
+    score INTEGER,
+    comment TEXT NOT NULL DEFAULT '',
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (student_id, course_id, section_id)
+);
+"""
+
+# Поля раздела, хранящиеся в отдельных столбцах и таблицах
+_SECTION_COLUMNS = ("title", "content", "explanations", "exercise_bank")
+
+
+def _course_key(course_dir: str) -> str:
+    return os.path.normcase(os.path.abspath(course_dir))
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _new_section_progress() -> Dict[str, Any]:
+    return {
+        "completed": False,
+        "exercises_completed": 0,
+        "last_viewed": None,
+        "answered": [],
+        "exercises": [],
+        "evaluation": {"score": None, "comment": ""}
+    }
+
+
+class SqliteStorage:
+    """Хранилище курсов и прогресса студентов в одном файле базы SQLite.
+
+    У каждого потока своё соединение (сохранение прогресса выполняется
+    в фоновом потоке). Курс определяется абсолютным путём к его папке.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")  # Чтение не блокируется записью
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _course_id(self, course_dir: str, create: bool = False) -> Optional[int]:
+        key = _course_key(course_dir)
+        with self._lock:
+            if key in self._ids:
+                return self._ids[key]
+        conn = self._connect()
+        row = conn.execute("SELECT id FROM courses WHERE path = ?", (key,)).fetchone()
+        if row is None:
+            if not create:
+                return None
+            with conn:
+                cursor = conn.execute("INSERT INTO courses (path) VALUES (?)", (key,))
+            course_id = cursor.lastrowid
+        else:
+            course_id = row[0]
+        with self._lock:
+            self._ids[key] = course_id
+        return course_id
+
+    def _student_id(self, student: str) -> int:
+        conn = self._connect()
+        row = conn.execute("SELECT id FROM students WHERE name = ?", (student,)).fetchone()
+        if row is not None:
+            return row[0]
+        with conn:
+            return conn.execute("INSERT INTO students (name) VALUES (?)", (student,)).lastrowid
+
+    def has_course(self, course_dir: str) -> bool:
+        """Проверяет, есть ли курс в базе."""
+        return self._course_id(course_dir) is not None
+
+    def delete_course(self, course_dir: str) -> None:
+        """Удаляет курс из базы вместе с разделами, упражнениями и прогрессом всех студентов."""
+        key = _course_key(course_dir)
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM courses WHERE path = ?", (key,))
+        with self._lock:
+            self._ids.pop(key, None)
+
+    # --- Структура курса ---
+
+    def load_sections(self, course_dir: str) -> List[Dict[str, Any]]:
+        """Возвращает разделы курса в формате structure.json.
+
+        Raises:
+            FileNotFoundError: Если курса нет в базе
+        """
+        course_id = self._course_id(course_dir)
+        if course_id is None:
+            raise FileNotFoundError(f"Курс не найден в базе {self.db_path}: {course_dir}")
+        conn = self._connect()
+        explanations: Dict[str, Dict[str, str]] = {}
+        for section_id, level, html in conn.execute(
+            "SELECT section_id, level, html FROM explanations WHERE course_id = ?", (course_id,)
+        ):
+            explanations.setdefault(section_id, {})[level] = html
+        banks: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        for section_id, stage, data in conn.execute(
+            "SELECT section_id, stage, data FROM exercises WHERE course_id = ? ORDER BY stage, position", (course_id,)
+        ):
+            banks.setdefault(section_id, {}).setdefault(str(stage), []).append(json.loads(data))
+        sections = []
+        for section_id, title, content, data in conn.execute(
+            "SELECT section_id, title, content, data FROM sections WHERE course_id = ? ORDER BY position",
+            (course_id,)
+        ):
+            section = json.loads(data)
+            section.update({"title": title, "content": content, "explanations": explanations.get(section_id, {})})
+            if section_id in banks:
+                section["exercise_bank"] = banks[section_id]
+            sections.append(section)
+        return sections
+
+    def list_sections(self, course_dir: str) -> List[Dict[str, Any]]:
+        """Возвращает оглавление курса (id и title) без текста и объяснений."""
+        course_id = self._course_id(course_dir)
+        if course_id is None:
+            return []
+        rows = self._connect().execute(
+            "SELECT data, title FROM sections WHERE course_id = ? ORDER BY position", (course_id,)
+        )
+        return [{"id": json.loads(data).get("id"), "title": title} for data, title in rows]
+
+    def load_section(self, course_dir: str, section_id: Any) -> Optional[Dict[str, Any]]:
+        """Возвращает один раздел с объяснениями и банком упражнений или None."""
+        course_id = self._course_id(course_dir)
+        if course_id is None:
+            return None
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT title, content, data FROM sections WHERE course_id = ? AND section_id = ?",
+            (course_id, str(section_id))
+        ).fetchone()
+        if row is None:
+            return None
+        section = json.loads(row[2])
+        section.update({"title": row[0], "content": row[1]})
+        section["explanations"] = dict(conn.execute(
+            "SELECT level, html FROM explanations WHERE course_id = ? AND section_id = ?",
+            (course_id, str(section_id))
+        ).fetchall())
+        bank: Dict[str, List[Dict[str, Any]]] = {}
+        for stage, data in conn.execute(
+            "SELECT stage, data FROM exercises WHERE course_id = ? AND section_id = ? ORDER BY stage, position",
+            (course_id, str(section_id))
+        ):
+            bank.setdefault(str(stage), []).append(json.loads(data))
+        if bank:
+            section["exercise_bank"] = bank
+        return section
+
+    def save_sections(self, course_dir: str, sections: List[Dict[str, Any]]) -> None:
+        """Сохраняет разделы курса целиком (разделы, отсутствующие в списке, удаляются).
+
+        Объяснения и банк упражнений (exercise_bank: этап -> список) записываются
+        в свои таблицы.
+        """
+        course_id = self._course_id(course_dir, create=True)
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM explanations WHERE course_id = ?", (course_id,))
+            conn.execute("DELETE FROM exercises WHERE course_id = ?", (course_id,))
+            section_ids = []
+            for position, section in enumerate(sections):
+                section_id = str(section.get("id"))
+                section_ids.append(section_id)
+                data = {k: v for k, v in section.items() if k not in _SECTION_COLUMNS}
+                conn.execute(
+                    "INSERT INTO sections (course_id, section_id, position, title, content, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (course_id, section_id) DO UPDATE SET "
+                    "position = excluded.position, title = excluded.title, "
+                    "content = excluded.content, data = excluded.data",
+                    (course_id, section_id, position, section.get("title", ""), section.get("content", ""),
+                     json.dumps(data, ensure_ascii=False))
+                )
+                conn.executemany(
+                    "INSERT INTO explanations (course_id, section_id, level, html) VALUES (?, ?, ?, ?)",
+                    [(course_id, section_id, level, html)
+                     for level, html in (section.get("explanations") or {}).items()]
+                )
+                conn.executemany(
+                    "INSERT INTO exercises (course_id, section_id, stage, position, data) VALUES (?, ?, ?, ?, ?)",
+                    [(course_id, section_id, int(stage), position, json.dumps(exercise, ensure_ascii=False))
+                     for stage, items in (section.get("exercise_bank") or {}).items()
+                     for position, exercise in enumerate(items)]
+                )
+            placeholders = ",".join("?" * len(section_ids))
+            conn.execute(
+                f"DELETE FROM sections WHERE course_id = ? AND section_id NOT IN ({placeholders})",
+                [course_id, *section_ids]
+            )
+
+    def save_explanation(self, course_dir: str, section_id: Any, level: str, html: str) -> None:
+        """Сохраняет одно объяснение раздела (одна строка таблицы)."""
+        course_id = self._course_id(course_dir, create=True)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO explanations (course_id, section_id, level, html) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (course_id, section_id, level) DO UPDATE SET html = excluded.html",
+                (course_id, str(section_id), level, html)
+            )
+
+    def add_exercises(self, course_dir: str, section_id: Any, stage: int, exercises: List[Dict[str, Any]]) -> int:
+        """Дописывает упражнения в банк этапа раздела, пропуская уже сохранённые вопросы.
+
+        Returns:
+            Число добавленных упражнений
+        """
+        course_id = self._course_id(course_dir, create=True)
+        conn = self._connect()
+        with conn:
+            rows = conn.execute(
+                "SELECT position, data FROM exercises WHERE course_id = ? AND section_id = ? AND stage = ?",
+                (course_id, str(section_id), stage)
+            ).fetchall()
+            known = {json.loads(data).get("question") for _, data in rows}
+            position = max((row[0] for row in rows), default=-1)
+            added = []
+            for exercise in exercises:
+                if exercise.get("question") in known:
+                    continue
+                known.add(exercise.get("question"))
+                position += 1
+                added.append((course_id, str(section_id), stage, position, json.dumps(exercise, ensure_ascii=False)))
+            conn.executemany(
+                "INSERT INTO exercises (course_id, section_id, stage, position, data) VALUES (?, ?, ?, ?, ?)",
+                added
+            )
+        return len(added)
+
+    # --- Прогресс студента ---
+
+    def load_progress(self, course_dir: str, student: str = DEFAULT_STUDENT) -> Dict[str, Any]:
+        """Возвращает прогресс студента по курсу в формате progress.json.
+
+        Raises:
+            FileNotFoundError: Если курса нет в базе
+        """
+        course_id = self._course_id(course_dir)
+        if course_id is None:
+            raise FileNotFoundError(f"Курс не найден в базе {self.db_path}: {course_dir}")
+        student_id = self._student_id(student)
+        conn = self._connect()
+        sections: Dict[str, Dict[str, Any]] = {}
+        for section_id, in conn.execute(
+            "SELECT section_id FROM sections WHERE course_id = ? ORDER BY position", (course_id,)
+        ):
+            sections[section_id] = _new_section_progress()
+        for section_id, completed, last_viewed in conn.execute(
+            "SELECT section_id, completed, last_viewed FROM section_progress "
+            "WHERE student_id = ? AND course_id = ?", (student_id, course_id)
+        ):
+            section = sections.setdefault(section_id, _new_section_progress())
+            section["completed"] = bool(completed)
+            section["last_viewed"] = last_viewed
+        for section_id, data in conn.execute(
+            "SELECT section_id, data FROM attempts WHERE student_id = ? AND course_id = ? ORDER BY id",
+            (student_id, course_id)
+        ):
+            entry = json.loads(data)
+            section = sections.setdefault(section_id, _new_section_progress())
+            section["exercises"].append(entry)
+            if entry.get("is_correct"):
+                section["exercises_completed"] += 1
+                if entry.get("question") not in section["answered"]:
+                    section["answered"].append(entry.get("question"))
+        for section_id, score, comment in conn.execute(
+            "SELECT section_id, score, comment FROM evaluations WHERE student_id = ? AND course_id = ?",
+            (student_id, course_id)
+        ):
+            sections.setdefault(section_id, _new_section_progress())["evaluation"] = {"score": score, "comment": comment}
+        return {"sections": sections}
+
+    def save_progress(self, course_dir: str, progress: Dict[str, Any], student: str = DEFAULT_STUDENT) -> None:
+        """Сохраняет прогресс студента по курсу целиком (импорт, совместимость с save_progress)."""
+        course_id = self._course_id(course_dir, create=True)
+        student_id = self._student_id(student)
+        conn = self._connect()
+        with conn:
+            for table in ("section_progress", "attempts", "evaluations"):
+                conn.execute(f"DELETE FROM {table} WHERE student_id = ? AND course_id = ?", (student_id, course_id))
+            for section_id, section in (progress.get("sections") or {}).items():
+                conn.execute(
+                    "INSERT INTO section_progress (student_id, course_id, section_id, completed, last_viewed) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (student_id, course_id, str(section_id), int(bool(section.get("completed"))),
+                     section.get("last_viewed"))
+                )
+                for entry in section.get("exercises") or []:
+                    self._insert_attempt(conn, student_id, course_id, section_id, entry)
+                evaluation = section.get("evaluation") or {}
+                if evaluation.get("score") is not None or evaluation.get("comment"):
+                    self._upsert_evaluation(conn, student_id, course_id, section_id, evaluation)
+
+    def _insert_attempt(self, conn, student_id: int, course_id: int, section_id: Any, entry: Dict[str, Any]) -> None:
+        conn.execute(
+            "INSERT INTO attempts (student_id, course_id, section_id, question, stage, is_correct, data, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (student_id, course_id, str(section_id), entry.get("question", ""), entry.get("stage"),
+             int(bool(entry.get("is_correct"))), json.dumps(entry, ensure_ascii=False), _now())
+        )
+
+    def _upsert_evaluation(self, conn, student_id: int, course_id: int, section_id: Any,
+                           evaluation: Dict[str, Any]) -> None:
+        conn.execute(
+            "INSERT INTO evaluations (student_id, course_id, section_id, score, comment, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (student_id, course_id, section_id) DO UPDATE SET "
+            "score = excluded.score, comment = excluded.comment, updated_at = excluded.updated_at",
+            (student_id, course_id, str(section_id), evaluation.get("score"), evaluation.get("comment", ""), _now())
+        )
+
+    def record_event(self, course_dir: str, event: Dict[str, Any], student: str = DEFAULT_STUDENT) -> None:
+        """Записывает событие прогресса (ответ или оценку) одной строкой таблицы.
+
+        Args:
+            course_dir: Папка курса
+            event: Событие в формате журнала прогресса (см. _34_progress_journal)
+            student: Имя студента
+        """
+        course_id = self._course_id(course_dir, create=True)
+        student_id = self._student_id(student)
+        conn = self._connect()
+        with conn:
+            if event.get("op") == "answer":
+                self._insert_attempt(conn, student_id, course_id, event["section"], event["entry"])
+            elif event.get("op") == "evaluation":
+                self._upsert_evaluation(conn, student_id, course_id, event["section"], event["evaluation"])
+
+    # --- Импорт и экспорт ---
+
+    def import_course(self, course_dir: str, student: str = DEFAULT_STUDENT) -> None:
+        """Загружает в базу structure.json и progress.json (с журналом) из папки курса.
+
+        Raises:
+            FileNotFoundError: Если в папке нет structure.json
+        """
+        from _6_load_course_structure import read_course_files
+        from _34_progress_journal import replay_journal
+
+        self.save_sections(course_dir, read_course_files(os.path.join(course_dir, "structure.json")))
+        progress_path = os.path.join(course_dir, "progress.json")
+        if os.path.exists(progress_path):
+            progress = read_file(progress_path)
+            replay_journal(progress_path, progress)
+            self.save_progress(course_dir, progress, student)
+        print(f"Курс импортирован в {self.db_path}: {course_dir}")
+
+    def export_course(self, course_dir: str, out_dir: Optional[str] = None, student: str = DEFAULT_STUDENT) -> str:
+        """Записывает курс из базы в structure.json и progress.json.
+
+        Args:
+            course_dir: Папка курса (ключ в базе)
+            out_dir: Папка для файлов (по умолчанию папка курса)
+            student: Имя студента, чей прогресс экспортируется
+
+        Returns:
+            Папка, в которую записаны файлы
+        """
+        out_dir = out_dir or course_dir
+        os.makedirs(out_dir, exist_ok=True)
+        write_bytes_atomic(os.path.join(out_dir, "structure.json"), encode_file(self.load_sections(course_dir)))
+        write_bytes_atomic(os.path.join(out_dir, "progress.json"), encode_file(self.load_progress(course_dir, student)))
+        print(f"Курс экспортирован из {self.db_path} в {out_dir}")
+        return out_dir
+
+
+_storage: Optional[SqliteStorage] = None
+_student = DEFAULT_STUDENT
+
+
+def configure_storage(backend: str = "json", db_path: str = DEFAULT_DB_PATH, student: str = DEFAULT_STUDENT) -> None:
+    """Выбирает хранилище курсов и прогресса.
+
+    Args:
+        backend: json (файлы в папке курса) или sqlite
+        db_path: Путь к базе SQLite
+        student: Имя студента, чей прогресс читается и записывается
+    """
+    global _storage, _student
+    _student = student or DEFAULT_STUDENT
+    if backend != "sqlite":
+        _storage = None
+    elif _storage is None or _storage.db_path != db_path:
+        _storage = SqliteStorage(db_path)
+
+
+def get_storage() -> Optional[SqliteStorage]:
+    """Возвращает хранилище SQLite или None, если используются файлы JSON."""
+    return _storage
+
+
+def get_student() -> str:
+    """Возвращает имя текущего студента."""
+    return _student
+
+
+def main() -> None:
+    """Импорт и экспорт курсов из командной строки."""
+    parser = argparse.ArgumentParser(description="Импорт и экспорт курсов Tutor в базу SQLite")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("course_dirs", nargs="+", help="Папки курсов")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Путь к базе SQLite")
+    parser.add_argument("--student", default=DEFAULT_STUDENT, help="Имя студента")
+    parser.add_argument("--out", help="Папка для экспорта (только для одного курса)")
+    args = parser.parse_args()
+
+    storage = SqliteStorage(args.db)
+    for course_dir in args.course_dirs:
+        if args.command == "import":
+            storage.import_course(course_dir, args.student)
+        else:
+            storage.export_course(course_dir, args.out, args.student)
+
+
+if __name__ == "__main__":
+    main()
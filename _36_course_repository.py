@@ -0,0 +1,185 @@
+"""Модуль хранилища файлов курса в памяти.
+
+structure.json, файлы разделов, progress.json и settings.json читаются
+многими модулями, часто подряд. CourseRepository хранит разобранное
+содержимое JSON-файлов и перечитывает файл, только если изменились его
+время изменения или размер (например, файл правили вручную). Запись тоже
+идёт через хранилище, поэтому собственные записи не вызывают повторного
+разбора.
+"""
+import copy
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from _37_serialization import encode_file, read_file
+
+# Максимальное количество файлов в памяти (курс из 50 разделов - около 50 файлов)
+DEFAULT_MAX_FILES = 512
+
+
+# umask процесса читается один раз: его смена не потокобезопасна
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _file_mode(path: str) -> int:
+    # Права существующего файла или права нового файла с учётом umask
+    try:
+        return os.stat(path).st_mode & 0o777
+    except OSError:
+        return 0o666 & ~_UMASK
+
+
+def write_bytes_atomic(path: str, data: bytes) -> None:
+    """Записывает файл целиком через временный файл.
+
+    Данные сбрасываются на диск (fsync) до переименования, поэтому при сбое
+    на диске остаётся либо старый, либо новый файл, но не оборванный.
+
+    Args:
+        path: Путь к файлу
+        data: Содержимое файла
+
+    Raises:
+        OSError: При ошибке записи файла
+    """
+    # Уникальный временный файл рядом с целевым: параллельные записи не мешают друг другу
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp создаёт файл с правами 0600: возвращаем обычные права
+        os.chmod(tmp_path, _file_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class CourseRepository:
+    """Кэш разобранных JSON-файлов курса с проверкой времени изменения и размера.
+
+    read_json() возвращает общий объект из памяти: вызывающий код не должен
+    его изменять (для изменения есть read_json_copy()). write_json() и
+    write_bytes() записывают файл атомарно и обновляют кэш.
+    """
+
+    def __init__(self, max_files: int = DEFAULT_MAX_FILES):
+        self.max_files = max_files
+        # Путь -> ((mtime_ns, размер), разобранное содержимое)
+        self._files: "OrderedDict[str, Tuple[Tuple[int, int], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0}
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.abspath(path)
+
+    def read_json(self, path: str) -> Any:
+        """Возвращает содержимое JSON-файла, разбирая его только после изменения.
+
+        Args:
+            path: Путь к файлу
+
+        Returns:
+            Разобранное содержимое (только для чтения)
+
+        Raises:
+            FileNotFoundError: Если файл не найден
+            ValueError: Если файл имеет некорректный формат JSON
+        """
+        key = self._key(path)
+        signature = _file_signature(key)
+        if signature is None:
+            with self._lock:
+                self._files.pop(key, None)
+            raise FileNotFoundError(f"Файл не найден: {path}")
+        with self._lock:
+            cached = self._files.get(key)
+            if cached is not None and cached[0] == signature:
+                self._files.move_to_end(key)
+                self.stats["hits"] += 1
+                return cached[1]
+        data = read_file(key)
+        self._store(key, signature, data)
+        with self._lock:
+            self.stats["loads"] += 1
+        return data
+
+    def read_json_copy(self, path: str) -> Any:
+        """Как read_json, но возвращает копию, которую можно изменять."""
+        return copy.deepcopy(self.read_json(path))
+
+    def write_json(self, path: str, data: Any, human_readable: bool = False) -> None:
+        """Записывает данные в JSON-файл и запоминает их как текущее содержимое.
+
+        Формат (компактный JSON, сжатие) определяется настройками _37_serialization.
+
+        Args:
+            path: Путь к файлу
+            data: Данные для записи (в кэш попадает их копия)
+            human_readable: Файл правят вручную: с отступами и без сжатия
+
+        Raises:
+            OSError: При ошибке записи файла
+        """
+        write_bytes_atomic(path, encode_file(data, human_readable))
+        key = self._key(path)
+        self._store(key, _file_signature(key), copy.deepcopy(data))
+
+    def write_bytes(self, path: str, raw: bytes) -> None:
+        """Записывает готовое содержимое файла; оно будет разобрано при следующем чтении.
+
+        Args:
+            path: Путь к файлу
+            raw: Содержимое файла (например, результат encode_file)
+
+        Raises:
+            OSError: При ошибке записи файла
+        """
+        write_bytes_atomic(path, raw)
+        self.invalidate(path)
+
+    def invalidate(self, path: str) -> None:
+        """Удаляет файл из кэша (например, после его удаления с диска)."""
+        with self._lock:
+            self._files.pop(self._key(path), None)
+
+    def clear(self) -> None:
+        """Очищает кэш."""
+        with self._lock:
+            self._files.clear()
+
+    def _store(self, key: str, signature: Optional[Tuple[int, int]], data: Any) -> None:
+        with self._lock:
+            if signature is None:
+                self._files.pop(key, None)
+                return
+            self._files[key] = (signature, data)
+            self._files.move_to_end(key)
+            while len(self._files) > self.max_files:
+                self._files.popitem(last=False)
+
+
+_repository = CourseRepository()
+
+
+def get_repository() -> CourseRepository:
+    """Возвращает общее хранилище файлов курса."""
+    return _repository
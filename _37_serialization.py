@@ -0,0 +1,134 @@
+"""Модуль сериализации файлов курса.
+
+По умолчанию JSON записывается компактно (без отступов). Если установлен
+orjson, кодирование и разбор выполняет он. Файлы курса можно сжимать
+gzip или zstd (пакет zstandard); имена файлов не меняются, а формат
+определяется при чтении по сигнатуре в начале файла, поэтому сжатые и
+несжатые курсы читаются одинаково.
+"""
+import gzip
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+DEFAULT_COMPRESSION = "none"
+
+_config = {
+    "compression": DEFAULT_COMPRESSION,
+    "pretty": False
+}
+
+
+def configure_serialization(compression: str = DEFAULT_COMPRESSION, pretty: bool = False) -> None:
+    """Задаёт формат записи файлов курса.
+
+    Args:
+        compression: "none", "gzip" или "zstd" (без пакета zstandard используется gzip)
+        pretty: Записывать JSON с отступами
+    """
+    if compression not in COMPRESSIONS:
+        print(f"Неизвестный способ сжатия '{compression}', файлы не сжимаются")
+        compression = "none"
+    if compression == "zstd" and zstandard is None:
+        print("Пакет zstandard не установлен, для сжатия используется gzip")
+        compression = "gzip"
+    _config["compression"] = compression
+    _config["pretty"] = bool(pretty)
+
+
+def dumps(data: Any, pretty: bool = False) -> bytes:
+    """Кодирует данные в JSON (UTF-8, без экранирования кириллицы).
+
+    Args:
+        data: Данные
+        pretty: С отступами (для файлов, которые правят вручную)
+
+    Returns:
+        JSON в кодировке UTF-8
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(data, option=option)
+    if pretty:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(raw: bytes) -> Any:
+    """Разбирает JSON, при необходимости распаковывая gzip или zstd.
+
+    Args:
+        raw: Содержимое файла
+
+    Returns:
+        Разобранные данные
+
+    Raises:
+        ValueError: Если файл сжат zstd, а пакет zstandard не установлен,
+            или содержимое не является корректным JSON
+    """
+    raw = decompress(raw)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+def compress(raw: bytes, compression: str) -> bytes:
+    """Сжимает данные выбранным способом ("none" - без изменений)."""
+    if compression == "gzip":
+        # mtime=0: одинаковые данные дают одинаковый файл
+        return gzip.compress(raw, compresslevel=6, mtime=0)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    return raw
+
+
+def decompress(raw: bytes) -> bytes:
+    """Распаковывает данные, если они начинаются с сигнатуры gzip или zstd."""
+    if raw.startswith(GZIP_MAGIC):
+        return gzip.decompress(raw)
+    if raw.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("Файл сжат zstd: установите пакет zstandard")
+        return zstandard.ZstdDecompressor().decompress(raw)
+    return raw
+
+
+def encode_file(data: Any, human_readable: bool = False) -> bytes:
+    """Готовит содержимое файла курса по текущим настройкам.
+
+    Args:
+        data: Данные
+        human_readable: Файл правят вручную (settings.json): всегда
+            с отступами и без сжатия
+
+    Returns:
+        Байты для записи в файл
+    """
+    if human_readable:
+        return dumps(data, pretty=True)
+    return compress(dumps(data, pretty=_config["pretty"]), _config["compression"])
+
+
+def read_file(path: str) -> Any:
+    """Читает JSON-файл в любом из поддерживаемых форматов.
+
+    Raises:
+        FileNotFoundError: Если файл не найден
+        ValueError: Если содержимое файла некорректно
+    """
+    with open(path, 'rb') as f:
+        return loads(f.read())
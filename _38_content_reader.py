@@ -0,0 +1,158 @@
+"""Модуль чтения текста разделов из content.txt по смещениям.
+
+Если курс создан с content_offsets, разделы в structure.json хранят не
+текст, а его положение в content.txt (offset и length в байтах UTF-8,
+см. parse_structure). Файл книги отображается в память (mmap), и при
+открытии раздела декодируется только его участок.
+"""
+import mmap
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+CONTENT_FILE = "content.txt"
+
+
+class ContentReader:
+    """Отображённый в память файл книги."""
+
+    def __init__(self, path: str):
+        self.path = path
+        st = os.stat(path)
+        self.signature = (st.st_mtime_ns, st.st_size)
+        self._file = open(path, 'rb')
+        # Пустой файл отобразить нельзя
+        self._map: Optional[mmap.mmap] = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else None
+        )
+
+    def read(self, offset: int, length: int) -> str:
+        """Возвращает участок файла как текст с переводами строк \\n.
+
+        Raises:
+            ValueError: Если участок выходит за границы файла
+        """
+        if length <= 0:
+            return ""
+        if self._map is None or offset < 0 or offset + length > len(self._map):
+            raise ValueError(f"Участок {offset}+{length} вне файла {self.path}")
+        text = self._map[offset:offset + length].decode('utf-8')
+        return text.replace('\r\n', '\n').replace('\r', '\n')
+
+    def close(self) -> None:
+        """Закрывает отображение и файл."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+_lock = threading.Lock()
+_readers: Dict[str, ContentReader] = {}
+
+
+def _signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def get_reader(course_dir: str) -> ContentReader:
+    """Возвращает открытый ContentReader для content.txt курса.
+
+    Отображение открывается заново, если файл изменился.
+
+    Raises:
+        FileNotFoundError: Если в папке курса нет content.txt
+    """
+    path = os.path.abspath(os.path.join(course_dir, CONTENT_FILE))
+    signature = _signature(path)
+    if signature is None:
+        raise FileNotFoundError(f"Файл текста курса не найден: {path}")
+    with _lock:
+        reader = _readers.get(path)
+        if reader is not None and reader.signature == signature:
+            return reader
+        if reader is not None:
+            reader.close()
+        reader = _readers[path] = ContentReader(path)
+        return reader
+
+
+def close_reader(course_dir: str) -> None:
+    """Закрывает отображение content.txt курса.
+
+    В Windows отображённый файл нельзя заменить или удалить, поэтому
+    вызывается перед записью content.txt.
+    """
+    path = os.path.abspath(os.path.join(course_dir, CONTENT_FILE))
+    with _lock:
+        reader = _readers.pop(path, None)
+        if reader is not None:
+            reader.close()
+
+
+def close_readers() -> None:
+    """Закрывает все отображения (при переключении курса)."""
+    with _lock:
+        for reader in _readers.values():
+            reader.close()
+        _readers.clear()
+
+
+def has_offsets(section: Dict[str, Any]) -> bool:
+    """Проверяет, хранит ли раздел положение текста в content.txt."""
+    return "offset" in section and "length" in section
+
+
+def read_section_text(course_dir: str, section: Dict[str, Any]) -> str:
+    """Читает текст раздела из content.txt по его смещению.
+
+    Args:
+        course_dir: Путь к папке курса
+        section: Раздел с ключами offset и length
+
+    Returns:
+        Текст раздела
+    """
+    return get_reader(course_dir).read(section["offset"], section["length"])
+
+
+def fill_section_content(course_dir: str, section: Dict[str, Any]) -> Dict[str, Any]:
+    """Добавляет в раздел текст из content.txt, если он хранится по смещению.
+
+    Args:
+        course_dir: Путь к папке курса
+        section: Раздел (изменяется на месте)
+
+    Returns:
+        Тот же раздел
+    """
+    if "content" not in section and has_offsets(section):
+        section["content"] = read_section_text(course_dir, section)
+    return section
+
+
+def strip_raw_content(course_dir: str, section: Dict[str, Any]) -> Dict[str, Any]:
+    """Убирает из раздела текст, совпадающий с участком content.txt.
+
+    Текст, изменённый после создания курса (например, отформатированный),
+    сохраняется в разделе и дальше читается из него.
+
+    Args:
+        course_dir: Путь к папке курса
+        section: Раздел
+
+    Returns:
+        Раздел без content или исходный раздел
+    """
+    if "content" not in section or not has_offsets(section):
+        return section
+    try:
+        if read_section_text(course_dir, section) != section["content"]:
+            return section
+    except (OSError, ValueError):
+        return section
+    return {key: value for key, value in section.items() if key != "content"}
@@ -0,0 +1,286 @@
+"""Модуль пакетов курса .tutor: весь курс в одном zip-файле.
+
+Состав пакета:
+    manifest.json            - формат, версия, название курса, число разделов
+    index.json               - оглавление: id, title и имя файла раздела
+    sections/NNNN.json       - раздел с текстом
+    explanations/NNNN.json   - объяснения раздела по уровням (если есть)
+    exercises/NNNN.json      - банк упражнений раздела по этапам (если есть)
+    progress.json            - прогресс студента (необязательно)
+
+Каждый элемент сжат отдельно, поэтому TutorPackage читает оглавление
+или один раздел, не распаковывая остальной архив.
+
+Использование из командной строки:
+    python _39_course_package.py export "Папка курса" курс.tutor [--progress]
+    python _39_course_package.py import курс.tutor [--courses courses]
+"""
+import argparse
+import os
+import re
+import shutil
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from _6_load_course_structure import SECTIONS_DIR, load_course_structure
+from _7_save_course_structure import save_course_structure
+from _8_load_progress import load_progress
+from _9_save_progress import save_progress, flush_progress
+from _34_progress_journal import remove_journal
+from _35_sqlite_storage import get_storage
+from _36_course_repository import get_repository
+from _37_serialization import dumps, loads
+from _38_content_reader import CONTENT_FILE, close_reader
+
+PACKAGE_EXT = ".tutor"
+PACKAGE_FORMAT = "tutor-package"
+PACKAGE_VERSION = 1
+DEFAULT_COURSES_DIR = "courses"
+
+# Ключи раздела, которые хранятся в отдельных элементах пакета
+_SEPARATE_KEYS = ("explanations", "exercise_bank")
+# Смещения в content.txt не нужны: текст раздела хранится в пакете
+_DROPPED_KEYS = _SEPARATE_KEYS + ("offset", "length")
+
+
+def is_package(path: str) -> bool:
+    """Проверяет, указывает ли путь на пакет курса."""
+    return path.lower().endswith(PACKAGE_EXT) and os.path.isfile(path)
+
+
+class TutorPackage:
+    """Чтение пакета курса по элементам без распаковки.
+
+    Args:
+        path: Путь к файлу .tutor
+
+    Raises:
+        ValueError: Если файл не является пакетом курса поддерживаемой версии
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            self._zip = zipfile.ZipFile(path, 'r')
+        except zipfile.BadZipFile as e:
+            raise ValueError(f"Файл не является пакетом курса: {path}") from e
+        self._names = set(self._zip.namelist())
+        self.manifest = self._read("manifest.json") if "manifest.json" in self._names else {}
+        if self.manifest.get("format") != PACKAGE_FORMAT:
+            self.close()
+            raise ValueError(f"Файл не является пакетом курса: {path}")
+        if self.manifest.get("version", 0) > PACKAGE_VERSION:
+            self.close()
+            raise ValueError(f"Пакет создан более новой версией программы: {path}")
+        self._index: Optional[List[Dict[str, Any]]] = None
+
+    def __enter__(self) -> "TutorPackage":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Закрывает архив."""
+        self._zip.close()
+
+    def _read(self, name: str) -> Any:
+        return loads(self._zip.read(name))
+
+    def _read_optional(self, name: str, default: Any) -> Any:
+        return self._read(name) if name in self._names else default
+
+    @property
+    def title(self) -> str:
+        """Название курса из манифеста."""
+        return self.manifest.get("title") or os.path.splitext(os.path.basename(self.path))[0]
+
+    def index(self) -> List[Dict[str, Any]]:
+        """Возвращает оглавление курса (id, title, file)."""
+        if self._index is None:
+            self._index = self._read("index.json")
+        return self._index
+
+    def _entry(self, section_id: Any) -> Optional[Dict[str, Any]]:
+        for entry in self.index():
+            if entry.get("id") == section_id:
+                return entry
+        return None
+
+    def load_section(self, section_id: Any) -> Optional[Dict[str, Any]]:
+        """Читает один раздел вместе с объяснениями и банком упражнений.
+
+        Returns:
+            Словарь раздела или None, если раздела нет в пакете
+        """
+        entry = self._entry(section_id)
+        if entry is None:
+            return None
+        return self._load_entry(entry)
+
+    def _load_entry(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        file_name = entry["file"]
+        section = self._read(f"sections/{file_name}")
+        section["explanations"] = self._read_optional(f"explanations/{file_name}", {})
+        bank = self._read_optional(f"exercises/{file_name}", {})
+        if bank:
+            section["exercise_bank"] = bank
+        return section
+
+    def sections(self) -> List[Dict[str, Any]]:
+        """Читает все разделы курса по порядку."""
+        return [self._load_entry(entry) for entry in self.index()]
+
+    def progress(self) -> Optional[Dict[str, Any]]:
+        """Возвращает прогресс из пакета или None, если он не включён."""
+        return self._read_optional("progress.json", None)
+
+
+def export_package(course_dir: str, package_path: str, include_progress: bool = False) -> str:
+    """Записывает курс в пакет .tutor.
+
+    Args:
+        course_dir: Папка курса
+        package_path: Путь к создаваемому пакету
+        include_progress: Включить в пакет прогресс студента
+
+    Returns:
+        Путь к пакету
+
+    Raises:
+        FileNotFoundError: Если структура курса не найдена
+    """
+    sections = load_course_structure(os.path.join(course_dir, "structure.json"))
+    progress = None
+    if include_progress:
+        flush_progress()  # Отложенные изменения должны попасть в файл до его чтения
+        try:
+            progress = load_progress(os.path.join(course_dir, "progress.json"))
+        except FileNotFoundError:
+            print(f"Прогресс курса не найден, пакет создаётся без него: {course_dir}")
+
+    index = []
+    tmp_path = f"{package_path}.tmp"
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("manifest.json", dumps({
+            "format": PACKAGE_FORMAT,
+            "version": PACKAGE_VERSION,
+            "title": os.path.basename(os.path.normpath(course_dir)),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "sections": len(sections),
+            "progress": progress is not None
+        }, pretty=True))
+        for position, section in enumerate(sections, start=1):
+            file_name = f"{position:04d}.json"
+            index.append({"id": section.get("id"), "title": section.get("title", ""), "file": file_name})
+            zf.writestr(f"sections/{file_name}",
+                        dumps({k: v for k, v in section.items() if k not in _DROPPED_KEYS}))
+            if section.get("explanations"):
+                zf.writestr(f"explanations/{file_name}", dumps(section["explanations"]))
+            bank = section.get("exercise_bank")
+            if bank:
+                zf.writestr(f"exercises/{file_name}", dumps(bank))
+        zf.writestr("index.json", dumps(index))
+        if progress is not None:
+            zf.writestr("progress.json", dumps(progress))
+    os.replace(tmp_path, package_path)
+    print(f"Курс {course_dir} экспортирован в пакет {package_path}")
+    return package_path
+
+
+def package_course_dir(package_path: str, courses_dir: str = DEFAULT_COURSES_DIR) -> str:
+    """Возвращает папку, в которую импортируется пакет."""
+    name = re.sub(r'[<>:"/\\|?*]', "_", os.path.splitext(os.path.basename(package_path))[0]).strip() or "course"
+    return os.path.join(courses_dir, name)
+
+
+def is_imported(course_dir: str) -> bool:
+    """Проверяет, есть ли уже курс в папке (или в базе SQLite)."""
+    storage = get_storage()
+    if storage is not None and storage.has_course(course_dir):
+        return True
+    return os.path.exists(os.path.join(course_dir, "structure.json"))
+
+
+def _clear_course(course_dir: str) -> None:
+    """Удаляет прежний курс (файлы, записи в базе, прогресс и его журнал) перед импортом поверх него."""
+    flush_progress()  # Отложенная запись прежнего прогресса не должна попасть в новый курс
+    storage = get_storage()
+    if storage is not None:
+        storage.delete_course(course_dir)
+    progress_path = os.path.join(course_dir, "progress.json")
+    remove_journal(progress_path)
+    close_reader(course_dir)
+    repository = get_repository()
+    for name in ("structure.json", "structure.json.bak", "progress.json", CONTENT_FILE):
+        path = os.path.join(course_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+        repository.invalidate(path)
+    sections_dir = os.path.join(course_dir, SECTIONS_DIR)
+    if os.path.isdir(sections_dir):
+        for file_name in os.listdir(sections_dir):
+            repository.invalidate(os.path.join(sections_dir, file_name))
+        shutil.rmtree(sections_dir)
+
+
+def import_package(package_path: str, courses_dir: str = DEFAULT_COURSES_DIR, overwrite: bool = False) -> str:
+    """Импортирует пакет .tutor в папку курса.
+
+    Разделы записываются через save_course_structure, поэтому курс
+    сохраняется в настроенном формате (файлы или база SQLite). При замене
+    уже импортированного курса его разделы, прогресс и журнал прогресса
+    удаляются.
+
+    Args:
+        package_path: Путь к пакету
+        courses_dir: Папка с курсами
+        overwrite: Перезаписать уже импортированный курс
+
+    Returns:
+        Папка импортированного курса
+
+    Raises:
+        ValueError: Если файл не является пакетом курса
+    """
+    course_dir = package_course_dir(package_path, courses_dir)
+    if is_imported(course_dir) and not overwrite:
+        return course_dir
+
+    # Пакет читается до удаления прежнего курса: повреждённый пакет его не затронет
+    with TutorPackage(package_path) as package:
+        sections = package.sections()
+        progress = package.progress()
+    _clear_course(course_dir)
+    os.makedirs(course_dir, exist_ok=True)
+
+    save_course_structure(os.path.join(course_dir, "structure.json"), sections)
+    if progress is not None:
+        save_progress(os.path.join(course_dir, "progress.json"), progress)
+    print(f"Пакет {package_path} импортирован в {course_dir}")
+    return course_dir
+
+
+def main() -> None:
+    """Импорт и экспорт пакетов курса из командной строки."""
+    parser = argparse.ArgumentParser(description="Пакеты курсов Tutor (.tutor)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Упаковать папку курса")
+    export_parser.add_argument("course_dir")
+    export_parser.add_argument("package_path")
+    export_parser.add_argument("--progress", action="store_true", help="Включить прогресс студента")
+    import_parser = subparsers.add_parser("import", help="Импортировать пакет")
+    import_parser.add_argument("package_path")
+    import_parser.add_argument("--courses", default=DEFAULT_COURSES_DIR, help="Папка с курсами")
+    import_parser.add_argument("--overwrite", action="store_true", help="Перезаписать импортированный курс")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_package(args.course_dir, args.package_path, args.progress)
+    else:
+        import_package(args.package_path, args.courses, args.overwrite)
+
+
+if __name__ == "__main__":
+    main()
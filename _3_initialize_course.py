@@ -1,17 +1,22 @@
 """Модуль для инициализации курса на основе книги."""
 
 import os
-import json
 from typing import Optional
 from _1_load_book import load_book
 from _2_parse_structure import parse_structure
+from _7_save_course_structure import save_course_structure
+from _9_save_progress import save_progress
+from _36_course_repository import write_bytes_atomic
+from _38_content_reader import CONTENT_FILE, close_reader
 
-def initialize_course(book_path: str, output_dir: str) -> None:
+def initialize_course(book_path: str, output_dir: str, with_offsets: bool = False) -> None:
     """Создаёт структуру курса и файл прогресса пользователя.
     
     Args:
         book_path: Путь к файлу книги (.docx или .txt)
         output_dir: Путь к директории для сохранения файлов курса
+        with_offsets: Сохранить текст книги в content.txt, а в разделах
+            хранить только смещения его участков
         
     Returns:
         None
@@ -25,16 +30,20 @@ def initialize_course(book_path: str, output_dir: str) -> None:
     book_text = load_book(book_path)
     
     # Разбираем структуру книги
-    sections = parse_structure(book_text)
+    sections = parse_structure(book_text, with_offsets)
     
     # Создаем директорию, если её нет
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    # Сохраняем структуру в structure.json
+    if with_offsets:
+        # Отображённый в память прежний файл не даст его заменить
+        close_reader(output_dir)
+        write_bytes_atomic(os.path.join(output_dir, CONTENT_FILE), book_text.encode('utf-8'))
+    
+    # Сохраняем структуру курса
     structure_path = os.path.join(output_dir, "structure.json")
-    with open(structure_path, 'w', encoding='utf-8') as f:
-        json.dump(sections, f, ensure_ascii=False, indent=2)
+    save_course_structure(structure_path, sections)
     
     # Инициализируем пустой прогресс для всех разделов
     progress = {
@@ -55,8 +64,7 @@ def initialize_course(book_path: str, output_dir: str) -> None:
     
     # Сохраняем прогресс в progress.json
     progress_path = os.path.join(output_dir, "progress.json")
-    with open(progress_path, 'w', encoding='utf-8') as f:
-        json.dump(progress, f, ensure_ascii=False, indent=2)
+    save_progress(progress_path, progress)
     
     print(f"Курс успешно инициализирован в директории {output_dir}")
     print(f"Создано {len(sections)} разделов") 
\ No newline at end of file
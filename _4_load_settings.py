@@ -1,8 +1,9 @@
 """Модуль для загрузки настроек из JSON-файла."""
-import json
 import os
 from typing import Dict, Any, List
 
+from _36_course_repository import get_repository
+
 def load_settings(settings_path: str) -> Dict[str, Any]:
     """Загружает настройки из JSON-файла.
     
@@ -21,6 +22,22 @@ def load_settings(settings_path: str) -> Dict[str, Any]:
         default_settings = {
             "llm_provider": "local",  # local или openrouter
             "api_endpoint": "http://localhost:1234/v1",
+            "api_endpoints": [],  # дополнительные серверы с той же моделью
+            "endpoint_health_interval": 15.0,
+            "endpoint_down_cooldown": 30.0,
+            "models_cache_ttl": 3600,
+            "llm_metrics_enabled": True,
+            "llm_metrics_max_mb": 5,
+            "cache_prompt": True,  # сохранять префикс запроса на локальном сервере
+            "pregen_combined_levels": False,  # все уровни объяснений одним запросом при прегенерации
+            "progress_save_delay": 1.0,  # секунды до отложенной записи progress.json
+            "storage_backend": "json",  # json или sqlite
+            "storage_db_path": "tutor.db",
+            "student_name": "default",
+            "course_layout": "single",  # single (один structure.json) или split (оглавление + файл на раздел)
+            "course_compression": "none",  # none, gzip или zstd для файлов курса и прогресса
+            "course_json_pretty": False,  # JSON файлов курса с отступами
+            "content_offsets": False,  # текст разделов новых курсов читается из content.txt по смещениям
             "model": "local",
             "openrouter_api_key": "",
             "openrouter_models": [
@@ -30,17 +47,32 @@ def load_settings(settings_path: str) -> Dict[str, Any]:
             "selected_openrouter_model": "meta-llama/llama-3-8b-instruct",
             "max_tokens": 8000,
             "temperature": 0.5,
+            "http_pool_size": 10,
+            "llm_concurrency": 4,
+            "llm_cache_max_entries": 2000,
+            "llm_cache_max_mb": 200,
+            "retry_max_attempts": 3,
+            "retry_base_delay": 1.0,
+            "retry_max_delay": 30.0,
+            "circuit_failure_threshold": 3,
+            "circuit_reset_timeout": 30.0,
+            "rate_limits": {
+                "openrouter": {"requests_per_minute": 20, "tokens_per_minute": 100000},
+                "local": {"requests_per_minute": 0, "tokens_per_minute": 0}
+            },
+            "default_context_length": 0,  # 0 - неизвестен: текст не сокращается, пока сервер не сообщит размер контекста
+            "context_limits": {},
+            "structured_output": True,  # JSON-схемы ответов (response_format)
+            "task_overrides": {},  # например {"format": {"model": "..."}}
             "detail_level": "средний",
             "difficulty": "средний"
         }
         
         # Сохраняем настройки по умолчанию
-        with open(settings_path, 'w', encoding='utf-8') as f:
-            json.dump(default_settings, f, ensure_ascii=False, indent=2)
+        get_repository().write_json(settings_path, default_settings, human_readable=True)
         
         print(f"Файл настроек не найден. Создан файл с настройками по умолчанию: {settings_path}")
         return default_settings
     
-    # Загружаем настройки из файла
-    with open(settings_path, 'r', encoding='utf-8') as f:
-        return json.load(f) 
\ No newline at end of file
+    # Загружаем настройки из файла (разбирается заново только после его изменения)
+    return get_repository().read_json_copy(settings_path) 
\ No newline at end of file
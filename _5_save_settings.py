@@ -1,7 +1,8 @@
 """Модуль для сохранения настроек в JSON-файл."""
-import json
 from typing import Dict, Any
 
+from _36_course_repository import get_repository
+
 def save_settings(settings_path: str, settings: Dict[str, Any]) -> None:
     """Сохраняет настройки в JSON-файл.
     
@@ -15,7 +16,6 @@ def save_settings(settings_path: str, settings: Dict[str, Any]) -> None:
     Raises:
         IOError: При ошибке записи файла
     """
-    with open(settings_path, 'w', encoding='utf-8') as f:
-        json.dump(settings, f, ensure_ascii=False, indent=2)
+    get_repository().write_json(settings_path, settings, human_readable=True)
     
     print(f"Настройки успешно сохранены в {settings_path}") 
\ No newline at end of file
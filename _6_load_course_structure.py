@@ -1,23 +1,140 @@
 """Модуль для загрузки структуры курса."""
-import json
+import copy
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+from _35_sqlite_storage import get_storage, get_student
+from _36_course_repository import get_repository
+from _38_content_reader import fill_section_content
+
+# Признак разделённого формата: structure.json содержит только оглавление,
+# а текст и объяснения каждого раздела лежат в отдельном файле папки sections
+SPLIT_FORMAT = "tutor-split"
+SECTIONS_DIR = "sections"
+
+
+def is_split_index(data: Any) -> bool:
+    """Проверяет, является ли содержимое structure.json оглавлением разделённого курса."""
+    return isinstance(data, dict) and data.get("format") == SPLIT_FORMAT
+
+
+def _read_json(path: str) -> Any:
+    # Общий объект из памяти: изменять его нельзя
+    return get_repository().read_json(path)
+
+
+def _read_section_file(course_dir: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+    section = get_repository().read_json_copy(os.path.join(course_dir, SECTIONS_DIR, entry["file"]))
+    return fill_section_content(course_dir, section)
+
 
 def load_course_structure(structure_path: str) -> List[Dict[str, Any]]:
     """Загружает список разделов курса.
-    
+
+    Для чтения одного раздела используйте load_section: этой функции
+    в разделённом формате приходится читать файлы всех разделов.
+
     Args:
         structure_path: Путь к файлу структуры курса
-        
+
     Returns:
         Список словарей, представляющих разделы курса
-        
+
     Raises:
         FileNotFoundError: Если файл структуры не найден
         json.JSONDecodeError: Если файл имеет некорректный формат JSON
     """
+    storage = get_storage()
+    if storage is not None:
+        course_dir = os.path.dirname(structure_path)
+        # Курс, ещё не перенесённый в базу, импортируется при первом открытии
+        if not storage.has_course(course_dir) and os.path.exists(structure_path):
+            storage.import_course(course_dir, get_student())
+        return storage.load_sections(course_dir)
+
+    return read_course_files(structure_path)
+
+def read_course_files(structure_path: str) -> List[Dict[str, Any]]:
+    """Читает все разделы курса из файлов, минуя базу SQLite.
+
+    Args:
+        structure_path: Путь к файлу структуры курса
+
+    Returns:
+        Список словарей, представляющих разделы курса
+
+    Raises:
+        FileNotFoundError: Если файл структуры не найден
+    """
     if not os.path.exists(structure_path):
         raise FileNotFoundError(f"Файл структуры курса не найден: {structure_path}")
-    
-    with open(structure_path, 'r', encoding='utf-8') as f:
-        return json.load(f) 
\ No newline at end of file
+
+    data = _read_json(structure_path)
+    if is_split_index(data):
+        course_dir = os.path.dirname(structure_path)
+        return [_read_section_file(course_dir, entry) for entry in data["sections"]]
+    course_dir = os.path.dirname(structure_path)
+    return [fill_section_content(course_dir, sec) for sec in get_repository().read_json_copy(structure_path)]
+
+def load_course_index(course_dir: str) -> List[Dict[str, Any]]:
+    """Загружает оглавление курса: id и title разделов без текста и объяснений.
+
+    Args:
+        course_dir: Путь к папке курса
+
+    Returns:
+        Список словарей с ключами id и title в порядке разделов
+
+    Raises:
+        FileNotFoundError: Если файл структуры не найден
+    """
+    storage = get_storage()
+    if storage is not None:
+        if storage.has_course(course_dir):
+            return storage.list_sections(course_dir)
+        return [{"id": sec.get("id"), "title": sec.get("title", "")}
+                for sec in load_course_structure(os.path.join(course_dir, "structure.json"))]
+
+    structure_path = os.path.join(course_dir, "structure.json")
+    if not os.path.exists(structure_path):
+        raise FileNotFoundError(f"Файл структуры курса не найден: {structure_path}")
+    data = _read_json(structure_path)
+    sections = data["sections"] if is_split_index(data) else data
+    return [{"id": sec.get("id"), "title": sec.get("title", "")} for sec in sections]
+
+def load_section(course_dir: str, section_id: Any) -> Optional[Dict[str, Any]]:
+    """Загружает один раздел курса с текстом и объяснениями.
+
+    В разделённом формате и в базе SQLite читается только этот раздел.
+
+    Args:
+        course_dir: Путь к папке курса
+        section_id: Идентификатор раздела
+
+    Returns:
+        Словарь раздела или None, если раздел не найден
+
+    Raises:
+        FileNotFoundError: Если файл структуры не найден
+    """
+    storage = get_storage()
+    if storage is not None and storage.has_course(course_dir):
+        return storage.load_section(course_dir, section_id)
+
+    structure_path = os.path.join(course_dir, "structure.json")
+    if storage is None and os.path.exists(structure_path):
+        data = _read_json(structure_path)
+        if is_split_index(data):
+            for entry in data["sections"]:
+                if entry.get("id") == section_id:
+                    return _read_section_file(course_dir, entry)
+            return None
+        for sec in data:
+            if sec.get("id") == section_id:
+                return fill_section_content(course_dir, copy.deepcopy(sec))
+        return None
+
+    for sec in load_course_structure(structure_path):
+        if sec.get("id") == section_id:
+            return sec
+    return None
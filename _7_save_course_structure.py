@@ -1,21 +1,269 @@
 """Модуль для сохранения структуры курса."""
-import json
-from typing import List, Dict, Any
+import hashlib
+import os
+import re
+import shutil
+from typing import List, Dict, Any, Callable
+
+from _6_load_course_structure import SPLIT_FORMAT, SECTIONS_DIR, is_split_index
+from _35_sqlite_storage import get_storage
+from _36_course_repository import get_repository
+from _37_serialization import dumps
+from _38_content_reader import fill_section_content, strip_raw_content
+
+# Формат курсов: "single" - один structure.json (читается и старыми версиями программы),
+# "split" - оглавление и файл на каждый раздел (включается в настройках)
+DEFAULT_COURSE_LAYOUT = "single"
+COURSE_LAYOUTS = ("split", "single")
+
+_layout = DEFAULT_COURSE_LAYOUT
+
+
+def configure_course_layout(layout: str = DEFAULT_COURSE_LAYOUT) -> None:
+    """Задаёт формат, в котором сохраняются курсы.
+
+    Args:
+        layout: "split" (оглавление structure.json и файлы sections/*.json)
+            или "single" (все разделы в structure.json)
+    """
+    global _layout
+    if layout not in COURSE_LAYOUTS:
+        print(f"Неизвестный формат курса '{layout}', используется {DEFAULT_COURSE_LAYOUT}")
+        layout = DEFAULT_COURSE_LAYOUT
+    _layout = layout
+
+
+def _section_file_names(structure: List[Dict[str, Any]]) -> List[str]:
+    """Имена файлов разделов по их id; разные id с одинаковым именем ("1/2" и "1_2") получают суффикс."""
+    names = []
+    used = set()
+    for section in structure:
+        base = re.sub(r"[^\w.-]", "_", str(section.get("id")))
+        name, suffix = base, 1
+        # Регистр не учитывается: в Windows 'A.json' и 'a.json' - один файл
+        while name.lower() in used:
+            suffix += 1
+            name = f"{base}_{suffix}"
+        used.add(name.lower())
+        names.append(name + ".json")
+    return names
+
+
+def _section_hash(section: Dict[str, Any]) -> str:
+    # Хеш несжатого JSON: сжатые данные зависят от способа сжатия
+    return hashlib.sha1(dumps(section)).hexdigest()
+
+
+def _remove_section_file(path: str) -> None:
+    os.remove(path)
+    get_repository().invalidate(path)
+
+
+def _read_index(structure_path: str) -> Dict[str, Any]:
+    if os.path.exists(structure_path):
+        data = get_repository().read_json(structure_path)
+        if is_split_index(data):
+            return data
+    return {"format": SPLIT_FORMAT, "version": 1, "sections": []}
+
+
+def _save_split(structure_path: str, structure: List[Dict[str, Any]]) -> int:
+    """Записывает изменившиеся файлы разделов и оглавление; возвращает число записанных разделов."""
+    course_dir = os.path.dirname(structure_path)
+    sections_dir = os.path.join(course_dir, SECTIONS_DIR)
+    os.makedirs(sections_dir, exist_ok=True)
+    old_hashes = {entry["file"]: entry.get("hash") for entry in _read_index(structure_path)["sections"]}
+
+    repository = get_repository()
+    entries = []
+    written = 0
+    for section, file_name in zip(structure, _section_file_names(structure)):
+        # Текст, совпадающий с content.txt, не дублируется в файле раздела
+        section = strip_raw_content(course_dir, section)
+        digest = _section_hash(section)
+        # Неизменённый раздел не перезаписывается
+        if old_hashes.get(file_name) != digest or not os.path.exists(os.path.join(sections_dir, file_name)):
+            repository.write_json(os.path.join(sections_dir, file_name), section)
+            written += 1
+        entries.append({"id": section.get("id"), "title": section.get("title", ""),
+                        "file": file_name, "hash": digest})
+
+    repository.write_json(structure_path, {"format": SPLIT_FORMAT, "version": 1, "sections": entries})
+
+    # Удаляем файлы разделов, которых больше нет в курсе
+    current = {entry["file"] for entry in entries}
+    for file_name in os.listdir(sections_dir):
+        if file_name.endswith(".json") and file_name not in current:
+            _remove_section_file(os.path.join(sections_dir, file_name))
+    return written
+
 
 def save_course_structure(structure_path: str, structure: List[Dict[str, Any]]) -> None:
     """Сохраняет структуру курса в JSON.
-    
+
+    В формате "split" structure.json содержит только оглавление (id, title,
+    имя файла и хеш раздела), а каждый раздел с текстом и объяснениями
+    хранится в sections/<id>.json; перезаписываются только изменившиеся разделы.
+
     Args:
         structure_path: Путь к файлу структуры курса
         structure: Список словарей, представляющих разделы курса
-        
+
     Returns:
         None
-        
+
     Raises:
         IOError: При ошибке записи файла
     """
-    with open(structure_path, 'w', encoding='utf-8') as f:
-        json.dump(structure, f, ensure_ascii=False, indent=2)
-    
-    print(f"Структура курса успешно сохранена в {structure_path}") 
\ No newline at end of file
+    storage = get_storage()
+    if storage is not None:
+        # База хранит текст разделов сама
+        course_dir = os.path.dirname(structure_path)
+        structure = [fill_section_content(course_dir, dict(sec)) for sec in structure]
+        storage.save_sections(course_dir, structure)
+        print(f"Структура курса успешно сохранена в базе {storage.db_path}")
+        return
+
+    if _layout == "split":
+        written = _save_split(structure_path, structure)
+        print(f"Структура курса успешно сохранена в {structure_path} (записано разделов: {written})")
+        return
+
+    course_dir = os.path.dirname(structure_path)
+    get_repository().write_json(structure_path, [strip_raw_content(course_dir, sec) for sec in structure])
+    # При переходе с разделённого формата файлы разделов больше не нужны
+    sections_dir = os.path.join(course_dir, SECTIONS_DIR)
+    if os.path.isdir(sections_dir):
+        for file_name in os.listdir(sections_dir):
+            if file_name.endswith(".json"):
+                _remove_section_file(os.path.join(sections_dir, file_name))
+
+    print(f"Структура курса успешно сохранена в {structure_path}")
+
+def migrate_course_layout(structure_path: str) -> bool:
+    """Переводит курс из одного structure.json в разделённый формат, если он выбран в настройках.
+
+    Прежний файл сохраняется рядом как structure.json.bak.
+
+    Args:
+        structure_path: Путь к файлу структуры курса
+
+    Returns:
+        True, если курс был пересохранён
+    """
+    if get_storage() is not None or _layout != "split" or not os.path.exists(structure_path):
+        return False
+    data = get_repository().read_json(structure_path)
+    if is_split_index(data):
+        return False
+    backup_path = structure_path + ".bak"
+    shutil.copy2(structure_path, backup_path)
+    save_course_structure(structure_path, data)
+    print(f"Курс переведён в разделённый формат, прежний файл сохранён: {backup_path}")
+    return True
+
+def _update_section(structure_path: str, section_id: Any, update: Callable[[Dict[str, Any]], bool]) -> bool:
+    """Изменяет один раздел в файлах курса.
+
+    В разделённом формате перезаписываются файл раздела и оглавление,
+    единый structure.json перезаписывается целиком.
+
+    Args:
+        structure_path: Путь к файлу структуры курса
+        section_id: Идентификатор раздела
+        update: Функция, изменяющая раздел на месте; возвращает False, если менять нечего
+
+    Returns:
+        False, если раздел не найден
+    """
+    course_dir = os.path.dirname(structure_path)
+    repository = get_repository()
+    data = repository.read_json_copy(structure_path)
+    if not is_split_index(data):
+        for sec in data:
+            if sec.get("id") == section_id:
+                if update(sec):
+                    save_course_structure(structure_path, data)
+                return True
+        return False
+
+    for entry in data["sections"]:
+        if entry.get("id") == section_id:
+            section_path = os.path.join(course_dir, SECTIONS_DIR, entry["file"])
+            section = repository.read_json_copy(section_path)
+            if update(section):
+                repository.write_json(section_path, section)
+                entry["hash"] = _section_hash(section)
+                repository.write_json(structure_path, data)
+            return True
+    return False
+
+def save_section_explanation(
+    structure_path: str,
+    section_id: Any,
+    level: str,
+    html: str
+) -> None:
+    """Сохраняет одно объяснение раздела.
+
+    В базе SQLite записывается одна строка, в разделённом формате - файл
+    этого раздела и оглавление; единый structure.json перезаписывается целиком.
+
+    Args:
+        structure_path: Путь к файлу структуры курса
+        section_id: Идентификатор раздела
+        level: Уровень детализации
+        html: Текст объяснения
+    """
+    storage = get_storage()
+    if storage is not None:
+        storage.save_explanation(os.path.dirname(structure_path), section_id, level, html)
+        return
+
+    def update(section: Dict[str, Any]) -> bool:
+        section.setdefault("explanations", {})[level] = html
+        return True
+
+    if not _update_section(structure_path, section_id, update):
+        print(f"Раздел {section_id} не найден в {structure_path}")
+
+def save_section_exercises(
+    structure_path: str,
+    section_id: Any,
+    stage: int,
+    exercises: List[Dict[str, Any]]
+) -> int:
+    """Добавляет сгенерированные упражнения в банк упражнений раздела.
+
+    Банк хранится в разделе (exercise_bank: этап -> список упражнений) или
+    в таблице exercises базы SQLite и переносится в пакеты курса .tutor.
+    Упражнения с уже сохранёнными вопросами пропускаются.
+
+    Args:
+        structure_path: Путь к файлу структуры курса
+        section_id: Идентификатор раздела
+        stage: Этап обучения (0-2)
+        exercises: Упражнения без служебных полей интерфейса
+
+    Returns:
+        Число добавленных упражнений
+    """
+    storage = get_storage()
+    if storage is not None:
+        return storage.add_exercises(os.path.dirname(structure_path), section_id, stage, exercises)
+
+    added = []
+
+    def update(section: Dict[str, Any]) -> bool:
+        bank = section.setdefault("exercise_bank", {}).setdefault(str(stage), [])
+        known = {ex.get("question") for ex in bank}
+        for exercise in exercises:
+            if exercise.get("question") not in known:
+                known.add(exercise.get("question"))
+                bank.append(exercise)
+                added.append(exercise)
+        return bool(added)
+
+    if not _update_section(structure_path, section_id, update):
+        print(f"Раздел {section_id} не найден в {structure_path}")
+    return len(added)
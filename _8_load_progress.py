@@ -1,8 +1,11 @@
 """Модуль для загрузки прогресса пользователя."""
-import json
 import os
 from typing import Dict, Any
 
+from _34_progress_journal import replay_journal
+from _35_sqlite_storage import get_storage, get_student
+from _36_course_repository import get_repository
+
 def load_progress(progress_path: str) -> Dict[str, Any]:
     """Загружает прогресс пользователя.
     
@@ -16,11 +19,18 @@ def load_progress(progress_path: str) -> Dict[str, Any]:
         FileNotFoundError: Если файл прогресса не найден
         json.JSONDecodeError: Если файл имеет некорректный формат JSON
     """
+    storage = get_storage()
+    if storage is not None:
+        return storage.load_progress(os.path.dirname(progress_path), get_student())
+    
     if not os.path.exists(progress_path):
         raise FileNotFoundError(f"Файл прогресса не найден: {progress_path}")
     
-    with open(progress_path, 'r', encoding='utf-8') as f:
-        progress = json.load(f)
+    # Снимок разбирается заново только после его изменения на диске
+    progress = get_repository().read_json_copy(progress_path)
+    
+    # Применяем ответы и оценки из журнала, ещё не вошедшие в снимок
+    replay_journal(progress_path, progress)
     
     # Проверяем и обновляем структуру, если необходимо
     if "sections" in progress:
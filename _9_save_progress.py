@@ -1,21 +1,188 @@
 """Модуль для сохранения прогресса пользователя."""
-import json
-from typing import Dict, Any
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+from _34_progress_journal import journal_lock, truncate_journal, append_progress_event, apply_progress_event
+from _35_sqlite_storage import get_storage, get_student
+from _36_course_repository import get_repository
+from _37_serialization import encode_file
+
+# Задержка отложенной записи: изменения, сделанные за это время, записываются одним разом (секунды)
+DEFAULT_SAVE_DELAY = 1.0
+# Количество попыток снять копию прогресса, если словарь изменился во время сериализации
+SNAPSHOT_ATTEMPTS = 3
+
+
+def _serialize_progress(progress: Dict[str, Any]) -> Tuple[bytes, int]:
+    # Снимок и номер последнего учтённого события журнала снимаются согласованно
+    with journal_lock:
+        return encode_file(progress), progress.get("journal_seq", 0)
+
+
+def _write_snapshot(progress_path: str, raw: bytes, seq: int) -> None:
+    """Записывает снимок прогресса и удаляет из журнала вошедшие в него события."""
+    get_repository().write_bytes(progress_path, raw)
+    truncate_journal(progress_path, seq)
+
 
 def save_progress(progress_path: str, progress: Dict[str, Any]) -> None:
     """Сохраняет прогресс пользователя.
-    
+
     Args:
         progress_path: Путь к файлу прогресса
         progress: Словарь с прогрессом пользователя
-        
+
     Returns:
         None
-        
+
     Raises:
         IOError: При ошибке записи файла
     """
-    with open(progress_path, 'w', encoding='utf-8') as f:
-        json.dump(progress, f, ensure_ascii=False, indent=2)
-    
-    print(f"Прогресс пользователя успешно сохранен в {progress_path}") 
\ No newline at end of file
+    storage = get_storage()
+    if storage is not None:
+        with journal_lock:
+            storage.save_progress(os.path.dirname(progress_path), progress, get_student())
+        print(f"Прогресс пользователя успешно сохранен в базе {storage.db_path}")
+        return
+
+    _write_snapshot(progress_path, *_serialize_progress(progress))
+
+    print(f"Прогресс пользователя успешно сохранен в {progress_path}")
+
+
+class ProgressSaver:
+    """Отложенное сохранение прогресса в фоновом потоке.
+
+    schedule() только отмечает прогресс как изменённый; запись выполняется,
+    когда после последнего изменения прошло delay секунд, поэтому серия
+    ответов подряд приводит к одной записи файла. flush() записывает
+    ожидающие изменения немедленно (при смене раздела и выходе).
+    Записанный снимок уплотняет журнал прогресса (см. _34_progress_journal).
+    """
+
+    def __init__(self, delay: float = DEFAULT_SAVE_DELAY):
+        self.delay = delay
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._deadline = 0.0
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, progress_path: str, progress: Dict[str, Any]) -> None:
+        """Отмечает прогресс для отложенной записи.
+
+        Args:
+            progress_path: Путь к файлу прогресса
+            progress: Словарь с прогрессом (записывается его состояние на момент записи)
+        """
+        with self._cond:
+            self._pending[progress_path] = progress
+            self._deadline = time.monotonic() + self.delay
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="progress-saver", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def flush(self) -> None:
+        """Немедленно записывает все ожидающие изменения в вызывающем потоке."""
+        with self._cond:
+            batch, self._pending = self._pending, {}
+        self._write(batch)
+
+    def has_pending(self) -> bool:
+        """Проверяет, есть ли незаписанные изменения."""
+        with self._cond:
+            return bool(self._pending)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                batch, self._pending = self._pending, {}
+            self._write(batch)
+
+    def _write(self, batch: Dict[str, Dict[str, Any]]) -> None:
+        # Записи выполняются по одной, чтобы фоновый поток и flush() не делили временный файл
+        with self._write_lock:
+            for progress_path, progress in batch.items():
+                storage = get_storage()
+                if storage is not None:
+                    try:
+                        with journal_lock:
+                            storage.save_progress(os.path.dirname(progress_path), progress, get_student())
+                    except sqlite3.Error as e:
+                        print(f"Ошибка отложенного сохранения прогресса в базе {storage.db_path}: {e}")
+                    continue
+                snapshot = None
+                for _ in range(SNAPSHOT_ATTEMPTS):
+                    try:
+                        snapshot = _serialize_progress(progress)
+                        break
+                    except RuntimeError:
+                        continue  # Словарь изменён интерфейсом во время сериализации
+                try:
+                    if snapshot is None:
+                        raise RuntimeError("прогресс изменялся во время каждой попытки сериализации")
+                    _write_snapshot(progress_path, *snapshot)
+                except (OSError, RuntimeError) as e:
+                    print(f"Ошибка отложенного сохранения прогресса в {progress_path}: {e}")
+                    # Повторим при следующем изменении или сбросе
+                    with self._cond:
+                        self._pending.setdefault(progress_path, progress)
+
+
+_saver = ProgressSaver()
+atexit.register(_saver.flush)
+
+
+def configure_progress_saver(delay: float = DEFAULT_SAVE_DELAY) -> None:
+    """Задаёт задержку отложенной записи прогресса.
+
+    Args:
+        delay: Секунды без изменений, после которых прогресс записывается на диск
+    """
+    _saver.delay = max(0.0, float(delay))
+
+
+def record_progress_event(progress_path: str, progress: Dict[str, Any], event: Dict[str, Any]) -> None:
+    """Записывает изменение прогресса в журнал; снимок обновляется в фоне по мере роста журнала.
+
+    Args:
+        progress_path: Путь к файлу прогресса
+        progress: Словарь с прогрессом пользователя
+        event: Событие (см. apply_progress_event)
+    """
+    storage = get_storage()
+    if storage is not None:
+        # В базе событие записывается одной строкой таблицы
+        with journal_lock:
+            apply_progress_event(progress, event)
+        try:
+            storage.record_event(os.path.dirname(progress_path), event, get_student())
+        except sqlite3.Error as e:
+            print(f"Ошибка записи прогресса в базу {storage.db_path}: {e}")
+            _saver.schedule(progress_path, progress)
+        return
+    try:
+        if append_progress_event(progress_path, progress, event):
+            _saver.schedule(progress_path, progress)
+    except OSError as e:
+        # Без журнала изменение сохранится полным снимком
+        print(f"Ошибка записи журнала прогресса: {e}")
+        with journal_lock:
+            apply_progress_event(progress, event)
+        _saver.schedule(progress_path, progress)
+
+
+def flush_progress() -> None:
+    """Немедленно записывает отложенные изменения прогресса."""
+    _saver.flush()
@@ -6,6 +6,12 @@ from _15_log_error import log_error, log_info
 from _2_parse_structure import parse_structure
 from _17_open_course import open_course as open_course_func
 from _18_select_section import select_section, get_course_sections
+from _7_save_course_structure import save_course_structure
+from _9_save_progress import save_progress
+from _36_course_repository import write_bytes_atomic
+from _38_content_reader import CONTENT_FILE, close_reader, fill_section_content
+from _39_course_package import (PACKAGE_EXT, export_package, import_package, is_imported,
+                                package_course_dir)
 
 def create_course_structure(parent):
     """Создает структуру курса на основе загруженной книги.
@@ -40,19 +46,18 @@ def create_course_structure(parent):
         if not os.path.exists(course_dir):
             os.makedirs(course_dir)
             
-        # Создаем структуру курса по маркерам разделов
-        structure = parse_structure(parent.current_text)
+        # Сохраняем текст курса (побайтно: смещения разделов указывают в этот файл)
+        text_path = os.path.join(course_dir, CONTENT_FILE)
+        close_reader(course_dir)  # Отображённый в память прежний файл не даст его заменить
+        write_bytes_atomic(text_path, parent.current_text.encode('utf-8'))
         
-        # Сохраняем структуру в JSON
+        # Создаем структуру курса по маркерам разделов; текст разделов
+        # можно не дублировать, а читать из content.txt по смещениям
+        structure = parse_structure(parent.current_text, parent.settings.get("content_offsets", False))
+        
+        # Сохраняем структуру курса
         structure_path = os.path.join(course_dir, "structure.json")
-        import json
-        with open(structure_path, 'w', encoding='utf-8') as f:
-            json.dump(structure, f, ensure_ascii=False, indent=2)
-            
-        # Сохраняем текст курса
-        text_path = os.path.join(course_dir, "content.txt")
-        with open(text_path, 'w', encoding='utf-8') as f:
-            f.write(parent.current_text)
+        save_course_structure(structure_path, structure)
             
         # Создаем директорию для прогресса
         progress_dir = os.path.join(course_dir, "progress")
@@ -76,8 +81,7 @@ def create_course_structure(parent):
         
         # Сохраняем прогресс в progress.json
         progress_path = os.path.join(course_dir, "progress.json")
-        with open(progress_path, 'w', encoding='utf-8') as f:
-            json.dump(progress, f, ensure_ascii=False, indent=2)
+        save_progress(progress_path, progress)
             
         # Устанавливаем текущую директорию курса
         parent.current_course_dir = course_dir
@@ -85,7 +89,7 @@ def create_course_structure(parent):
         
         # Отображаем первый раздел
         if structure and len(structure) > 0:
-            display_section(parent, structure[0])
+            display_section(parent, fill_section_content(course_dir, dict(structure[0])))
             
         QMessageBox.information(
             parent, 
@@ -186,4 +190,74 @@ def create_new_course(parent):
     except Exception as e:
         log_error(e)
         QMessageBox.critical(parent, "Ошибка", f"Не удалось создать новый курс: {str(e)}")
-        return False 
\ No newline at end of file
+        return False
+
+def import_course_package(parent):
+    """Импортирует курс из пакета .tutor и открывает его.
+    
+    Args:
+        parent: Главное окно приложения
+        
+    Returns:
+        bool: Успешность операции
+    """
+    package_path, _ = QFileDialog.getOpenFileName(parent, "Импорт курса", "", f"Курс Tutor (*{PACKAGE_EXT})")
+    if not package_path:
+        return False  # Пользователь отменил выбор
+    
+    try:
+        overwrite = False
+        course_dir = package_course_dir(package_path)
+        if is_imported(course_dir):
+            answer = QMessageBox.question(
+                parent, "Импорт курса",
+                f"Курс уже импортирован в {course_dir}.\nЗаменить его содержимым пакета?",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
+            if answer == QMessageBox.Cancel:
+                return False
+            overwrite = answer == QMessageBox.Yes
+        
+        course_dir = import_package(package_path, overwrite=overwrite)
+        
+        from _17_open_course import add_course_to_recent
+        add_course_to_recent(course_dir, parent.settings)
+        parent.open_course_by_path(course_dir)
+        log_info(f"Импортирован пакет курса {package_path}")
+        return True
+    except Exception as e:
+        log_error(e)
+        QMessageBox.critical(parent, "Ошибка", f"Не удалось импортировать курс: {str(e)}")
+        return False
+
+def export_course_package(parent):
+    """Экспортирует открытый курс в пакет .tutor.
+    
+    Args:
+        parent: Главное окно приложения
+        
+    Returns:
+        bool: Успешность операции
+    """
+    if not parent.current_course_dir:
+        QMessageBox.warning(parent, "Предупреждение", "Откройте курс для экспорта.")
+        return False
+    
+    default_name = os.path.basename(os.path.normpath(parent.current_course_dir)) + PACKAGE_EXT
+    package_path, _ = QFileDialog.getSaveFileName(parent, "Экспорт курса", default_name, f"Курс Tutor (*{PACKAGE_EXT})")
+    if not package_path:
+        return False  # Пользователь отменил выбор
+    if not package_path.lower().endswith(PACKAGE_EXT):
+        package_path += PACKAGE_EXT
+    
+    include_progress = QMessageBox.question(
+        parent, "Экспорт курса", "Включить в пакет ваш прогресс по курсу?",
+        QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes
+    
+    try:
+        export_package(parent.current_course_dir, package_path, include_progress)
+        QMessageBox.information(parent, "Информация", f"Курс экспортирован в {package_path}")
+        return True
+    except Exception as e:
+        log_error(e)
+        QMessageBox.critical(parent, "Ошибка", f"Не удалось экспортировать курс: {str(e)}")
+        return False
@@ -12,10 +12,11 @@ from PyQt5.QtCore import Qt, QEvent
 from _ui_exercise_generation_retry import generate_exercises as generate_exercises_llm
 from _14_check_answer import check_answer as check_answer_llm
 from _9_save_progress import save_progress
+from _7_save_course_structure import save_section_exercises
 from _15_log_error import log_error
 # Импортируем компоненты из новых модулей
 from _ui_exercise_generation_components import ZoomableScrollArea, OptionWidget
-from _ui_exercise_checking import check_single_exercise, check_answer
+from _ui_exercise_checking import check_single_exercise, check_all_exercises, check_answer
 # Импортируем функции из новых модулей
 from _ui_stage_management import update_stage_text, next_stage
 from _ui_exercise_container import clear_exercise_container, create_exercise_container
@@ -95,7 +96,7 @@ def generate_exercise(window):
         update_stage_text(window)
         
         # Генерируем упражнения конкретного этапа
-        new_exs = generate_exercises_llm(
+        new_exs, truncated = generate_exercises_llm(
             window.current_text,
             window.settings.get("difficulty", "средний"),
             section_title,
@@ -105,6 +106,21 @@ def generate_exercise(window):
         
         if not new_exs:
             raise ValueError("Не удалось сгенерировать упражнения")
+
+        # Текст раздела не поместился в контекст модели целиком
+        if truncated:
+            QMessageBox.warning(window, "Предупреждение",
+                                "Раздел слишком длинный для модели: упражнения составлены только по его началу.")
+        
+        # Сохраняем новые упражнения в банк упражнений раздела (переносится в пакеты курса)
+        if window.current_course_dir and window.current_section:
+            try:
+                save_section_exercises(
+                    os.path.join(window.current_course_dir, "structure.json"),
+                    window.current_section['id'], window.current_stage, [dict(ex) for ex in new_exs]
+                )
+            except Exception as e:
+                log_error(e)
             
         # Фильтруем уже выполненные упражнения, если курс открыт
         if window.current_course_dir and window.current_section:
@@ -333,6 +349,13 @@ def generate_exercise(window):
                 
                 # Сохраняем контекст учебного материала для LLM проверки
                 exercise['context'] = window.current_text
+            
+            # Кнопка проверки всех отвеченных вопросов (проверки идут параллельно)
+            check_all_btn = QPushButton("Проверить все")
+            check_all_btn.clicked.connect(lambda checked: check_all_exercises(window))
+            check_all_btn.setStyleSheet(CHECK_BUTTON_STYLE)
+            check_all_btn.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Fixed)
+            window.exercise_container.layout().addWidget(check_all_btn, 0, Qt.AlignRight)
         
         # Обновляем интерфейс
         QApplication.processEvents()
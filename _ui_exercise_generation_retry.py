@@ -1,12 +1,21 @@
+import requests
+
 from _13_generate_exercises import generate_exercises as _llm_generate_exercises
 from _15_log_error import log_error
 
 def generate_exercises(section_text, difficulty, section_title, stage, previous_questions, settings_path="settings.json"):
-    """Wrapper для генерации упражнений с retry и проверкой корректности ответов для multiple-choice"""
+    """Wrapper для генерации упражнений с retry и проверкой корректности ответов для multiple-choice
+
+    Повторяются только некорректные ответы модели (неразборчивый JSON, неверное
+    число правильных вариантов). Сетевые ошибки уже повторены клиентом API
+    с экспоненциальной задержкой, поэтому здесь они пробрасываются сразу.
+
+    Возвращает кортеж (упражнения, был ли текст раздела сокращён под контекст модели).
+    """
     max_retries = 3
     for attempt in range(1, max_retries + 1):
         try:
-            exercises = _llm_generate_exercises(
+            exercises, truncated = _llm_generate_exercises(
                 section_text,
                 difficulty,
                 section_title,
@@ -36,9 +45,11 @@ def generate_exercises(section_text, difficulty, section_title, stage, previous_
                 for ex in exercises:
                     if 'options' not in ex or not isinstance(ex['options'], list):
                         ex['options'] = []
-            return exercises
+            return exercises, truncated
         except Exception as e:
             log_error(e)
+            if isinstance(e.__cause__, requests.RequestException):
+                raise
             if attempt == max_retries:
                 # Передаем окончательную ошибку
                 raise ValueError(f"Не удалось сгенерировать корректные упражнения после {max_retries} попыток: {e}")
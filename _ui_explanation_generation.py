@@ -1,11 +1,13 @@
 """Модуль для UI-функций генерации и обновления объяснений."""
 
 from PyQt5.QtWidgets import QMessageBox, QApplication
-from _12_generate_explanation import generate_explanation as generate_explanation_llm
+from _12_generate_explanation import stream_explanation
+from _11_send_chat_completion import strip_think_tags
 from _15_log_error import log_error
 import os
-from _6_load_course_structure import load_course_structure
-from _7_save_course_structure import save_course_structure
+import time
+from _6_load_course_structure import load_section
+from _7_save_course_structure import save_section_explanation
 import re
 
 def clean_html(expl: str) -> str:
@@ -14,20 +16,57 @@ def clean_html(expl: str) -> str:
     expl = re.sub(r"\n?```$", "", expl)
     return expl.strip()
 
+# Минимальный интервал между перерисовками при потоковой генерации (секунды)
+STREAM_REFRESH_INTERVAL = 0.1
+
+def render_stream(text_edit, chunks, as_html=True):
+    """Постепенно выводит потоковый ответ нейросети в текстовое поле.
+    
+    Перерисовка выполняется не чаще STREAM_REFRESH_INTERVAL, чтобы длинный
+    ответ не приводил к повторной вёрстке на каждый токен.
+    
+    Args:
+        text_edit: QTextEdit для вывода текста
+        chunks: Итератор фрагментов текста
+        as_html: Выводить ли текст как HTML (иначе как обычный текст)
+        
+    Returns:
+        str: Полный текст ответа без блоков <think>
+    """
+    parts = []
+    last_refresh = 0.0
+    
+    def refresh():
+        text = strip_think_tags("".join(parts))
+        if as_html:
+            text_edit.setHtml(clean_html(text))
+        else:
+            text_edit.setPlainText(text)
+        QApplication.processEvents()
+    
+    for chunk in chunks:
+        parts.append(chunk)
+        now = time.monotonic()
+        if now - last_refresh >= STREAM_REFRESH_INTERVAL:
+            refresh()
+            last_refresh = now
+    refresh()
+    
+    text = strip_think_tags("".join(parts)).strip()
+    if not text:
+        raise ValueError("Не удалось получить объяснение от нейросети")
+    return text
+
 def generate_explanation(window):
     """Показывает сохранённое объяснение из structure.json."""
     if not window.current_course_dir or not window.current_section:
         QMessageBox.warning(window, "Предупреждение", "Откройте курс для доступа к объяснению")
         return
     detail = getattr(window, "current_detail_level", window.settings.get("detail_level", "средний"))
-    structure_path = os.path.join(window.current_course_dir, "structure.json")
     try:
-        sections = load_course_structure(structure_path)
-        explanation = None
-        for sec in sections:
-            if sec.get("id") == window.current_section.get("id"):
-                explanation = sec.get("explanations", {}).get(detail)
-                break
+        # Читается только текущий раздел, а не весь курс
+        section = load_section(window.current_course_dir, window.current_section.get("id")) or {}
+        explanation = section.get("explanations", {}).get(detail)
         if explanation:
             html = clean_html(explanation)
             window.explanation_edit.setHtml(html)
@@ -47,20 +86,16 @@ def regenerate_explanation(window):
     try:
         window.explanation_edit.setText("Генерация объяснения...")
         QApplication.processEvents()
-        new_expl = generate_explanation_llm(
-            window.current_text,
-            detail
+        new_expl = render_stream(
+            window.explanation_edit,
+            stream_explanation(window.current_text, detail)
         )
         html = clean_html(new_expl)
         window.explanation_edit.setHtml(html)
         window.current_explanation = html
         structure_path = os.path.join(window.current_course_dir, "structure.json")
-        sections = load_course_structure(structure_path)
-        for sec in sections:
-            if sec.get("id") == window.current_section.get("id"):
-                sec.setdefault("explanations", {})[detail] = html
-                break
-        save_course_structure(structure_path, sections)
+        # Записывается только это объяснение (в базе SQLite - одна строка)
+        save_section_explanation(structure_path, window.current_section.get("id"), detail, html)
     except Exception as e:
         log_error(e)
         window.explanation_edit.setText(f"Ошибка при регенерации объяснения: {str(e)}")
@@ -81,10 +116,13 @@ def send_feedback(window):
         window.explanation_edit.setText("Генерация уточненного объяснения...")
         QApplication.processEvents()  # Обновляем интерфейс
         
-        explanation = generate_explanation_llm(
-            window.current_text,
-            window.settings.get("detail_level", "средний"),
-            feedback
+        explanation = render_stream(
+            window.explanation_edit,
+            stream_explanation(
+                window.current_text,
+                window.settings.get("detail_level", "средний"),
+                feedback
+            )
         )
         
         window.explanation_edit.setText(explanation)
@@ -0,0 +1,68 @@
+"""Модуль для диалога статистики запросов к LLM."""
+
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget,
+                             QTableWidgetItem, QPushButton, QLabel, QHeaderView)
+from _32_llm_telemetry import load_metrics, summarize_metrics
+
+# Столбцы таблицы: ключ сводки и заголовок
+COLUMNS = [
+    ("task", "Задача"),
+    ("calls", "Вызовы"),
+    ("errors", "Ошибки"),
+    ("cache_hits", "Из кэша"),
+    ("retries", "Повторы"),
+    ("wall_p50", "Время p50, с"),
+    ("wall_p90", "Время p90, с"),
+    ("wall_p99", "Время p99, с"),
+    ("ttft_p50", "До 1-го токена p50, с"),
+    ("ttft_p90", "До 1-го токена p90, с"),
+    ("tps_p50", "Токенов/с p50"),
+    ("prompt_tokens_avg", "Токенов запроса (ср.)"),
+    ("completion_tokens_avg", "Токенов ответа (ср.)"),
+]
+
+
+class LlmStatsDialog(QDialog):
+    """Диалог со сводной статистикой вызовов LLM по задачам."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Статистика LLM")
+        self.resize(1000, 300)
+
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels([title for _, title in COLUMNS])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        refresh_button = QPushButton("Обновить")
+        refresh_button.clicked.connect(self.refresh)
+        close_button = QPushButton("Закрыть")
+        close_button.clicked.connect(self.accept)
+        buttons.addStretch()
+        buttons.addWidget(refresh_button)
+        buttons.addWidget(close_button)
+        layout.addLayout(buttons)
+
+        self.refresh()
+
+    def refresh(self):
+        """Перечитывает файл метрик и заполняет таблицу."""
+        try:
+            records = load_metrics()
+        except OSError as e:
+            self.summary_label.setText(f"Не удалось прочитать метрики: {e}")
+            return
+        summary = summarize_metrics(records)
+        self.summary_label.setText(f"Записей: {len(records)}")
+        self.table.setRowCount(len(summary))
+        for row, item in enumerate(summary):
+            for column, (key, _) in enumerate(COLUMNS):
+                value = item.get(key)
+                self.table.setItem(row, column, QTableWidgetItem("—" if value is None else str(value)))
@@ -3,6 +3,8 @@ import os
 from PyQt5.QtWidgets import QAction, QMenu
 from typing import List, Dict, Any
 
+from _39_course_package import PACKAGE_EXT, TutorPackage, is_package, import_package
+
 def find_available_courses(courses_dir: str = "courses") -> List[Dict[str, Any]]:
     """Находит все доступные курсы в указанной директории.
     
@@ -31,6 +33,20 @@ def find_available_courses(courses_dir: str = "courses") -> List[Dict[str, Any]]
                 "name": course_name,
                 "path": course_dir
             })
+        elif is_package(course_dir):
+            # Пакет .tutor: читается только манифест, курс импортируется при открытии
+            try:
+                with TutorPackage(course_dir) as package:
+                    course_name = package.title
+            except (OSError, ValueError) as e:
+                print(f"Пропущен повреждённый пакет курса {course_dir}: {e}")
+                continue
+            
+            courses.append({
+                "name": f"{course_name} ({PACKAGE_EXT})",
+                "path": course_dir,
+                "package": True
+            })
     
     return courses
 
@@ -88,7 +104,7 @@ def update_courses_menu(main_window) -> None:
                 continue
                 
             # Проверяем, что это действительно курс
-            if not os.path.exists(os.path.join(course_path, "structure.json")):
+            if not os.path.exists(os.path.join(course_path, "structure.json")) and not is_package(course_path):
                 continue
                 
             # Получаем имя курса из имени директории
@@ -113,8 +129,10 @@ def open_course_by_path(main_window, course_path: str) -> None:
         course_path: Путь к директории курса
     """
     try:
-        from _6_load_course_structure import load_course_structure
+        from _6_load_course_structure import load_course_index
+        from _7_save_course_structure import migrate_course_layout
         from _8_load_progress import load_progress
+        from _38_content_reader import close_readers
         
         # Проверяем, что директория существует
         if not os.path.exists(course_path):
@@ -122,12 +140,21 @@ def open_course_by_path(main_window, course_path: str) -> None:
             QMessageBox.warning(main_window, "Предупреждение", f"Директория курса не найдена: {course_path}")
             return
             
-        # Загружаем структуру курса
-        structure_path = os.path.join(course_path, "structure.json")
-        structure = load_course_structure(structure_path)
+        # Пакет .tutor импортируется в папку курсов (один раз) и открывается оттуда
+        if is_package(course_path):
+            course_path = import_package(course_path)
+        
+        # Отображения content.txt прежнего курса больше не нужны
+        close_readers()
+        
+        # Загружаем оглавление курса; текст разделов читается при их открытии
+        migrate_course_layout(os.path.join(course_path, "structure.json"))
+        structure = load_course_index(course_path)
         
         # Загружаем прогресс пользователя
         progress_path = os.path.join(course_path, "progress.json")
+        from _9_save_progress import flush_progress
+        flush_progress()  # Отложенные изменения должны попасть в файл до его чтения
         try:
             progress = load_progress(progress_path)
             main_window.progress = progress
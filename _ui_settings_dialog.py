@@ -4,10 +4,36 @@ from PyQt5.QtWidgets import (QDialog, QFormLayout, QComboBox, QLineEdit,
                              QPushButton, QHBoxLayout, QVBoxLayout,
                              QGroupBox, QRadioButton, QLabel, QGridLayout,
                              QCheckBox, QListWidget, QMessageBox)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from _4_load_settings import load_settings
+from _10_get_models import get_model_infos, get_cached_model_infos, DEFAULT_MODELS_TTL
 import json
 
+# Загрузчики, которые ещё работают: объект QThread нельзя уничтожать до завершения потока
+_active_loaders = set()
+
+
+class ModelListLoader(QThread):
+    """Фоновая загрузка списка моделей, чтобы недоступный сервер не блокировал диалог."""
+    
+    models_loaded = pyqtSignal(str, list)
+    load_failed = pyqtSignal(str, str)
+    
+    def __init__(self, api_endpoint, max_age=DEFAULT_MODELS_TTL):
+        super().__init__()
+        self.api_endpoint = api_endpoint
+        self.max_age = max_age
+        _active_loaders.add(self)
+        self.finished.connect(lambda: _active_loaders.discard(self))
+    
+    def run(self):
+        try:
+            infos = get_model_infos(self.api_endpoint, max_age=self.max_age)
+            self.models_loaded.emit(self.api_endpoint, infos)
+        except Exception as e:
+            self.load_failed.emit(self.api_endpoint, str(e))
+
+
 class SettingsDialog(QDialog):
     """Диалог настроек приложения."""
     
@@ -42,11 +68,18 @@ class SettingsDialog(QDialog):
         self.local_group = QGroupBox("Настройки локальной модели")
         local_layout = QFormLayout()
         
-        self.model_edit = QLineEdit(self.settings.get("model", "local"))
+        # Список моделей сразу заполняется из кэша и обновляется в фоне
+        self.model_combo = QComboBox()
+        self.model_combo.setEditable(True)
         self.api_endpoint_edit = QLineEdit(self.settings.get("api_endpoint", "http://localhost:1234/v1"))
+        self.models_status_label = QLabel("")
+        self.models_status_label.setWordWrap(True)
+        self.fill_model_combo(get_cached_model_infos(self.api_endpoint_edit.text()))
+        self.model_combo.setCurrentText(self.settings.get("model", "local"))
         
-        local_layout.addRow("Модель:", self.model_edit)
+        local_layout.addRow("Модель:", self.model_combo)
         local_layout.addRow("API Endpoint:", self.api_endpoint_edit)
+        local_layout.addRow("", self.models_status_label)
         self.local_group.setLayout(local_layout)
         
         # Группа настроек для OpenRouter
@@ -125,6 +158,48 @@ class SettingsDialog(QDialog):
         
         # Инициализируем состояние интерфейса
         self.toggle_provider_settings()
+        
+        # Обновляем список моделей в фоне
+        self.api_endpoint_edit.editingFinished.connect(self.refresh_models)
+        self.refresh_models()
+    
+    def fill_model_combo(self, infos):
+        """Заполняет список моделей, сохраняя введённое значение."""
+        current = self.model_combo.currentText()
+        self.model_combo.clear()
+        for info in infos:
+            self.model_combo.addItem(info["id"])
+            if info.get("context_length"):
+                self.model_combo.setItemData(
+                    self.model_combo.count() - 1,
+                    f"Контекст: {info['context_length']} токенов",
+                    Qt.ToolTipRole
+                )
+        self.model_combo.setCurrentText(current)
+    
+    def refresh_models(self):
+        """Запускает фоновое обновление списка моделей для указанного API Endpoint."""
+        api_endpoint = self.api_endpoint_edit.text().strip()
+        if not api_endpoint:
+            return
+        self.models_status_label.setText("Обновление списка моделей...")
+        loader = ModelListLoader(api_endpoint, self.settings.get("models_cache_ttl", DEFAULT_MODELS_TTL))
+        loader.models_loaded.connect(self.on_models_loaded)
+        loader.load_failed.connect(self.on_models_failed)
+        loader.start()
+    
+    def on_models_loaded(self, api_endpoint, infos):
+        """Обновляет список моделей после фоновой загрузки."""
+        if api_endpoint != self.api_endpoint_edit.text().strip():
+            return  # Адрес успели изменить, ждём результат для нового
+        self.fill_model_combo(infos)
+        self.models_status_label.setText(f"Доступно моделей: {len(infos)}")
+    
+    def on_models_failed(self, api_endpoint, error):
+        """Сообщает о недоступности сервера, не блокируя диалог."""
+        if api_endpoint != self.api_endpoint_edit.text().strip():
+            return
+        self.models_status_label.setText(f"Сервер недоступен: {error}")
     
     def toggle_provider_settings(self):
         """Переключает видимость настроек в зависимости от выбранного провайдера."""
@@ -136,12 +211,14 @@ class SettingsDialog(QDialog):
         """Возвращает настройки из диалога."""
         llm_provider = "local" if self.llm_local_radio.isChecked() else "openrouter"
         
-        # Создаем словарь с новыми настройками
-        new_settings = {
+        # Создаем словарь с новыми настройками поверх исходных,
+        # чтобы не терять параметры, которых нет в диалоге
+        new_settings = dict(self.settings)
+        new_settings.update({
             "detail_level": self.detail_level_combo.currentText(),
             "difficulty": self.difficulty_combo.currentText(),
             "llm_provider": llm_provider,
-            "model": self.model_edit.text(),
+            "model": self.model_combo.currentText(),
             "api_endpoint": self.api_endpoint_edit.text(),
             "openrouter_api_key": self.openrouter_api_key_edit.text(),
             "selected_openrouter_model": self.openrouter_model_combo.currentText(),
@@ -149,10 +226,6 @@ class SettingsDialog(QDialog):
                                 for i in range(self.openrouter_model_combo.count())],
             "max_tokens": int(self.max_tokens_edit.text()),
             "temperature": float(self.temperature_edit.text())
-        }
-        
-        # Если в исходных настройках были recent_courses, сохраняем их
-        if "recent_courses" in self.settings:
-            new_settings["recent_courses"] = self.settings["recent_courses"]
+        })
             
         return new_settings 
\ No newline at end of file
@@ -18,17 +18,29 @@ from _17_open_course import open_course
 from _18_select_section import select_section, get_course_sections
 from _19_load_demo_text import load_welcome_text
 from _8_load_progress import load_progress
-from _9_save_progress import save_progress
+from _6_load_course_structure import load_section
+from _7_save_course_structure import configure_course_layout
+from _37_serialization import configure_serialization
+from _9_save_progress import record_progress_event, flush_progress, configure_progress_saver
+from _21_http_session import configure_sessions, close_sessions
+from _23_llm_cache import configure_cache
+from _24_retry_policy import configure_retry
+from _25_rate_limiter import configure_rate_limits
+from _27_llm_provider import invalidate_llm_config
+from _29_endpoint_pool import configure_endpoint_pool
+from _32_llm_telemetry import configure_telemetry
+from _35_sqlite_storage import configure_storage
 
 # Импортируем UI модули
 from _ui_settings_dialog import SettingsDialog
+from _ui_llm_stats_dialog import LlmStatsDialog
 from _ui_text_processing import load_demo_text, open_book
 from _ui_explanation_generation import (generate_explanation, regenerate_explanation, 
                                           send_feedback)
 from _ui_exercise_generation import (generate_exercise, check_answer, update_stage_text,
                                        next_stage)
 from _ui_course_management import (create_course_structure, open_course, display_section,
-                                     create_new_course)
+                                     create_new_course, import_course_package, export_course_package)
 from _ui_main_window import update_courses_menu, open_course_by_path
 
 class MainWindow(QMainWindow):
@@ -44,6 +56,42 @@ class MainWindow(QMainWindow):
         # Загружаем настройки
         self.settings = load_settings("settings.json")
         self.current_detail_level = self.settings.get("detail_level", "средний")
+        configure_sessions(self.settings.get("http_pool_size", 10))
+        configure_cache(
+            max_entries=self.settings.get("llm_cache_max_entries", 2000),
+            max_bytes=self.settings.get("llm_cache_max_mb", 200) * 1024 * 1024
+        )
+        configure_retry(
+            max_attempts=self.settings.get("retry_max_attempts", 3),
+            base_delay=self.settings.get("retry_base_delay", 1.0),
+            max_delay=self.settings.get("retry_max_delay", 30.0),
+            failure_threshold=self.settings.get("circuit_failure_threshold", 3),
+            reset_timeout=self.settings.get("circuit_reset_timeout", 30.0)
+        )
+        configure_rate_limits(self.settings.get("rate_limits", {}))
+        # Несколько серверов инференса: запросы распределяются между ними
+        configure_endpoint_pool(
+            self.settings.get("api_endpoint", ""),
+            self.settings.get("api_endpoints", []),
+            health_interval=self.settings.get("endpoint_health_interval", 15.0),
+            cooldown=self.settings.get("endpoint_down_cooldown", 30.0)
+        )
+        configure_progress_saver(self.settings.get("progress_save_delay", 1.0))
+        # Хранилище курсов и прогресса: файлы JSON или база SQLite
+        configure_storage(
+            self.settings.get("storage_backend", "json"),
+            self.settings.get("storage_db_path", "tutor.db"),
+            self.settings.get("student_name", "default")
+        )
+        configure_course_layout(self.settings.get("course_layout", "single"))
+        configure_serialization(
+            self.settings.get("course_compression", "none"),
+            self.settings.get("course_json_pretty", False)
+        )
+        configure_telemetry(
+            enabled=self.settings.get("llm_metrics_enabled", True),
+            max_bytes=self.settings.get("llm_metrics_max_mb", 5) * 1024 * 1024
+        )
         
         # Текущий текст и данные
         self.current_text = ""
@@ -210,6 +258,12 @@ class MainWindow(QMainWindow):
         
         # Подменю доступных курсов будет добавлено в update_courses_menu
         
+        import_package_action = file_menu.addAction("Импорт курса (.tutor)...")
+        import_package_action.triggered.connect(self.import_course_package)
+        
+        export_package_action = file_menu.addAction("Экспорт курса (.tutor)...")
+        export_package_action.triggered.connect(self.export_course_package)
+        
         file_menu.addSeparator()
         
         exit_action = file_menu.addAction("Выход")
@@ -227,6 +281,9 @@ class MainWindow(QMainWindow):
         pregen_action = tools_menu.addAction("Прегенерировать объяснения")
         pregen_action.triggered.connect(self.pre_generate_explanations)
         
+        llm_stats_action = tools_menu.addAction("Статистика LLM")
+        llm_stats_action.triggered.connect(self.show_llm_stats)
+        
         # Меню "Справка"
         help_menu = menubar.addMenu("Справка")
         
@@ -298,8 +355,8 @@ class MainWindow(QMainWindow):
             from _20_evaluate_section import evaluate_section
             sid = str(self.current_section['id'])
             res = evaluate_section(self.progress, sid)
-            self.progress['sections'][sid]['evaluation'] = res
-            save_progress(os.path.join(self.current_course_dir, "progress.json"), self.progress)
+            record_progress_event(os.path.join(self.current_course_dir, "progress.json"), self.progress,
+                                  {"op": "evaluation", "section": sid, "evaluation": res})
             QMessageBox.information(self, "Результаты оценки раздела", f"Оценка: {res['score']}\nКомментарий: {res['comment']}")
         except Exception as e:
             log_error(e)
@@ -363,8 +420,21 @@ class MainWindow(QMainWindow):
             self.settings = new_settings
             from _5_save_settings import save_settings
             save_settings("settings.json", self.settings)
+            invalidate_llm_config()
+            configure_sessions(self.settings.get("http_pool_size", 10))
+            configure_rate_limits(self.settings.get("rate_limits", {}))
+            configure_endpoint_pool(
+                self.settings.get("api_endpoint", ""),
+                self.settings.get("api_endpoints", []),
+                health_interval=self.settings.get("endpoint_health_interval", 15.0),
+                cooldown=self.settings.get("endpoint_down_cooldown", 30.0)
+            )
             QMessageBox.information(self, "Информация", "Настройки сохранены")
     
+    def show_llm_stats(self):
+        """Показывает статистику времени ответа и расхода токенов по задачам."""
+        LlmStatsDialog(self).exec_()
+    
     def show_about(self):
         """Показывает информацию о программе."""
         QMessageBox.about(
@@ -381,12 +451,12 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Предупреждение", "Откройте курс, чтобы форматировать материал.")
             return
         from _2_1_format_text import format_sections
-        from _6_load_course_structure import load_course_structure
+        from _6_load_course_structure import load_course_index
         structure_path = os.path.join(self.current_course_dir, "structure.json")
         try:
             format_sections(structure_path)
-            # Перезагрузить структуру
-            self.current_course_structure = load_course_structure(structure_path)
+            # Перезагрузить оглавление
+            self.current_course_structure = load_course_index(self.current_course_dir)
             # Отобразить текущий раздел заново, если он существует
             if self.current_section:
                 for sec in self.current_course_structure:
@@ -445,6 +515,11 @@ class MainWindow(QMainWindow):
     
     def display_section(self, section):
         """Отображает содержимое раздела в интерфейсе."""
+        # Изменения прогресса предыдущего раздела записываются сразу
+        flush_progress()
+        # Из оглавления приходят только id и title: текст читается из файла раздела
+        if "content" not in section:
+            section = load_section(self.current_course_dir, section["id"]) or section
         display_section(self, section)
         # сбрасываем уровень сложности на глобальный и загружаем объяснение
         self.current_detail_level = self.settings.get("detail_level", "средний")
@@ -457,6 +532,14 @@ class MainWindow(QMainWindow):
             # Обновляем меню курсов после создания нового курса
             update_courses_menu(self)
 
+    def import_course_package(self):
+        """Импортирует курс из пакета .tutor и открывает его (меню курсов обновляется при открытии)."""
+        import_course_package(self)
+    
+    def export_course_package(self):
+        """Экспортирует открытый курс в пакет .tutor."""
+        export_course_package(self)
+
     def open_toc(self):
         """Открывает оглавление курса для выбора раздела."""
         # Проверяем, открыт ли курс
@@ -491,10 +574,16 @@ class MainWindow(QMainWindow):
         sid = str(self.current_section['id'])
         res = evaluate_section(self.progress, sid)
         # Сохраняем результат оценки в прогрессе
-        self.progress['sections'][sid]['evaluation'] = res
-        save_progress(os.path.join(self.current_course_dir, "progress.json"), self.progress)
+        record_progress_event(os.path.join(self.current_course_dir, "progress.json"), self.progress,
+                              {"op": "evaluation", "section": sid, "evaluation": res})
         QMessageBox.information(self, "Результаты обновлены", f"Оценка: {res['score']}\nКомментарий: {res['comment']}")
 
+    def closeEvent(self, event):
+        """Записывает отложенный прогресс и освобождает сетевые ресурсы при закрытии окна."""
+        flush_progress()
+        close_sessions()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainWindow()